@@ -6,8 +6,12 @@ A Flask web application to control GPIO pins for light on/off functionality
 
 import os
 import json
-from flask import Flask, render_template, request, jsonify
-from flask_cors import CORS
+import math
+import bisect
+import itertools
+import hmac
+import ipaddress
+from flask import Flask, Response, g, request, jsonify
 import logging
 from datetime import datetime, timedelta
 import threading
@@ -16,6 +20,18 @@ import uuid
 
 # Import GPIO control module
 from gpio_controller import GPIOController
+from clock import Clock, PooledRunner, ThreadRunner
+from command_queue import CommandQueue, QueueFullError, SET_BRIGHTNESS, SET_STATE, TOGGLE
+from history import HistoryRecorder
+from automation import AutomationEngine, RuleError, MAX_FADE_STEPS, MAX_FADE_TIME
+from rate_limiter import TokenBucketLimiter, ConcurrencyLimit
+from input_dispatcher import InputDispatcher
+from daylight import DaylightController, DaylightZone, DaylightConfigError, SensorError, make_sensor
+from profiler import SamplingProfiler, SpanTracer
+from wire_format import enable_negotiation, negotiated_type, wants_terse, FIELDS, JSON, OFFERED
+from schedule import ScheduleCache, TimerRecord, merge_schedule, next_occurrence, allowed_day
+from state_table import StateTableInUse, StateTableWriter, default_path as default_state_table_path
+from mqtt_bridge import MQTTBridge
 
 # Configure logging
 logging.basicConfig(
@@ -24,11 +40,39 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+def env_flag(name, default):
+    """Boolean setting from an environment variable ('1'/'true'/'yes' or '0'/'false'/'no')"""
+    value = os.environ.get(name)
+    if value is None or value == '':
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+# Low-memory profile for Pi Zero / 512 MB boards: small thread stacks, background
+# tasks on a bounded worker pool, smaller in-memory limits, and no dashboard or
+# CORS unless switched back on. Every setting can also be given on its own.
+LOW_MEMORY = env_flag('LOW_MEMORY', False)
+ENABLE_DASHBOARD = env_flag('ENABLE_DASHBOARD', not LOW_MEMORY)
+ENABLE_CORS = env_flag('ENABLE_CORS', not LOW_MEMORY)
+# Stack size of threads started from here on, in KiB (0 keeps the platform default, often 8 MiB)
+THREAD_STACK_KB = int(os.environ.get('THREAD_STACK_KB', 256 if LOW_MEMORY else 0))
+# Worker threads shared by fades, timers and daylight control (0 = one thread per task)
+TASK_WORKERS = int(os.environ.get('TASK_WORKERS', 2 if LOW_MEMORY else 0))
+
+if THREAD_STACK_KB:
+    threading.stack_size(max(THREAD_STACK_KB, 64) * 1024)
+
 app = Flask(__name__)
-CORS(app)  # Enable CORS for all routes
+if ENABLE_CORS:
+    from flask_cors import CORS
+    CORS(app)  # Enable CORS for all routes
+enable_negotiation(app)  # JSON by default, MessagePack/CBOR on request (see wire_format.py)
+
+# Time source and runner for background tasks (swapped for virtual time in tests)
+clock = Clock()
+task_runner = PooledRunner(clock, TASK_WORKERS) if TASK_WORKERS else ThreadRunner(clock)
 
 # Initialize GPIO controller
-gpio_controller = GPIOController()
+gpio_controller = GPIOController(clock=clock, timeline_size=2000 if LOW_MEMORY else 10000)
 
 # Configuration
 CONFIG = {
@@ -37,12 +81,71 @@ CONFIG = {
         {'id': 2, 'name': 'Kitchen', 'pin': 19, 'state': False, 'type': 'pwm', 'brightness': 0},
         {'id': 3, 'name': 'Bedroom', 'pin': 20, 'state': False, 'type': 'pwm', 'brightness': 0},
         {'id': 4, 'name': 'Bathroom', 'pin': 21, 'state': False, 'type': 'pwm', 'brightness': 0}
-    ]
+    ],
+    # Physical switches/buttons, e.g.
+    # {'id': 1, 'name': 'Hall button', 'pin': 5, 'type': 'button', 'pull_up': True,
+    #  'bindings': {'single': {'type': 'toggle', 'light_id': 1},
+    #               'long': {'type': 'all', 'state': 'off'}}}
+    'inputs': [],
+    # MQTT bridge (Home Assistant and other consumers), enabled when MQTT_HOST is set
+    'mqtt': {
+        'enabled': bool(os.environ.get('MQTT_HOST')),
+        'host': os.environ.get('MQTT_HOST', 'localhost'),
+        'port': int(os.environ.get('MQTT_PORT', 1883)),
+        'username': os.environ.get('MQTT_USERNAME'),
+        'password': os.environ.get('MQTT_PASSWORD'),
+        'base_topic': os.environ.get('MQTT_BASE_TOPIC', 'web_contr'),
+    },
+    # Daylight harvesting: hold PWM lights at a target lux from an ambient light sensor, e.g.
+    # {'id': 1, 'name': 'Office', 'light_ids': [1, 2], 'target_lux': 500,
+    #  'sensor': {'type': 'bh1750', 'bus': 1, 'address': 0x23}}
+    'daylight': {
+        'interval': 1.0,
+        'zones': []
+    }
 }
 
-# Timer storage
+# Timer storage, ordered by 'seq' (creation order, used as the listing cursor)
 TIMERS = []
 timer_lock = threading.Lock()
+next_timer_seq = 0
+timer_version = 0  # Bumped on every change to TIMERS (see timers_changed)
+schedule_cache = ScheduleCache()
+# Counters for coalesced timer execution (see execute_timer_batch)
+timer_stats = {'batches': 0, 'timers': 0, 'conflicts': 0, 'last_batch_size': 0,
+               'last_batch_ms': 0.0, 'max_batch_ms': 0.0}
+TIMER_REPEAT_MODES = ('once', 'daily', 'weekdays', 'weekends')
+
+# Maximum time a request waits for its queued GPIO command to be applied
+COMMAND_TIMEOUT = 5.0
+
+# Seconds between timer checks
+TIMER_CHECK_INTERVAL = 10
+
+# Light history storage (sealed segments and hourly rollups, bounded on disk)
+HISTORY_DIR = os.environ.get('LIGHT_HISTORY_DIR',
+                             os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'history'))
+# Seconds between rollup checkpoints (bounds the usage lost on a crash)
+HISTORY_CHECKPOINT_INTERVAL = 60
+# Rated power used for energy estimates when a light has no 'watts' entry
+DEFAULT_LIGHT_WATTS = 10.0
+
+# API limits: tokens refilled per second and bucket size, per client and endpoint
+RATE_LIMIT_RATE = 10.0
+RATE_LIMIT_BURST = 40.0
+MAX_CONCURRENT_FADES = 4 if LOW_MEMORY else 8
+# MAX_FADE_STEPS and MAX_FADE_TIME (automation.py) bound every fade; the time cap keeps
+# one client from holding fade slots for hours
+MAX_TIMERS = 1000 if LOW_MEMORY else 5000
+MAX_SCHEDULE_DAYS = 31
+MAX_SCHEDULE_OCCURRENCES = 5000
+
+rate_limiter = TokenBucketLimiter(rate=RATE_LIMIT_RATE, burst=RATE_LIMIT_BURST,
+                                  max_buckets=1024 if LOW_MEMORY else 4096)
+fade_limit = ConcurrencyLimit(MAX_CONCURRENT_FADES)
+fade_generations = {}  # pin -> id of the fade currently driving it
+fading_pins = {}  # pin -> generation of the fade holding the pin's slot in fade_limit
+fade_lock = threading.Lock()
 
 # Initialize GPIO pins
 for light in CONFIG['lights']:
@@ -51,10 +154,334 @@ for light in CONFIG['lights']:
     else:
         gpio_controller.setup_pin(light['pin'])
 
-@app.route('/')
-def index():
-    """Render the main control interface"""
-    return render_template('index.html', lights=CONFIG['lights'])
+LIGHTS_BY_PIN = {light['pin']: light for light in CONFIG['lights']}
+LIGHTS_BY_ID = {light['id']: light for light in CONFIG['lights']}
+
+# Light state mirrored to shared memory for other processes. LIGHT_STATE_TABLE sets the
+# file (empty disables it), LIGHT_STATE_TABLE_NAME the instance name in the default path.
+STATE_TABLE_PATH = os.environ.get('LIGHT_STATE_TABLE', default_state_table_path())
+state_table = None
+if STATE_TABLE_PATH:
+    try:
+        state_table = StateTableWriter(STATE_TABLE_PATH, CONFIG['lights'])
+    except StateTableInUse as e:
+        # Another service instance owns the table; publish a private one instead
+        root, ext = os.path.splitext(STATE_TABLE_PATH)
+        STATE_TABLE_PATH = f"{root}.{os.getpid()}{ext}"
+        logger.warning(f"{str(e)}; using {STATE_TABLE_PATH}")
+        state_table = StateTableWriter(STATE_TABLE_PATH, CONFIG['lights'])
+
+history_recorder = HistoryRecorder([light['id'] for light in CONFIG['lights']], data_dir=HISTORY_DIR,
+                                   max_segments=2 if LOW_MEMORY else 8)
+for light in CONFIG['lights']:
+    history_recorder.record(light['id'], light.get('brightness', 0) if light['state'] else 0)
+
+def update_light_from_pin(pin, value):
+    """Mirror an applied GPIO command into the light config (runs on the queue worker)"""
+    light = LIGHTS_BY_PIN.get(pin)
+    if not light:
+        return
+    if light.get('type') == 'pwm':
+        light['brightness'] = value
+        light['state'] = value > 0
+        level = value
+    else:
+        light['state'] = bool(value)
+        level = 100.0 if value else 0.0
+    if state_table:
+        state_table.update(light)
+    history_recorder.record(light['id'], level)
+    automation_engine.notify(light['id'], level)
+    if mqtt_bridge:
+        mqtt_bridge.notify_light(light['id'])
+
+# Runtime diagnostics, both off until switched on through /api/admin
+tracer = SpanTracer(capacity=512 if LOW_MEMORY else 4096)
+profiler = SamplingProfiler(max_duration=120)
+# Optional shared secret for /api/admin (X-Admin-Token header)
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+
+# All GPIO writes go through one queue so they are applied in order per pin
+command_queue = CommandQueue(gpio_controller, capacity=64, on_change=update_light_from_pin, tracer=tracer)
+command_queue.start()
+
+def apply_light_command(light, kind, value=None):
+    """
+    Queue a GPIO command for a light and wait until it has been applied
+
+    Returns:
+        The light's brightness (PWM) or state (digital) after the command
+    """
+    return command_queue.submit(kind, light['pin'], value).result(timeout=COMMAND_TIMEOUT)
+
+def set_light_on(light, on):
+    """Turn a light fully on or off through the command queue"""
+    if light.get('type') == 'pwm':
+        return apply_light_command(light, SET_BRIGHTNESS, 100.0 if on else 0.0)
+    return apply_light_command(light, SET_STATE, on)
+
+def start_fade(light, target_brightness, fade_time, steps=50):
+    """
+    Fade a PWM light to a brightness in a background thread
+
+    A new fade on the same light supersedes the one in progress and takes
+    over its slot, so a light never holds more than one slot. The fade time
+    and steps are capped at MAX_FADE_TIME and MAX_FADE_STEPS whichever
+    caller (route, timer or automation) starts the fade.
+
+    Returns:
+        False if the concurrent fade limit is reached, True otherwise
+    """
+    pin = light['pin']
+    with fade_lock:
+        if pin not in fading_pins and not fade_limit.acquire():
+            return False
+        generation = fade_generations.get(pin, 0) + 1
+        fade_generations[pin] = generation
+        fading_pins[pin] = generation
+    fade_time = min(fade_time, MAX_FADE_TIME)
+    steps = min(max(int(steps), 1), MAX_FADE_STEPS)
+    
+    # Get current brightness
+    current_brightness = gpio_controller.get_brightness(light['pin'])
+    
+    # Calculate step size and delay
+    brightness_diff = target_brightness - current_brightness
+    step_size = brightness_diff / steps
+    step_delay = fade_time / steps
+    
+    def fade_task():
+        try:
+            for step in range(steps + 1):
+                if fade_generations.get(pin) != generation:
+                    return  # Superseded by a newer fade
+                new_brightness = current_brightness + (step_size * step)
+                try:
+                    # Intermediate steps are fire-and-forget; a backed-up
+                    # queue merges them so only the latest one is applied
+                    command_queue.submit(SET_BRIGHTNESS, light['pin'], new_brightness)
+                except QueueFullError:
+                    pass
+                yield step_delay
+            
+            # Ensure final brightness is exactly the target
+            apply_light_command(light, SET_BRIGHTNESS, target_brightness)
+            
+        except Exception as e:
+            logger.error(f"Error during fade operation: {str(e)}")
+        finally:
+            with fade_lock:
+                # A superseded fade's slot already belongs to its successor
+                if fading_pins.get(pin) == generation:
+                    del fading_pins[pin]
+                    fade_limit.release()
+    
+    # Start fade in the background
+    task_runner.spawn(fade_task(), name=f"fade-{pin}")
+    return True
+
+def run_light_action(action):
+    """Perform an automation rule or input binding action"""
+    if action['type'] == 'all':
+        for light in CONFIG['lights']:
+            set_light_on(light, action['state'] in (True, 'on'))
+        return
+    
+    if action['type'] == 'group':
+        group = [l for l in CONFIG['lights'] if l['id'] in action['light_ids']]
+        mode = action.get('action', 'toggle')
+        # Toggling a group turns everything off if any light is on
+        on = mode == 'on' or (mode == 'toggle' and not any(l['state'] for l in group))
+        for light in group:
+            set_light_on(light, on)
+        return
+    
+    light = next((l for l in CONFIG['lights'] if l['id'] == action['light_id']), None)
+    if not light:
+        logger.warning(f"Light action: Light {action['light_id']} not found")
+        return
+    
+    if action['type'] == 'toggle':
+        apply_light_command(light, TOGGLE)
+    elif action['type'] == 'set':
+        set_light_on(light, action['state'] in (True, 'on'))
+    elif light.get('type') != 'pwm':
+        logger.warning(f"Light action: Light {light['name']} does not support brightness")
+    elif action['type'] == 'brightness':
+        apply_light_command(light, SET_BRIGHTNESS, action['brightness'])
+    elif action['type'] == 'fade':
+        if not start_fade(light, action['brightness'], action['fade_time'], action['steps']):
+            logger.warning(f"Light action: too many fades in progress, skipped fade of {light['name']}")
+
+def set_daylight_brightness(light_id, brightness):
+    """Queue a daylight adjustment without waiting, like intermediate fade steps"""
+    try:
+        command_queue.submit(SET_BRIGHTNESS, LIGHTS_BY_ID[light_id]['pin'], brightness)
+    except QueueFullError:
+        pass
+
+def get_light_brightness(light_id):
+    return gpio_controller.get_brightness(LIGHTS_BY_ID[light_id]['pin'])
+
+# Daylight harvesting zones, run by a fixed-rate control task started with the timer worker
+daylight_controller = DaylightController(set_daylight_brightness, get_light_brightness,
+                                         interval=CONFIG['daylight']['interval'], clock=clock)
+for zone_config in CONFIG['daylight']['zones']:
+    zone_lights = zone_config.get('light_ids', [])
+    try:
+        sensor = make_sensor(zone_config.get('sensor', {}), clock,
+                             lambda ids=zone_lights: sum(get_light_brightness(i) for i in ids) / len(ids))
+        daylight_controller.add_zone(DaylightZone(
+            zone_config, sensor, [l['id'] for l in CONFIG['lights'] if l.get('type') == 'pwm']))
+    except (DaylightConfigError, SensorError) as e:
+        logger.error(f"Daylight zone {zone_config.get('name', zone_config.get('id'))} disabled: {str(e)}")
+
+automation_engine = AutomationEngine(run_light_action, [light['id'] for light in CONFIG['lights']], clock=clock)
+automation_engine.start()
+
+# Physical inputs: edges are debounced and turned into gestures on one dispatcher thread
+input_dispatcher = InputDispatcher(run_light_action, [light['id'] for light in CONFIG['lights']])
+for input_config in CONFIG['inputs']:
+    input_state = input_dispatcher.add_input(input_config)
+    gpio_controller.setup_input_pin(input_state.pin, input_dispatcher.on_edge, pull_up=input_state.pull_up)
+    input_dispatcher.set_initial_level(input_state.pin, gpio_controller.get_input_state(input_state.pin))
+input_dispatcher.start()
+
+def get_mqtt_light_state(light_id):
+    """State published to MQTT for a light (Home Assistant JSON schema, brightness 0-100)"""
+    light = next((l for l in CONFIG['lights'] if l['id'] == light_id), None)
+    if not light:
+        return None
+    state = {'state': 'ON' if light['state'] else 'OFF'}
+    if light.get('type') == 'pwm':
+        state['brightness'] = round(light.get('brightness', 0))
+    return state
+
+def handle_mqtt_command(light_id, command):
+    """
+    Apply a command received over MQTT
+
+    Args:
+        light_id: Target light ID, or None for every light
+        command: Dict with 'state' (ON/OFF/TOGGLE) and optional 'brightness'
+            (0-100) and 'transition' (fade seconds)
+    """
+    if light_id is None:
+        lights = CONFIG['lights']
+    else:
+        lights = [l for l in CONFIG['lights'] if l['id'] == light_id]
+        if not lights:
+            logger.warning(f"MQTT command: Light {light_id} not found")
+            return
+    
+    state = str(command.get('state', 'ON')).upper()
+    brightness = command.get('brightness')
+    transition = float(command.get('transition', 0) or 0)
+    
+    for light in lights:
+        if state == 'TOGGLE':
+            apply_light_command(light, TOGGLE)
+        elif light.get('type') == 'pwm' and (brightness is not None or transition > 0):
+            target = 0.0 if state == 'OFF' else max(0.0, min(100.0, float(100 if brightness is None else brightness)))
+            if transition > 0:
+                if not start_fade(light, target, transition):
+                    logger.warning(f"MQTT command: too many fades in progress, skipped fade of {light['name']}")
+            else:
+                apply_light_command(light, SET_BRIGHTNESS, target)
+        else:
+            set_light_on(light, state != 'OFF')
+
+# MQTT bridge: one connection and one thread; state changes are published once per frame
+mqtt_bridge = None
+if CONFIG['mqtt']['enabled']:
+    mqtt_bridge = MQTTBridge(CONFIG['mqtt'], get_mqtt_light_state, handle_mqtt_command)
+    mqtt_bridge.start([light['id'] for light in CONFIG['lights']])
+
+def queue_full_response():
+    """Response sent when the command queue applies backpressure"""
+    response = jsonify({'success': False, 'error': 'Too many pending commands, retry shortly'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+def limit_response(message, retry_after=1):
+    """Response sent when a client exceeds a rate or resource limit"""
+    response = jsonify({'success': False, 'error': message})
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response, 429
+
+def request_cost():
+    """Token cost of the current request, weighted by the work it causes"""
+    if request.method in ('GET', 'HEAD', 'OPTIONS'):
+        return 1.0
+    if request.endpoint == 'fade_light':
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return 1.0  # Rejected by the handler
+        try:
+            steps = int(data.get('steps', 50))
+        except (TypeError, ValueError, OverflowError):
+            return 1.0
+        # Every 50 fade steps cost as much as one extra write
+        return 2.0 + min(max(steps, 0), MAX_FADE_STEPS) / 50.0
+    if request.endpoint == 'create_timer':
+        return 5.0
+    if request.endpoint == 'import_timers':
+        # Charged once per import; large imports take a full bucket
+        data = request.get_json(silent=True)
+        timers = data.get('timers') if isinstance(data, dict) else data
+        return 5.0 + (len(timers) if isinstance(timers, list) else 0) / 10.0
+    return 2.0
+
+@app.before_request
+def start_request_span():
+    """Note the request start time while span tracing is on"""
+    if tracer.enabled:
+        g.span_start = time.perf_counter()
+
+@app.after_request
+def finish_request_span(response):
+    """Record a span for the request handled while span tracing is on"""
+    start = g.get('span_start')
+    if start is not None:
+        tracer.record(f"route.{request.endpoint or 'unknown'}", start, time.perf_counter(),
+                      {'method': request.method, 'status': response.status_code})
+    return response
+
+@app.before_request
+def apply_rate_limit():
+    """Reject API requests from clients that exhausted their token bucket"""
+    if not request.path.startswith('/api/'):
+        return None
+    
+    allowed, retry_after = rate_limiter.consume(request.remote_addr or 'unknown',
+                                                request.endpoint or request.path, request_cost())
+    if not allowed:
+        return limit_response('Rate limit exceeded, retry later', retry_after)
+    return None
+
+# Precompile the web interface once; light state is fetched by the page from /api/lights.
+# With the dashboard disabled no template environment is created and only the API is served.
+if ENABLE_DASHBOARD:
+    from dashboard_assets import (DashboardAssets, make_response as make_asset_response,
+                                  IMMUTABLE_CACHE_CONTROL, SHELL_CACHE_CONTROL)
+
+    dashboard_assets = DashboardAssets(app.static_folder)
+    dashboard_assets.add_file('dashboard.css', os.path.join('css', 'dashboard.css'))
+    dashboard_assets.add_file('dashboard.js', os.path.join('js', 'dashboard.js'))
+    dashboard_assets.build_shell(app.jinja_env, 'index.html')
+
+    @app.route('/')
+    def index():
+        """Serve the precompiled main control interface"""
+        return make_asset_response(Response, request, dashboard_assets.shell, SHELL_CACHE_CONTROL)
+
+    @app.route('/assets/<path:filename>')
+    def dashboard_asset(filename):
+        """Serve a content-hashed dashboard asset"""
+        asset = dashboard_assets.get(filename)
+        if not asset:
+            return jsonify({'success': False, 'error': 'Asset not found'}), 404
+        return make_asset_response(Response, request, asset, IMMUTABLE_CACHE_CONTROL)
 
 @app.route('/api/lights', methods=['GET'])
 def get_lights():
@@ -109,18 +536,8 @@ def toggle_light(light_id):
         if not light:
             return jsonify({'success': False, 'error': 'Light not found'}), 404
         
-        if light.get('type') == 'pwm':
-            # For PWM lights, toggle between 0 and 100% brightness
-            current_brightness = gpio_controller.get_brightness(light['pin'])
-            new_brightness = 0.0 if current_brightness > 0 else 100.0
-            gpio_controller.set_brightness(light['pin'], new_brightness)
-            light['brightness'] = new_brightness
-            light['state'] = new_brightness > 0
-            new_state = light['state']
-        else:
-            # Toggle the light
-            new_state = gpio_controller.toggle_pin(light['pin'])
-            light['state'] = new_state
+        # PWM lights toggle between 0 and 100% brightness
+        new_state = bool(apply_light_command(light, TOGGLE))
         
         logger.info(f"Light {light['name']} (pin {light['pin']}) toggled to {'ON' if new_state else 'OFF'}")
         
@@ -129,6 +546,8 @@ def toggle_light(light_id):
             'light': light,
             'message': f"Light {light['name']} turned {'ON' if new_state else 'OFF'}"
         })
+    except QueueFullError:
+        return queue_full_response()
     except Exception as e:
         logger.error(f"Error toggling light {light_id}: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -147,15 +566,8 @@ def set_light(light_id):
         
         state = bool(data['state'])
         
-        if light.get('type') == 'pwm':
-            # For PWM lights, set brightness to full or off
-            brightness = 100.0 if state else 0.0
-            gpio_controller.set_brightness(light['pin'], brightness)
-            light['brightness'] = brightness
-            light['state'] = state
-        else:
-            gpio_controller.set_pin(light['pin'], state)
-            light['state'] = state
+        # For PWM lights, set brightness to full or off
+        set_light_on(light, state)
         
         logger.info(f"Light {light['name']} (pin {light['pin']}) set to {'ON' if state else 'OFF'}")
         
@@ -164,6 +576,8 @@ def set_light(light_id):
             'light': light,
             'message': f"Light {light['name']} turned {'ON' if state else 'OFF'}"
         })
+    except QueueFullError:
+        return queue_full_response()
     except Exception as e:
         logger.error(f"Error setting light {light_id}: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -187,9 +601,7 @@ def set_brightness(light_id):
         if brightness < 0 or brightness > 100:
             return jsonify({'success': False, 'error': 'Brightness must be between 0 and 100'}), 400
         
-        gpio_controller.set_brightness(light['pin'], brightness)
-        light['brightness'] = brightness
-        light['state'] = brightness > 0
+        apply_light_command(light, SET_BRIGHTNESS, brightness)
         
         logger.info(f"Light {light['name']} (pin {light['pin']}) brightness set to {brightness}%")
         
@@ -198,6 +610,8 @@ def set_brightness(light_id):
             'light': light,
             'message': f"Light {light['name']} brightness set to {brightness}%"
         })
+    except QueueFullError:
+        return queue_full_response()
     except Exception as e:
         logger.error(f"Error setting brightness for light {light_id}: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -206,8 +620,8 @@ def set_brightness(light_id):
 def fade_light(light_id):
     """Fade LED to specified brightness over time"""
     try:
-        data = request.get_json()
-        if not data or 'brightness' not in data:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict) or 'brightness' not in data:
             return jsonify({'success': False, 'error': 'Brightness parameter required'}), 400
         
         light = next((l for l in CONFIG['lights'] if l['id'] == light_id), None)
@@ -217,41 +631,24 @@ def fade_light(light_id):
         if light.get('type') != 'pwm':
             return jsonify({'success': False, 'error': 'Light does not support brightness control'}), 400
         
-        target_brightness = float(data['brightness'])
-        fade_time = float(data.get('fade_time', 1.0))  # Default 1 second
-        steps = int(data.get('steps', 50))  # Default 50 steps
-        
-        if target_brightness < 0 or target_brightness > 100:
-            return jsonify({'success': False, 'error': 'Brightness must be between 0 and 100'}), 400
-        
-        if fade_time <= 0:
-            return jsonify({'success': False, 'error': 'Fade time must be positive'}), 400
+        try:
+            target_brightness = float(data['brightness'])
+            fade_time = float(data.get('fade_time', 1.0))  # Default 1 second
+            steps = int(data.get('steps', 50))  # Default 50 steps
+        except (TypeError, ValueError, OverflowError):
+            return jsonify({'success': False, 'error': 'brightness, fade_time and steps must be numbers'}), 400
         
-        # Get current brightness
-        current_brightness = gpio_controller.get_brightness(light['pin'])
+        if steps < 1 or steps > MAX_FADE_STEPS:
+            return jsonify({'success': False, 'error': f'Steps must be between 1 and {MAX_FADE_STEPS}'}), 400
         
-        # Calculate step size and delay
-        brightness_diff = target_brightness - current_brightness
-        step_size = brightness_diff / steps
-        step_delay = fade_time / steps
+        if not 0 <= target_brightness <= 100:
+            return jsonify({'success': False, 'error': 'Brightness must be between 0 and 100'}), 400
         
-        def fade_thread():
-            try:
-                for step in range(steps + 1):
-                    new_brightness = current_brightness + (step_size * step)
-                    gpio_controller.set_brightness(light['pin'], new_brightness)
-                    time.sleep(step_delay)
-                
-                # Ensure final brightness is exactly the target
-                gpio_controller.set_brightness(light['pin'], target_brightness)
-                light['brightness'] = target_brightness
-                light['state'] = target_brightness > 0
-                
-            except Exception as e:
-                logger.error(f"Error during fade operation: {str(e)}")
+        if not 0 < fade_time <= MAX_FADE_TIME:
+            return jsonify({'success': False, 'error': f'Fade time must be between 0 and {MAX_FADE_TIME} seconds'}), 400
         
-        # Start fade in background thread
-        threading.Thread(target=fade_thread, daemon=True).start()
+        if not start_fade(light, target_brightness, fade_time, steps):
+            return limit_response('Too many fades in progress, retry later')
         
         logger.info(f"Started fade for light {light['name']} (pin {light['pin']}) to {target_brightness}% over {fade_time}s")
         
@@ -268,13 +665,7 @@ def turn_all_lights_on():
     """Turn all lights on"""
     try:
         for light in CONFIG['lights']:
-            if light.get('type') == 'pwm':
-                gpio_controller.set_brightness(light['pin'], 100.0)
-                light['brightness'] = 100.0
-                light['state'] = True
-            else:
-                gpio_controller.set_pin(light['pin'], True)
-                light['state'] = True
+            set_light_on(light, True)
         
         logger.info("All lights turned ON")
         return jsonify({
@@ -282,6 +673,8 @@ def turn_all_lights_on():
             'lights': CONFIG['lights'],
             'message': 'All lights turned ON'
         })
+    except QueueFullError:
+        return queue_full_response()
     except Exception as e:
         logger.error(f"Error turning all lights on: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -291,13 +684,7 @@ def turn_all_lights_off():
     """Turn all lights off"""
     try:
         for light in CONFIG['lights']:
-            if light.get('type') == 'pwm':
-                gpio_controller.set_brightness(light['pin'], 0.0)
-                light['brightness'] = 0.0
-                light['state'] = False
-            else:
-                gpio_controller.set_pin(light['pin'], False)
-                light['state'] = False
+            set_light_on(light, False)
         
         logger.info("All lights turned OFF")
         return jsonify({
@@ -305,10 +692,41 @@ def turn_all_lights_off():
             'lights': CONFIG['lights'],
             'message': 'All lights turned OFF'
         })
+    except QueueFullError:
+        return queue_full_response()
     except Exception as e:
         logger.error(f"Error turning all lights off: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/schema', methods=['GET'])
+def get_schema():
+    """Get the wire formats offered and the field table of the terse schema"""
+    return jsonify({
+        'success': True,
+        'formats': OFFERED,
+        'fields': FIELDS
+    })
+
+def get_memory_stats():
+    """Memory profile settings and current process memory (RSS from /proc where available)"""
+    stats = {
+        'low_memory': LOW_MEMORY,
+        'dashboard': ENABLE_DASHBOARD,
+        'thread_stack_kb': THREAD_STACK_KB or None,
+        'task_workers': TASK_WORKERS or None,
+        'threads': threading.active_count(),
+        'rss_kb': None
+    }
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    stats['rss_kb'] = int(line.split()[1])
+                    break
+    except OSError:
+        pass
+    return stats
+
 @app.route('/api/status', methods=['GET'])
 def get_status():
     """Get system status"""
@@ -316,26 +734,262 @@ def get_status():
         return jsonify({
             'success': True,
             'status': 'running',
-            'timestamp': datetime.now().isoformat(),
+            'timestamp': clock.now().isoformat(),
             'gpio_mode': gpio_controller.get_mode(),
             'total_lights': len(CONFIG['lights']),
-            'active_timers': len([t for t in TIMERS if t.get('active', True)])
+            'active_timers': len([t for t in TIMERS if t.get('active', True)]),
+            'timer_batches': timer_stats,
+            'schedule_cache': schedule_cache.get_stats(),
+            'command_queue': command_queue.get_stats(),
+            'history': history_recorder.get_stats(),
+            'automation': automation_engine.get_stats(),
+            'rate_limit': rate_limiter.get_stats(),
+            'inputs': input_dispatcher.get_stats(),
+            'daylight': daylight_controller.get_stats(),
+            'tracing': tracer.get_stats(),
+            'mqtt': mqtt_bridge.get_stats() if mqtt_bridge else None,
+            'active_fades': fade_limit.active,
+            'memory': get_memory_stats()
         })
     except Exception as e:
         logger.error(f"Error getting status: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def parse_time_param(value, default):
+    """Parse an epoch-seconds or ISO 8601 query parameter into epoch seconds"""
+    if value is None or value == '':
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+
+@app.route('/api/history', methods=['GET'])
+def get_history():
+    """Get recorded light changes or hourly usage rollups for a time range"""
+    try:
+        now = time.time()
+        try:
+            end = parse_time_param(request.args.get('to'), now)
+            start = parse_time_param(request.args.get('from'), end - 24 * 3600)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': f'Invalid time format: {str(e)}'}), 400
+        
+        if start >= end:
+            return jsonify({'success': False, 'error': 'from must be before to'}), 400
+        
+        light_id = request.args.get('light_id', type=int)
+        resolution = request.args.get('resolution', 'raw')
+        
+        if resolution == 'raw':
+            limit = min(max(request.args.get('limit', 1000, type=int), 1), 10000)
+            data = history_recorder.query_events(start, end, light_id=light_id, limit=limit)
+        elif resolution == 'hour':
+            watts = {light['id']: light.get('watts', DEFAULT_LIGHT_WATTS) for light in CONFIG['lights']}
+            data = history_recorder.query_rollups(start, end, light_id=light_id, watts=watts)
+        else:
+            return jsonify({'success': False, 'error': 'Invalid resolution. Must be raw or hour'}), 400
+        
+        return jsonify({
+            'success': True,
+            'from': start,
+            'to': end,
+            'resolution': resolution,
+            'history': data
+        })
+    except Exception as e:
+        logger.error(f"Error getting history: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+def timers_changed():
+    """Invalidate cached schedule previews (call with timer_lock held)"""
+    global timer_version
+    timer_version += 1
+
+class TimerError(ValueError):
+    """Raised when a timer definition is invalid"""
+    
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+def build_timer(data, now):
+    """
+    Validate a timer definition and build the stored timer
+
+    Args:
+        data: Timer definition as sent to POST /api/timers
+        now: Current local datetime
+
+    Returns:
+        The TimerRecord (without its 'seq')
+
+    Raises:
+        TimerError: If the definition is invalid
+    """
+    if not isinstance(data, dict):
+        raise TimerError('Timer must be a JSON object')
+    
+    required_fields = ['light_id', 'action', 'time']
+    for field in required_fields:
+        if field not in data:
+            raise TimerError(f'Missing required field: {field}')
+    
+    try:
+        light_id = int(data['light_id'])
+    except (TypeError, ValueError):
+        raise TimerError('light_id must be an integer')
+    action = data['action']  # 'on', 'off', or 'brightness'
+    timer_time = data['time']  # ISO format or HH:MM
+    brightness = data.get('brightness', 100)  # For brightness action
+    repeat = data.get('repeat', 'once')  # 'once', 'daily', 'weekdays', 'weekends'
+    try:
+        priority = int(data.get('priority', 0))  # Wins conflicts with timers firing at the same time
+    except (TypeError, ValueError):
+        raise TimerError('priority must be an integer')
+    
+    # Validate light exists
+    light = next((l for l in CONFIG['lights'] if l['id'] == light_id), None)
+    if not light:
+        raise TimerError('Light not found', 404)
+    
+    # Validate action
+    if action not in ['on', 'off', 'brightness']:
+        raise TimerError('Invalid action. Must be on, off, or brightness')
+    if repeat not in TIMER_REPEAT_MODES:
+        raise TimerError(f"Invalid repeat. Must be one of {', '.join(TIMER_REPEAT_MODES)}")
+    if action == 'brightness':
+        if isinstance(brightness, bool) or not isinstance(brightness, (int, float)) \
+                or not 0 <= brightness <= 100:
+            raise TimerError('Brightness must be a number between 0 and 100')
+        brightness = float(brightness)
+    
+    # Parse time
+    try:
+        if 'T' in timer_time:  # ISO format
+            scheduled_time = datetime.fromisoformat(timer_time.replace('Z', '+00:00'))
+        else:  # HH:MM format
+            time_parts = timer_time.split(':')
+            scheduled_time = now.replace(hour=int(time_parts[0]), minute=int(time_parts[1]), second=0, microsecond=0)
+            # If time has passed today, schedule for tomorrow (for repeating timers)
+            if scheduled_time <= now and repeat != 'once':
+                scheduled_time += timedelta(days=1)
+            elif scheduled_time <= now and repeat == 'once':
+                raise TimerError('Timer time must be in the future')
+            # First run must fall on a day the repeat mode allows
+            while not allowed_day(scheduled_time, repeat):
+                scheduled_time += timedelta(days=1)
+    except TimerError:
+        raise
+    except Exception as e:
+        raise TimerError(f'Invalid time format: {str(e)}')
+    
+    return TimerRecord(**{
+        'id': str(uuid.uuid4()),
+        'light_id': light_id,
+        'light_name': light['name'],
+        'action': action,
+        'brightness': brightness if action == 'brightness' else None,
+        'time': scheduled_time.isoformat(),
+        'repeat': repeat,
+        'priority': priority,
+        'active': True,
+        'created_at': now.isoformat()
+    })
+
+def add_timers(timers):
+    """
+    Store validated timers in one locked pass
+
+    Returns:
+        False if they would exceed MAX_TIMERS (nothing is stored), True otherwise
+    """
+    global next_timer_seq
+    with timer_lock:
+        if len(TIMERS) + len(timers) > MAX_TIMERS:
+            return False
+        for timer in timers:
+            next_timer_seq += 1
+            timer['seq'] = next_timer_seq
+        TIMERS.extend(timers)
+        timers_changed()
+    return True
+
+def select_timers(after_seq, limit, light_id=None, active=None, repeat=None, start=None, end=None):
+    """
+    Copy one page of timers matching the filters
+
+    The lock is held only to find and copy the page; encoding happens later.
+    TIMERS is ordered by 'seq', so the cursor position is found by bisection.
+
+    Returns:
+        (timers, next_cursor) where next_cursor is None on the last page
+    """
+    page = []
+    with timer_lock:
+        index = bisect.bisect_right(TIMERS, after_seq, key=lambda t: t['seq'])
+        for timer in itertools.islice(TIMERS, index, None):
+            if light_id is not None and timer['light_id'] != light_id:
+                continue
+            if active is not None and timer.get('active', True) != active:
+                continue
+            if repeat is not None and timer['repeat'] != repeat:
+                continue
+            if start is not None or end is not None:
+                fire_at = datetime.fromisoformat(timer['time']).timestamp()
+                if (start is not None and fire_at < start) or (end is not None and fire_at >= end):
+                    continue
+            if len(page) == limit:
+                return page, str(page[-1]['seq'])
+            page.append(dict(timer))
+    return page, None
+
+def stream_timers(timers, next_cursor, fmt):
+    """Encode a timer page item by item as JSON or NDJSON"""
+    if fmt == 'ndjson':
+        for timer in timers:
+            yield json.dumps(timer) + '\n'
+        return
+    
+    yield '{"success": true, "timers": ['
+    for i, timer in enumerate(timers):
+        yield (',' if i else '') + json.dumps(timer)
+    yield '], "next_cursor": ' + json.dumps(next_cursor) + '}'
+
 # Timer Management Routes
 
 @app.route('/api/timers', methods=['GET'])
 def get_timers():
-    """Get all timers"""
+    """List timers, optionally filtered and paginated with a cursor"""
     try:
-        with timer_lock:
-            return jsonify({
-                'success': True,
-                'timers': TIMERS
-            })
+        args = request.args
+        try:
+            after_seq = int(args.get('cursor') or 0)
+            limit = min(max(args.get('limit', MAX_TIMERS, type=int), 1), MAX_TIMERS)
+            active = args.get('active')
+            if active is not None:
+                active = active.lower() in ('1', 'true', 'yes')
+            start = parse_time_param(args.get('from'), None)
+            end = parse_time_param(args.get('to'), None)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': f'Invalid parameter: {str(e)}'}), 400
+        
+        fmt = args.get('format', 'json')
+        if fmt not in ('json', 'ndjson'):
+            return jsonify({'success': False, 'error': 'Invalid format. Must be json or ndjson'}), 400
+        
+        timers, next_cursor = select_timers(after_seq, limit, light_id=args.get('light_id', type=int),
+                                            active=active, repeat=args.get('repeat'), start=start, end=end)
+        
+        if fmt == 'json' and (negotiated_type() != JSON or wants_terse()):
+            # Binary and terse encodings are not streamed
+            return jsonify({'success': True, 'timers': timers, 'next_cursor': next_cursor})
+        
+        response = Response(stream_timers(timers, next_cursor, fmt),
+                            mimetype='application/x-ndjson' if fmt == 'ndjson' else 'application/json')
+        if next_cursor:
+            response.headers['X-Next-Cursor'] = next_cursor
+        return response
     except Exception as e:
         logger.error(f"Error getting timers: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -350,68 +1004,66 @@ def create_timer():
         if not data:
             return jsonify({'success': False, 'error': 'No data provided'}), 400
         
-        required_fields = ['light_id', 'action', 'time']
-        for field in required_fields:
-            if field not in data:
-                return jsonify({'success': False, 'error': f'Missing required field: {field}'}), 400
+        try:
+            timer = build_timer(data, clock.now())
+        except TimerError as e:
+            return jsonify({'success': False, 'error': str(e)}), e.status
         
-        light_id = int(data['light_id'])
-        action = data['action']  # 'on', 'off', or 'brightness'
-        timer_time = data['time']  # ISO format or HH:MM
-        brightness = data.get('brightness', 100)  # For brightness action
-        repeat = data.get('repeat', 'once')  # 'once', 'daily', 'weekdays', 'weekends'
+        if not add_timers([timer]):
+            return limit_response(f'Timer limit of {MAX_TIMERS} reached', 60)
         
-        # Validate light exists
-        light = next((l for l in CONFIG['lights'] if l['id'] == light_id), None)
-        if not light:
-            return jsonify({'success': False, 'error': 'Light not found'}), 404
+        scheduled_time = datetime.fromisoformat(timer['time'])
+        logger.info(f"Timer created: {timer['id']} for {timer['light_name']} at {scheduled_time}")
         
-        # Validate action
-        if action not in ['on', 'off', 'brightness']:
-            return jsonify({'success': False, 'error': 'Invalid action. Must be on, off, or brightness'}), 400
+        return jsonify({
+            'success': True,
+            'timer': dict(timer),
+            'message': f"Timer set for {timer['light_name']} to {timer['action']} at {scheduled_time.strftime('%H:%M')}"
+        })
+    except Exception as e:
+        logger.error(f"Error creating timer: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/timers/bulk', methods=['POST'])
+def import_timers():
+    """Validate and create many timers at once"""
+    try:
+        data = request.get_json(silent=True)
+        if isinstance(data, dict):
+            definitions = data.get('timers')
+            atomic = data.get('atomic', True)
+        else:
+            definitions, atomic = data, True
+        if not isinstance(definitions, list) or not definitions:
+            return jsonify({'success': False, 'error': 'Expected a non-empty list of timers'}), 400
+        if len(definitions) > MAX_TIMERS:
+            return jsonify({'success': False, 'error': f'At most {MAX_TIMERS} timers per import'}), 400
         
-        # Parse time
-        try:
-            if 'T' in timer_time:  # ISO format
-                scheduled_time = datetime.fromisoformat(timer_time.replace('Z', '+00:00'))
-            else:  # HH:MM format
-                time_parts = timer_time.split(':')
-                now = datetime.now()
-                scheduled_time = now.replace(hour=int(time_parts[0]), minute=int(time_parts[1]), second=0, microsecond=0)
-                # If time has passed today, schedule for tomorrow (for repeating timers)
-                if scheduled_time <= now and repeat != 'once':
-                    scheduled_time += timedelta(days=1)
-                elif scheduled_time <= now and repeat == 'once':
-                    return jsonify({'success': False, 'error': 'Timer time must be in the future'}), 400
-        except Exception as e:
-            return jsonify({'success': False, 'error': f'Invalid time format: {str(e)}'}), 400
+        # Validate everything before taking the lock
+        now = clock.now()
+        timers, errors = [], []
+        for index, definition in enumerate(definitions):
+            try:
+                timers.append(build_timer(definition, now))
+            except TimerError as e:
+                errors.append({'index': index, 'error': str(e)})
         
-        # Create timer
-        timer_id = str(uuid.uuid4())
-        timer = {
-            'id': timer_id,
-            'light_id': light_id,
-            'light_name': light['name'],
-            'action': action,
-            'brightness': brightness if action == 'brightness' else None,
-            'time': scheduled_time.isoformat(),
-            'repeat': repeat,
-            'active': True,
-            'created_at': datetime.now().isoformat()
-        }
+        if errors and atomic:
+            return jsonify({'success': False, 'error': 'Invalid timers, nothing imported', 'errors': errors}), 400
         
-        with timer_lock:
-            TIMERS.append(timer)
+        if not add_timers(timers):
+            return limit_response(f'Timer limit of {MAX_TIMERS} reached', 60)
         
-        logger.info(f"Timer created: {timer_id} for {light['name']} at {scheduled_time}")
+        logger.info(f"Timers imported: {len(timers)} created, {len(errors)} rejected")
         
         return jsonify({
             'success': True,
-            'timer': timer,
-            'message': f"Timer set for {light['name']} to {action} at {scheduled_time.strftime('%H:%M')}"
+            'created': len(timers),
+            'ids': [timer['id'] for timer in timers],
+            'errors': errors
         })
     except Exception as e:
-        logger.error(f"Error creating timer: {str(e)}")
+        logger.error(f"Error importing timers: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/timers/<timer_id>', methods=['DELETE'])
@@ -424,6 +1076,7 @@ def delete_timer(timer_id):
                 return jsonify({'success': False, 'error': 'Timer not found'}), 404
             
             TIMERS.remove(timer)
+            timers_changed()
         
         logger.info(f"Timer deleted: {timer_id}")
         
@@ -445,18 +1098,344 @@ def toggle_timer(timer_id):
                 return jsonify({'success': False, 'error': 'Timer not found'}), 404
             
             timer['active'] = not timer.get('active', True)
+            timers_changed()
         
         logger.info(f"Timer {timer_id} toggled to {'active' if timer['active'] else 'inactive'}")
         
         return jsonify({
             'success': True,
-            'timer': timer,
+            'timer': dict(timer),
             'message': f"Timer {'activated' if timer['active'] else 'deactivated'}"
         })
     except Exception as e:
         logger.error(f"Error toggling timer: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/schedule', methods=['GET'])
+def get_schedule():
+    """Preview upcoming timer runs in a time range, in time order"""
+    try:
+        # Timers have minute resolution; a default range starting on the minute lets
+        # repeated previews within that minute share a cache entry
+        now = clock.now().replace(second=0, microsecond=0)
+        try:
+            start = parse_time_param(request.args.get('from'), now.timestamp())
+            end = parse_time_param(request.args.get('to'), start + 24 * 3600)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': f'Invalid time format: {str(e)}'}), 400
+        
+        if start >= end:
+            return jsonify({'success': False, 'error': 'from must be before to'}), 400
+        if end - start > MAX_SCHEDULE_DAYS * 86400:
+            return jsonify({'success': False, 'error': f'Range is limited to {MAX_SCHEDULE_DAYS} days'}), 400
+        
+        limit = min(max(request.args.get('limit', 500, type=int), 1), MAX_SCHEDULE_OCCURRENCES)
+        light_id = request.args.get('light_id', type=int)
+        
+        with timer_lock:
+            version = timer_version
+        
+        range_start, range_end = datetime.fromtimestamp(start), datetime.fromtimestamp(end)
+        
+        def compute():
+            # Timers are only copied on a cache miss
+            with timer_lock:
+                timers = [dict(t) for t in TIMERS
+                          if t.get('active', True) and (light_id is None or t['light_id'] == light_id)]
+            return merge_schedule(timers, range_start, range_end, limit)
+        
+        occurrences, truncated = schedule_cache.get(version, (start, end, limit, light_id), compute)
+        
+        return jsonify({
+            'success': True,
+            'from': range_start.isoformat(),
+            'to': range_end.isoformat(),
+            'version': version,
+            'truncated': truncated,
+            'occurrences': occurrences
+        })
+    except Exception as e:
+        logger.error(f"Error getting schedule: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# Physical Input Routes
+
+@app.route('/api/inputs', methods=['GET'])
+def get_inputs():
+    """Get all configured switch/button inputs"""
+    try:
+        return jsonify({
+            'success': True,
+            'inputs': input_dispatcher.list_inputs()
+        })
+    except Exception as e:
+        logger.error(f"Error getting inputs: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/inputs/<int:input_id>/inject', methods=['POST'])
+def inject_input(input_id):
+    """Simulate a switch/button edge (simulation mode only)"""
+    try:
+        if gpio_controller.get_mode() != 'simulation':
+            return jsonify({'success': False, 'error': 'Input injection is only available in simulation mode'}), 403
+        
+        data = request.get_json()
+        if not data or 'active' not in data:
+            return jsonify({'success': False, 'error': 'Active parameter required'}), 400
+        
+        input_state = next((i for i in input_dispatcher.inputs.values() if i.id == input_id), None)
+        if not input_state:
+            return jsonify({'success': False, 'error': 'Input not found'}), 404
+        
+        active = bool(data['active'])
+        gpio_controller.inject_input_event(input_state.pin, active != input_state.active_low)
+        
+        return jsonify({
+            'success': True,
+            'message': f"Input {input_state.name} {'activated' if active else 'released'}"
+        })
+    except Exception as e:
+        logger.error(f"Error injecting input event: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# Daylight Harvesting Routes
+
+@app.route('/api/daylight', methods=['GET'])
+def get_daylight():
+    """Get daylight zones with their filtered lux readings and control loop metrics"""
+    try:
+        return jsonify({
+            'success': True,
+            'zones': daylight_controller.list_zones(),
+            'stats': daylight_controller.get_stats()
+        })
+    except Exception as e:
+        logger.error(f"Error getting daylight zones: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/daylight/<int:zone_id>', methods=['POST'])
+def update_daylight_zone(zone_id):
+    """Enable/disable a daylight zone or change its target lux"""
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({'success': False, 'error': 'No data provided'}), 400
+        if not isinstance(data, dict):
+            return jsonify({'success': False, 'error': 'Body must be an object'}), 400
+        
+        zone = daylight_controller.zones.get(zone_id)
+        if not zone:
+            return jsonify({'success': False, 'error': 'Zone not found'}), 404
+        
+        if 'target_lux' in data:
+            try:
+                target_lux = float(data['target_lux'])
+            except (TypeError, ValueError):
+                return jsonify({'success': False, 'error': 'target_lux must be a number'}), 400
+            if not math.isfinite(target_lux) or target_lux < 0:
+                return jsonify({'success': False, 'error': 'target_lux must be a finite, non-negative number'}), 400
+            zone.target_lux = target_lux
+        if 'enabled' in data:
+            zone.enabled = bool(data['enabled'])
+        
+        logger.info(f"Daylight zone {zone.name}: {'enabled' if zone.enabled else 'disabled'}, "
+                    f"target {zone.target_lux} lux")
+        
+        return jsonify({
+            'success': True,
+            'zone': zone.to_dict()
+        })
+    except Exception as e:
+        logger.error(f"Error updating daylight zone: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# Automation Rule Routes
+
+@app.route('/api/automations', methods=['GET'])
+def get_automations():
+    """Get all automation rules"""
+    try:
+        return jsonify({
+            'success': True,
+            'rules': automation_engine.list_rules()
+        })
+    except Exception as e:
+        logger.error(f"Error getting automation rules: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/automations', methods=['POST'])
+def create_automation():
+    """Create a new automation rule"""
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({'success': False, 'error': 'No data provided'}), 400
+        if not isinstance(data, dict):
+            return jsonify({'success': False, 'error': 'Rule must be an object'}), 400
+        
+        data.pop('id', None)
+        try:
+            rule = automation_engine.add_rule(data)
+        except RuleError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        return jsonify({
+            'success': True,
+            'rule': rule.to_dict(),
+            'message': f"Automation rule '{rule.name}' created"
+        })
+    except Exception as e:
+        logger.error(f"Error creating automation rule: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/automations/<rule_id>', methods=['DELETE'])
+def delete_automation(rule_id):
+    """Delete an automation rule"""
+    try:
+        if not automation_engine.remove_rule(rule_id):
+            return jsonify({'success': False, 'error': 'Rule not found'}), 404
+        
+        logger.info(f"Automation rule deleted: {rule_id}")
+        
+        return jsonify({
+            'success': True,
+            'message': 'Automation rule deleted successfully'
+        })
+    except Exception as e:
+        logger.error(f"Error deleting automation rule: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/automations/<rule_id>/toggle', methods=['POST'])
+def toggle_automation(rule_id):
+    """Toggle automation rule active state"""
+    try:
+        rule = automation_engine.get_rule(rule_id)
+        if not rule:
+            return jsonify({'success': False, 'error': 'Rule not found'}), 404
+        
+        rule = automation_engine.set_active(rule_id, not rule.active)
+        
+        return jsonify({
+            'success': True,
+            'rule': rule.to_dict(),
+            'message': f"Automation rule {'activated' if rule.active else 'deactivated'}"
+        })
+    except Exception as e:
+        logger.error(f"Error toggling automation rule: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# Admin diagnostics routes
+
+def admin_denied():
+    """
+    Error response unless the request may use the admin endpoints
+
+    With ADMIN_TOKEN set the request must carry it; without one, only
+    clients on the loopback interface are allowed.
+    """
+    if ADMIN_TOKEN:
+        token = request.headers.get('X-Admin-Token', '')
+        if not hmac.compare_digest(token.encode('utf-8'), ADMIN_TOKEN.encode('utf-8')):
+            return jsonify({'success': False, 'error': 'Admin token required'}), 403
+        return None
+    try:
+        local = ipaddress.ip_address(request.remote_addr or '').is_loopback
+    except ValueError:
+        local = False
+    if not local:
+        return jsonify({'success': False,
+                        'error': 'Admin endpoints are local-only unless ADMIN_TOKEN is set'}), 403
+    return None
+
+@app.route('/api/admin/profile', methods=['POST'])
+def start_profile():
+    """Start the sampling profiler for a bounded window"""
+    denied = admin_denied()
+    if denied:
+        return denied
+    try:
+        data = request.get_json(silent=True) or {}
+        try:
+            duration = float(data.get('duration', 30))
+            interval = float(data.get('interval_ms', 10)) / 1000.0
+        except (AttributeError, TypeError, ValueError):
+            return jsonify({'success': False, 'error': 'duration and interval_ms must be numbers'}), 400
+        if not (math.isfinite(duration) and math.isfinite(interval)):
+            return jsonify({'success': False, 'error': 'duration and interval_ms must be finite numbers'}), 400
+        
+        if not profiler.start(duration, interval):
+            return jsonify({'success': False, 'error': 'Profiler is already running'}), 409
+        
+        return jsonify({'success': True, 'profiler': profiler.get_stats()})
+    except Exception as e:
+        logger.error(f"Error starting profiler: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/admin/profile/stop', methods=['POST'])
+def stop_profile():
+    """Stop the sampling profiler before its window ends"""
+    denied = admin_denied()
+    if denied:
+        return denied
+    try:
+        profiler.stop()
+        return jsonify({'success': True, 'profiler': profiler.get_stats()})
+    except Exception as e:
+        logger.error(f"Error stopping profiler: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/admin/profile', methods=['GET'])
+def get_profile():
+    """Get the last profile as collapsed stacks (text) or with profiler stats (JSON)"""
+    denied = admin_denied()
+    if denied:
+        return denied
+    try:
+        if request.args.get('format', 'collapsed') == 'json':
+            return jsonify({'success': True, 'profiler': profiler.get_stats(),
+                            'collapsed': profiler.collapsed().splitlines()})
+        return Response(profiler.collapsed(), mimetype='text/plain')
+    except Exception as e:
+        logger.error(f"Error getting profile: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/admin/trace', methods=['POST'])
+def configure_trace():
+    """Turn span tracing on or off and optionally clear the buffer"""
+    denied = admin_denied()
+    if denied:
+        return denied
+    try:
+        data = request.get_json(silent=True) or {}
+        if not isinstance(data, dict):
+            return jsonify({'success': False, 'error': 'Body must be an object'}), 400
+        if 'enabled' in data:
+            tracer.set_enabled(data['enabled'])
+        if data.get('clear'):
+            tracer.clear()
+        return jsonify({'success': True, 'tracing': tracer.get_stats()})
+    except Exception as e:
+        logger.error(f"Error configuring tracing: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/admin/trace', methods=['GET'])
+def get_trace():
+    """Get recent spans (newest first) and per-name timing summary"""
+    denied = admin_denied()
+    if denied:
+        return denied
+    try:
+        limit = min(max(request.args.get('limit', 500, type=int), 1), 4096)
+        return jsonify({
+            'success': True,
+            'tracing': tracer.get_stats(),
+            'summary': tracer.get_summary(),
+            'spans': tracer.get_spans(request.args.get('name'), limit)
+        })
+    except Exception as e:
+        logger.error(f"Error getting trace: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.errorhandler(404)
 def not_found(error):
     return jsonify({'success': False, 'error': 'Endpoint not found'}), 404
@@ -468,104 +1447,185 @@ def internal_error(error):
 def cleanup_gpio():
     """Clean up GPIO on app shutdown"""
     logger.info("Cleaning up GPIO...")
+    profiler.stop()
+    if mqtt_bridge:
+        mqtt_bridge.stop()
+    input_dispatcher.stop()
+    automation_engine.stop()
+    command_queue.stop()
+    history_recorder.flush()
+    if state_table:
+        state_table.close(remove=True)
     gpio_controller.cleanup()
 
-def timer_worker():
-    """Background worker to check and execute timers"""
-    logger.info("Timer worker started")
+def timer_rank(timer):
+    """
+    Conflict priority of a timer: when several timers for one light fire at the
+    same instant, the highest 'priority' wins and ties go to the newest timer
+    """
+    return timer.get('priority', 0), timer.get('seq', 0)
+
+def timer_command(light, timer):
+    """GPIO command (kind, value) a timer applies to its light, or None if unsupported"""
+    if timer['action'] == 'brightness':
+        if light.get('type') != 'pwm':
+            return None
+        return SET_BRIGHTNESS, float(timer['brightness'])
+    on = timer['action'] == 'on'
+    if light.get('type') == 'pwm':
+        return SET_BRIGHTNESS, 100.0 if on else 0.0
+    return SET_STATE, on
+
+def execute_timer_batch(fire_time, timers):
+    """
+    Apply every timer scheduled for the same instant as one GPIO update
+
+    Conflicting timers on a light are resolved with timer_rank(), then the net
+    command for each light is queued in one batch and awaited together. A
+    timer that fails is logged and skipped; the rest of the batch still runs.
+
+    Args:
+        fire_time: Scheduled time shared by the timers (ISO string)
+        timers: The due timers
+    """
+    started = time.perf_counter()
+    winners = {}  # light id -> (light, timer, command)
+    applicable = 0
     
-    while True:
+    for timer in timers:
+        light = LIGHTS_BY_ID.get(timer['light_id'])
+        if not light:
+            logger.warning(f"Timer {timer['id']}: Light {timer['light_id']} not found")
+            continue
         try:
-            now = datetime.now()
+            command = timer_command(light, timer)
+        except (TypeError, ValueError) as e:
+            logger.error(f"Timer {timer['id']}: invalid command: {str(e)}")
+            continue
+        if command is None:
+            logger.warning(f"Timer {timer['id']}: Light {light['name']} does not support brightness")
+            continue
+        applicable += 1
+        current = winners.get(light['id'])
+        if current is None or timer_rank(timer) > timer_rank(current[1]):
+            winners[light['id']] = (light, timer, command)
+    
+    if not winners:
+        return
+    
+    try:
+        futures = command_queue.submit_batch([(kind, light['pin'], value)
+                                              for light, _, (kind, value) in winners.values()])
+    except QueueFullError:
+        logger.error(f"Timer batch {fire_time}: command queue full, {len(winners)} light updates dropped")
+        return
+    for future, (light, timer, _) in zip(futures, winners.values()):
+        try:
+            future.result(timeout=COMMAND_TIMEOUT)
+        except Exception as e:
+            logger.error(f"Timer {timer['id']}: error updating {light['name']}: {str(e)}")
+    
+    finished = time.perf_counter()
+    latency_ms = (finished - started) * 1000.0
+    conflicts = applicable - len(winners)
+    if tracer.enabled:
+        tracer.record('timer.batch', started, finished, {'fire_time': fire_time, 'timers': len(timers)})
+    timer_stats['batches'] += 1
+    timer_stats['timers'] += len(timers)
+    timer_stats['conflicts'] += conflicts
+    timer_stats['last_batch_ms'] = round(latency_ms, 2)
+    timer_stats['max_batch_ms'] = round(max(timer_stats['max_batch_ms'], latency_ms), 2)
+    timer_stats['last_batch_size'] = len(timers)
+    
+    changes = ', '.join(f"{light['name']} {timer['action']}" +
+                        (f" {timer['brightness']}%" if timer['action'] == 'brightness' else '')
+                        for light, timer, _ in winners.values())
+    logger.info(f"Timer batch {fire_time}: {len(timers)} timers, {conflicts} overridden, "
+                f"applied in {latency_ms:.1f} ms ({changes})")
+
+def run_due_timers(now):
+    """
+    Execute every active timer due at the given time and reschedule repeating ones
+
+    Due timers are grouped by their scheduled time and each group is applied
+    as one batch (see execute_timer_batch).
+
+    Args:
+        now: Current local datetime
+    """
+    with timer_lock:
+        batches = {}  # scheduled time -> due timers
+        timers_to_remove = []
+        
+        for timer in TIMERS:
+            if not timer.get('active', True):
+                continue
             
-            with timer_lock:
-                timers_to_execute = []
-                timers_to_remove = []
-                
-                for timer in TIMERS:
-                    if not timer.get('active', True):
-                        continue
-                    
-                    timer_time = datetime.fromisoformat(timer['time'])
-                    
-                    # Check if it's time to execute
-                    if now >= timer_time:
-                        timers_to_execute.append(timer)
-                        
-                        # Handle repeat logic
-                        if timer['repeat'] == 'once':
-                            timers_to_remove.append(timer)
-                        elif timer['repeat'] == 'daily':
-                            # Schedule for next day
-                            next_time = timer_time + timedelta(days=1)
-                            timer['time'] = next_time.isoformat()
-                        elif timer['repeat'] == 'weekdays':
-                            # Schedule for next weekday
-                            next_time = timer_time + timedelta(days=1)
-                            while next_time.weekday() >= 5:  # Saturday = 5, Sunday = 6
-                                next_time += timedelta(days=1)
-                            timer['time'] = next_time.isoformat()
-                        elif timer['repeat'] == 'weekends':
-                            # Schedule for next weekend day
-                            next_time = timer_time + timedelta(days=1)
-                            while next_time.weekday() < 5:  # Monday-Friday = 0-4
-                                next_time += timedelta(days=1)
-                            timer['time'] = next_time.isoformat()
-                
-                # Remove one-time timers
-                for timer in timers_to_remove:
-                    TIMERS.remove(timer)
+            timer_time = datetime.fromisoformat(timer['time'])
             
-            # Execute timers (outside lock to avoid blocking)
-            for timer in timers_to_execute:
-                try:
-                    light_id = timer['light_id']
-                    action = timer['action']
-                    light = next((l for l in CONFIG['lights'] if l['id'] == light_id), None)
-                    
-                    if not light:
-                        logger.warning(f"Timer {timer['id']}: Light {light_id} not found")
-                        continue
-                    
-                    if action == 'on':
-                        if light.get('type') == 'pwm':
-                            gpio_controller.set_brightness(light['pin'], 100.0)
-                            light['brightness'] = 100.0
-                            light['state'] = True
-                        else:
-                            gpio_controller.set_pin(light['pin'], True)
-                            light['state'] = True
-                        logger.info(f"Timer executed: {light['name']} turned ON")
-                    
-                    elif action == 'off':
-                        if light.get('type') == 'pwm':
-                            gpio_controller.set_brightness(light['pin'], 0.0)
-                            light['brightness'] = 0.0
-                            light['state'] = False
-                        else:
-                            gpio_controller.set_pin(light['pin'], False)
-                            light['state'] = False
-                        logger.info(f"Timer executed: {light['name']} turned OFF")
-                    
-                    elif action == 'brightness':
-                        if light.get('type') == 'pwm':
-                            brightness = timer['brightness']
-                            gpio_controller.set_brightness(light['pin'], brightness)
-                            light['brightness'] = brightness
-                            light['state'] = brightness > 0
-                            logger.info(f"Timer executed: {light['name']} brightness set to {brightness}%")
-                        else:
-                            logger.warning(f"Timer {timer['id']}: Light {light['name']} does not support brightness")
+            # Check if it's time to execute
+            if now >= timer_time:
+                batches.setdefault(timer_time, []).append(dict(timer))
                 
-                except Exception as e:
-                    logger.error(f"Error executing timer {timer.get('id', 'unknown')}: {str(e)}")
-            
-            # Check every 10 seconds
-            time.sleep(10)
-            
+                # Handle repeat logic
+                next_time = next_occurrence(timer_time, timer['repeat'])
+                if next_time is None:
+                    timers_to_remove.append(timer)
+                else:
+                    timer['time'] = next_time.isoformat()
+        
+        # Remove one-time timers
+        for timer in timers_to_remove:
+            TIMERS.remove(timer)
+        if batches:
+            timers_changed()
+    
+    # Execute batches in time order (outside lock to avoid blocking)
+    for fire_time in sorted(batches):
+        try:
+            execute_timer_batch(fire_time.isoformat(), batches[fire_time])
+        except Exception as e:
+            logger.error(f"Error executing timer batch {fire_time.isoformat()}: {str(e)}")
+
+def timer_worker():
+    """Background task to check and execute timers, yielding the seconds to sleep"""
+    logger.info("Timer worker started")
+    
+    while True:
+        try:
+            run_due_timers(clock.now())
         except Exception as e:
             logger.error(f"Error in timer worker: {str(e)}")
-            time.sleep(10)
+        
+        # Check every 10 seconds
+        yield TIMER_CHECK_INTERVAL
+
+def history_checkpoint_worker():
+    """Background task persisting the history rollups, yielding the seconds to sleep"""
+    while True:
+        yield HISTORY_CHECKPOINT_INTERVAL
+        try:
+            history_recorder.checkpoint()
+        except Exception as e:
+            logger.error(f"Error checkpointing history: {str(e)}")
+
+def use_clock(new_clock, new_runner):
+    """
+    Switch the service to another clock and task runner
+
+    Used by tests to run timers, fades and the simulated GPIO timeline in
+    virtual time (see clock.VirtualClock and clock.SimulationRunner).
+    """
+    global clock, task_runner
+    clock = new_clock
+    task_runner = new_runner
+    gpio_controller.clock = new_clock
+    input_dispatcher.clock = new_clock
+    automation_engine.clock = new_clock
+    daylight_controller.clock = new_clock
+    for zone in daylight_controller.zones.values():
+        if hasattr(zone.sensor, 'clock'):
+            zone.sensor.clock = new_clock
 
 if __name__ == '__main__':
     try:
@@ -576,10 +1636,13 @@ if __name__ == '__main__':
         logger.info("Starting GPIO Light Control Web Service...")
         logger.info(f"Configured lights: {[light['name'] for light in CONFIG['lights']]}")
         
-        # Start timer worker thread
-        timer_thread = threading.Thread(target=timer_worker, daemon=True)
-        timer_thread.start()
+        # Start timer worker
+        task_runner.spawn(timer_worker(), name='timer-worker')
         logger.info("Timer worker thread started")
+        task_runner.spawn(history_checkpoint_worker(), name='history-checkpoint')
+        
+        if daylight_controller.zones:
+            task_runner.spawn(daylight_controller.control_task(), name='daylight-control')
         
         # Run the Flask app
         app.run(
@@ -0,0 +1,449 @@
+#!/usr/bin/env python3
+"""
+Automation Module
+Rule engine that reacts to light state changes. Rules are compiled once and
+indexed by the lights their triggers reference, so a change only re-evaluates
+the rules that depend on the light that changed.
+"""
+
+import heapq
+import itertools
+import logging
+import threading
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Set
+
+from clock import Clock
+
+logger = logging.getLogger(__name__)
+
+# Trigger types
+TRIGGER_CHANGE = 'change'        # A light turns on/off
+TRIGGER_STATE_FOR = 'state_for'  # Lights have been in a state for a duration
+
+ACTION_TYPES = ('set', 'brightness', 'fade', 'all')
+
+# Fade limits, shared with the service's /fade endpoint
+MAX_FADE_STEPS = 1000
+MAX_FADE_TIME = 600  # Seconds
+
+
+class RuleError(ValueError):
+    """Raised when a rule definition is invalid"""
+
+
+def _parse_minutes(value: str) -> int:
+    """Convert HH:MM into minutes since midnight"""
+    try:
+        hours, minutes = value.split(':')
+        hours, minutes = int(hours), int(minutes)
+    except (AttributeError, ValueError):
+        raise RuleError(f"Invalid time '{value}', expected HH:MM")
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        raise RuleError(f"Invalid time '{value}', expected HH:MM")
+    return hours * 60 + minutes
+
+
+def _parse_state(value) -> bool:
+    if value not in ('on', 'off'):
+        raise RuleError("State must be 'on' or 'off'")
+    return value == 'on'
+
+
+class Rule:
+    """A compiled automation rule"""
+
+    def __init__(self, spec: dict, known_lights: Set[int]):
+        """
+        Compile a rule definition
+
+        Args:
+            spec: Rule definition (see README for the format)
+            known_lights: IDs of configured lights, used for validation
+
+        Raises:
+            RuleError: If the definition is invalid
+        """
+        if not isinstance(spec, dict):
+            raise RuleError('Rule must be an object')
+
+        self.id = spec.get('id') or str(uuid.uuid4())
+        self.name = spec.get('name', 'Unnamed rule')
+        self.active = bool(spec.get('active', True))
+        self.known_lights = known_lights
+
+        trigger = spec.get('trigger')
+        if not isinstance(trigger, dict):
+            raise RuleError('Missing required field: trigger')
+        self._compile_trigger(trigger)
+
+        self.conditions: List[Callable[[datetime, Dict[int, float]], bool]] = [
+            self._compile_condition(c) for c in spec.get('conditions', [])
+        ]
+
+        actions = spec.get('actions')
+        if not actions or not isinstance(actions, list):
+            raise RuleError('Missing required field: actions')
+        self.actions = [self._validate_action(a) for a in actions]
+
+        self.armed = False  # state_for rules: currently counting down
+        self.deadline: Optional[float] = None  # Monotonic time the countdown ends
+        self.fired = False  # Fired for the current run of the state; cleared when it breaks
+        self.fired_count = 0
+        self.last_fired: Optional[str] = None
+
+        self.spec = {
+            'id': self.id,
+            'name': self.name,
+            'trigger': trigger,
+            'conditions': spec.get('conditions', []),
+            'actions': actions,
+        }
+
+    def _check_light(self, light_id) -> int:
+        try:
+            light_id = int(light_id)
+        except (TypeError, ValueError):
+            raise RuleError(f"Invalid light_id: {light_id}")
+        if light_id not in self.known_lights:
+            raise RuleError(f"Light {light_id} not found")
+        return light_id
+
+    def _compile_trigger(self, trigger: dict) -> None:
+        self.trigger_type = trigger.get('type', TRIGGER_CHANGE)
+
+        if self.trigger_type == TRIGGER_CHANGE:
+            self.light_ids = {self._check_light(trigger.get('light_id'))}
+            to = trigger.get('to', 'any')
+            self.to_state = None if to == 'any' else _parse_state(to)
+            self.for_seconds = 0.0
+        elif self.trigger_type == TRIGGER_STATE_FOR:
+            light_ids = trigger.get('light_ids', 'all')
+            if light_ids == 'all':
+                self.light_ids = set(self.known_lights)
+            elif isinstance(light_ids, list) and light_ids:
+                self.light_ids = {self._check_light(l) for l in light_ids}
+            else:
+                raise RuleError("light_ids must be a non-empty list or 'all'")
+            self.to_state = _parse_state(trigger.get('state', 'off'))
+            try:
+                self.for_seconds = float(trigger.get('for_seconds', 0))
+            except (TypeError, ValueError):
+                raise RuleError('for_seconds must be a number')
+            if self.for_seconds < 0:
+                raise RuleError('for_seconds must not be negative')
+        else:
+            raise RuleError(f"Invalid trigger type. Must be {TRIGGER_CHANGE} or {TRIGGER_STATE_FOR}")
+
+    def _compile_condition(self, condition: dict):
+        if not isinstance(condition, dict):
+            raise RuleError('Condition must be an object')
+        kind = condition.get('type')
+
+        if kind == 'time':
+            after = _parse_minutes(condition['after']) if 'after' in condition else None
+            before = _parse_minutes(condition['before']) if 'before' in condition else None
+            days = condition.get('days', list(range(7)))  # 0 = Monday
+            if not isinstance(days, list) or not all(isinstance(d, int) and 0 <= d <= 6 for d in days):
+                raise RuleError('days must be a list of weekday numbers 0-6 (0 = Monday)')
+            days = set(days)
+
+            def check_time(now: datetime, states: Dict[int, float]) -> bool:
+                if now.weekday() not in days:
+                    return False
+                minute = now.hour * 60 + now.minute
+                if after is not None and before is not None and after > before:
+                    return minute >= after or minute < before  # Wraps past midnight
+                if after is not None and minute < after:
+                    return False
+                if before is not None and minute >= before:
+                    return False
+                return True
+            return check_time
+
+        if kind == 'light':
+            light_id = self._check_light(condition.get('light_id'))
+            state = _parse_state(condition['state']) if 'state' in condition else None
+            try:
+                low = float(condition.get('min_brightness', 0))
+                high = float(condition.get('max_brightness', 100))
+            except (TypeError, ValueError):
+                raise RuleError('min_brightness and max_brightness must be numbers')
+            if not 0 <= low <= high <= 100:
+                raise RuleError('Brightness range must satisfy 0 <= min_brightness <= max_brightness <= 100')
+
+            def check_light(now: datetime, states: Dict[int, float]) -> bool:
+                value = states.get(light_id, 0.0)
+                if state is not None and (value > 0) != state:
+                    return False
+                return low <= value <= high
+            return check_light
+
+        raise RuleError("Invalid condition type. Must be time or light")
+
+    def _validate_action(self, action: dict) -> dict:
+        if not isinstance(action, dict) or action.get('type') not in ACTION_TYPES:
+            raise RuleError(f"Invalid action type. Must be one of {', '.join(ACTION_TYPES)}")
+
+        action = dict(action)
+        if action['type'] == 'all':
+            action['state'] = _parse_state(action.get('state'))
+            return action
+
+        action['light_id'] = self._check_light(action.get('light_id'))
+        if action['type'] == 'set':
+            action['state'] = _parse_state(action.get('state'))
+        else:
+            try:
+                action['brightness'] = float(action['brightness'])
+            except (KeyError, TypeError, ValueError):
+                raise RuleError('Brightness action requires a numeric brightness')
+            if not 0 <= action['brightness'] <= 100:
+                raise RuleError('Brightness must be between 0 and 100')
+        if action['type'] == 'fade':
+            try:
+                action['fade_time'] = float(action.get('fade_time', 1.0))
+                action['steps'] = int(action.get('steps', 50))
+            except (TypeError, ValueError):
+                raise RuleError('fade_time and steps must be numbers')
+            if not 0 < action['fade_time'] <= MAX_FADE_TIME:
+                raise RuleError(f'Fade time must be between 0 and {MAX_FADE_TIME} seconds')
+            if not 1 <= action['steps'] <= MAX_FADE_STEPS:
+                raise RuleError(f'Steps must be between 1 and {MAX_FADE_STEPS}')
+        return action
+
+    def trigger_matches(self, states: Dict[int, float]) -> bool:
+        """For state_for rules: are all referenced lights in the target state?"""
+        return all((states.get(l, 0.0) > 0) == self.to_state for l in self.light_ids)
+
+    def to_dict(self) -> dict:
+        data = dict(self.spec)
+        data.update({
+            'active': self.active,
+            'armed': self.armed,
+            'fired_count': self.fired_count,
+            'last_fired': self.last_fired,
+        })
+        return data
+
+
+class AutomationEngine:
+    """Evaluates rules on light change events in a single background thread"""
+
+    def __init__(self, run_action: Callable[[dict], None], light_ids: Iterable[int],
+                 clock: Optional[Clock] = None):
+        """
+        Initialize the automation engine
+
+        Args:
+            run_action: Called from the engine thread to perform an action dict
+            light_ids: IDs of the configured lights
+            clock: Time source for time-of-day conditions and state_for deadlines
+        """
+        self.run_action = run_action
+        self.clock = clock or Clock()
+        self.known_lights: Set[int] = set(light_ids)
+
+        self._rules: Dict[str, Rule] = {}
+        self._index: Dict[int, List[Rule]] = {}  # light_id -> rules triggered by it
+        self._states: Dict[int, float] = {l: 0.0 for l in self.known_lights}
+
+        self._events: Deque[tuple] = deque()  # (light_id, value)
+        self._deadlines: List[tuple] = []  # heap of (monotonic deadline, seq, rule_id)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+
+        self.stats = {'events': 0, 'evaluations': 0, 'fired': 0}
+
+    def start(self) -> None:
+        """Start the engine thread"""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._worker, name='automation', daemon=True)
+        self._thread.start()
+        logger.info("Automation engine started")
+
+    def stop(self, timeout: float = 2.0) -> None:
+        """Stop the engine thread"""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def add_rule(self, spec: dict) -> Rule:
+        """
+        Compile and register a rule
+
+        Raises:
+            RuleError: If the definition is invalid
+        """
+        rule = Rule(spec, self.known_lights)
+        with self._cond:
+            if rule.id in self._rules:
+                self._unindex(self._rules.pop(rule.id))
+            self._rules[rule.id] = rule
+            for light_id in rule.light_ids:
+                self._index.setdefault(light_id, []).append(rule)
+            if rule.trigger_type == TRIGGER_STATE_FOR:
+                self._update_armed(rule, self.clock.monotonic())
+                self._cond.notify()
+        logger.info(f"Automation rule added: {rule.id} ({rule.name})")
+        return rule
+
+    def remove_rule(self, rule_id: str) -> bool:
+        """Remove a rule, returning False if it does not exist"""
+        with self._cond:
+            rule = self._rules.pop(rule_id, None)
+            if not rule:
+                return False
+            self._unindex(rule)
+        return True
+
+    def set_active(self, rule_id: str, active: bool) -> Optional[Rule]:
+        """Enable or disable a rule"""
+        with self._cond:
+            rule = self._rules.get(rule_id)
+            if rule:
+                rule.active = active
+                rule.armed, rule.deadline, rule.fired = False, None, False
+                if active and rule.trigger_type == TRIGGER_STATE_FOR:
+                    self._update_armed(rule, self.clock.monotonic())
+                    self._cond.notify()
+            return rule
+
+    def get_rule(self, rule_id: str) -> Optional[Rule]:
+        with self._cond:
+            return self._rules.get(rule_id)
+
+    def list_rules(self) -> List[dict]:
+        with self._cond:
+            return [rule.to_dict() for rule in self._rules.values()]
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._cond:
+            return dict(self.stats, rules=len(self._rules))
+
+    def notify(self, light_id: int, value: float) -> None:
+        """
+        Report a light's new brightness (0-100, digital lights 0/100)
+
+        Cheap enough to call from the GPIO command worker: the event is only
+        queued, evaluation happens on the engine thread.
+        """
+        with self._cond:
+            self._events.append((light_id, float(value)))
+            self._cond.notify()
+
+    def _unindex(self, rule: Rule) -> None:
+        for light_id in rule.light_ids:
+            rules = self._index.get(light_id, [])
+            if rule in rules:
+                rules.remove(rule)
+
+    def _update_armed(self, rule: Rule, now: float) -> None:
+        """
+        Arm or disarm a state_for rule from the current states (lock held)
+
+        A rule fires once per run of the state: events that keep the state
+        (e.g. writing 0 to a light that is already off) neither restart the
+        countdown nor re-arm a rule that has fired.
+        """
+        if not rule.active:
+            return
+        if rule.trigger_matches(self._states):
+            if not rule.armed and not rule.fired:
+                rule.armed = True
+                rule.deadline = now + rule.for_seconds
+                heapq.heappush(self._deadlines, (rule.deadline, next(self._seq), rule.id))
+        else:
+            rule.armed, rule.deadline, rule.fired = False, None, False
+
+    def _evaluate_event(self, light_id: int, value: float, due: List[Rule]) -> None:
+        """Update state and collect rules to fire for one event (lock held)"""
+        self.stats['events'] += 1
+        old = self._states.get(light_id, 0.0)
+        self._states[light_id] = value
+        was_on, is_on = old > 0, value > 0
+        now = self.clock.monotonic()
+
+        for rule in self._index.get(light_id, ()):
+            if not rule.active:
+                continue
+            self.stats['evaluations'] += 1
+            if rule.trigger_type == TRIGGER_CHANGE:
+                if was_on != is_on and (rule.to_state is None or rule.to_state == is_on):
+                    due.append(rule)
+            else:
+                self._update_armed(rule, now)
+
+    def _collect_deadlines(self, due: List[Rule]) -> None:
+        """Pop expired state_for deadlines (lock held)"""
+        now = self.clock.monotonic()
+        while self._deadlines and self._deadlines[0][0] <= now:
+            deadline, _, rule_id = heapq.heappop(self._deadlines)
+            rule = self._rules.get(rule_id)
+            # Stale entries belong to countdowns that were broken or restarted since
+            if rule and rule.active and rule.armed and rule.deadline == deadline:
+                rule.armed, rule.deadline = False, None
+                rule.fired = True  # Fire once until the state breaks and re-forms
+                due.append(rule)
+
+    def _collect(self, due: List[Rule]) -> Dict[int, float]:
+        """Handle queued events and expired deadlines, returning the states to fire with (lock held)"""
+        while self._events:
+            self._evaluate_event(*self._events.popleft(), due)
+        self._collect_deadlines(due)
+        return dict(self._states)
+
+    def process_pending(self) -> None:
+        """
+        Handle queued events and expired deadlines and fire the due rules
+
+        The engine thread does this continuously; tests without the thread
+        call it after moving a VirtualClock forward.
+        """
+        due: List[Rule] = []
+        with self._cond:
+            states = self._collect(due)
+        for rule in due:
+            self._fire(rule, states)
+
+    def _fire(self, rule: Rule, states: Dict[int, float]) -> None:
+        """Check conditions and run the actions of a triggered rule"""
+        now = self.clock.now()
+        if not all(condition(now, states) for condition in rule.conditions):
+            return
+
+        self.stats['fired'] += 1
+        rule.fired_count += 1
+        rule.last_fired = now.isoformat()
+        logger.info(f"Automation rule fired: {rule.name}")
+
+        for action in rule.actions:
+            try:
+                self.run_action(action)
+            except Exception as e:
+                logger.error(f"Error running action for rule {rule.name}: {str(e)}")
+
+    def _worker(self) -> None:
+        while True:
+            due: List[Rule] = []
+            with self._cond:
+                while self._running and not self._events and not (
+                        self._deadlines and self._deadlines[0][0] <= self.clock.monotonic()):
+                    timeout = self._deadlines[0][0] - self.clock.monotonic() if self._deadlines else None
+                    self._cond.wait(timeout)
+                if not self._running:
+                    break
+                states = self._collect(due)
+
+            for rule in due:
+                self._fire(rule, states)
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Wire format benchmark
+Compares payload size and encode/decode time of JSON, MessagePack and CBOR,
+each with the full and the terse schema, on typical API documents.
+
+Run with: python bench_wire_format.py [--timers N] [--repeat N]
+"""
+
+import argparse
+import json
+import timeit
+import uuid
+
+from wire_format import CBOR, MSGPACK, from_terse, get_codec, to_terse
+
+
+def sample_lights(count=4):
+    return {'success': True, 'lights': [
+        {'id': i, 'name': f"Light {i}", 'pin': 17 + i, 'state': i % 2 == 0, 'type': 'pwm', 'brightness': 40.0}
+        for i in range(1, count + 1)]}
+
+
+def sample_timers(count):
+    return {'success': True, 'next_cursor': None, 'timers': [
+        {'id': str(uuid.uuid4()), 'seq': i, 'light_id': i % 4 + 1, 'light_name': f"Light {i % 4 + 1}",
+         'action': 'brightness', 'brightness': i % 100, 'time': '2026-01-05T07:00:00', 'repeat': 'daily',
+         'priority': 0, 'active': True, 'created_at': '2026-01-04T10:00:00.123456'}
+        for i in range(count)]}
+
+
+def json_codec():
+    return (lambda obj: json.dumps(obj, separators=(',', ':')).encode('utf-8'),
+            lambda data: json.loads(data))
+
+
+def measure(name, document, encode, decode, terse, repeat, baseline=None):
+    def encode_doc():
+        return encode(to_terse(document) if terse else document)
+
+    def decode_doc():
+        decoded = decode(payload)
+        return from_terse(decoded) if terse else decoded
+
+    payload = encode_doc()
+    encode_us = min(timeit.repeat(encode_doc, number=repeat, repeat=3)) / repeat * 1e6
+    decode_us = min(timeit.repeat(decode_doc, number=repeat, repeat=3)) / repeat * 1e6
+    ratio = len(payload) / baseline if baseline else 1.0
+    print(f"  {name:<18} {len(payload):>9} B {ratio:>6.0%} {encode_us:>11.1f} us {decode_us:>11.1f} us")
+    return len(payload)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--timers', type=int, default=500, help='timers in the timer listing document')
+    parser.add_argument('--repeat', type=int, default=200, help='iterations per measurement')
+    args = parser.parse_args()
+
+    codecs = [('json', json_codec())]
+    for media_type, label in ((MSGPACK, 'msgpack'), (CBOR, 'cbor')):
+        codec = get_codec(media_type)
+        if codec:
+            codecs.append((label, codec))
+        else:
+            print(f"({label} not installed, skipped)")
+
+    documents = [('GET /api/lights', sample_lights(), args.repeat * 10),
+                 (f"GET /api/timers ({args.timers})", sample_timers(args.timers), args.repeat)]
+
+    for title, document, repeat in documents:
+        print(f"\n{title}")
+        print(f"  {'format':<18} {'size':>11} {'vs JSON':>7} {'encode':>14} {'decode':>14}")
+        baseline = None
+        for label, (encode, decode) in codecs:
+            for terse in (False, True):
+                size = measure(label + (' terse' if terse else ''), document, encode, decode, terse,
+                               repeat, baseline)
+                baseline = baseline or size
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Clock Module
+Injectable time source and task runners. Production code uses the system
+clock with one thread per task; tests swap in a VirtualClock and a
+SimulationRunner to replay days of schedules in seconds.
+
+Tasks are generators that yield the number of seconds to sleep before they
+are resumed, so the same task code runs on real threads or in simulated time.
+"""
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Generator, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+Task = Generator[float, None, None]
+
+
+class Clock:
+    """System clock"""
+
+    def now(self) -> datetime:
+        """Current local date and time"""
+        return datetime.now()
+
+    def time(self) -> float:
+        """Current epoch time in seconds"""
+        return time.time()
+
+    def monotonic(self) -> float:
+        """Monotonic seconds for measuring intervals"""
+        return time.monotonic()
+
+    def sleep(self, seconds: float) -> None:
+        """Block the calling thread"""
+        time.sleep(seconds)
+
+
+class VirtualClock(Clock):
+    """Clock whose time only moves when advanced explicitly"""
+
+    def __init__(self, start: Optional[datetime] = None):
+        """
+        Initialize the virtual clock
+
+        Args:
+            start: Initial local date and time (defaults to the current time)
+        """
+        self._start = start or datetime.now()
+        self._start_epoch = self._start.timestamp()
+        self._elapsed = 0.0
+        self._lock = threading.Lock()
+
+    def now(self) -> datetime:
+        return self._start + timedelta(seconds=self._elapsed)
+
+    def time(self) -> float:
+        return self._start_epoch + self._elapsed
+
+    def monotonic(self) -> float:
+        return self._elapsed
+
+    def sleep(self, seconds: float) -> None:
+        """Sleeping on a virtual clock simply moves time forward"""
+        self.advance(seconds)
+
+    def advance(self, seconds: float) -> None:
+        """Move time forward"""
+        if seconds < 0:
+            raise ValueError("Cannot move a clock backwards")
+        with self._lock:
+            self._elapsed += seconds
+
+    def advance_to(self, monotonic: float) -> None:
+        """Move time forward to a monotonic reading (no-op if already past it)"""
+        with self._lock:
+            self._elapsed = max(self._elapsed, monotonic)
+
+
+class ThreadRunner:
+    """Runs each task on its own daemon thread against a clock"""
+
+    def __init__(self, clock: Clock):
+        self.clock = clock
+
+    def spawn(self, task: Task, name: Optional[str] = None) -> None:
+        """Start a task"""
+        def run():
+            for delay in task:
+                self.clock.sleep(delay)
+
+        threading.Thread(target=run, name=name, daemon=True).start()
+
+
+class PooledRunner:
+    """
+    Runs tasks cooperatively on a fixed number of worker threads
+
+    Used by the low-memory profile: any number of fades and loops share the
+    pool instead of each holding a thread and its stack. A task step that
+    blocks delays the other tasks on the same worker, so steps must be short.
+    """
+
+    def __init__(self, clock: Clock, workers: int = 1):
+        self.clock = clock
+        self.workers = max(1, workers)
+        self._tasks: List[tuple] = []  # heap of (wake time, seq, task)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+
+    def spawn(self, task: Task, name: Optional[str] = None) -> None:
+        """Schedule a task to start now"""
+        with self._cond:
+            heapq.heappush(self._tasks, (self.clock.monotonic(), next(self._seq), task))
+            if len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work, name=f"task-worker-{len(self._threads)}",
+                                          daemon=True)
+                self._threads.append(thread)
+                thread.start()
+            self._cond.notify()
+
+    def pending(self) -> int:
+        """Number of tasks scheduled"""
+        with self._cond:
+            return len(self._tasks)
+
+    def _work(self) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    if not self._tasks:
+                        self._cond.wait()
+                        continue
+                    delay = self._tasks[0][0] - self.clock.monotonic()
+                    if delay <= 0:
+                        _, _, task = heapq.heappop(self._tasks)
+                        break
+                    self._cond.wait(delay)
+
+            try:
+                delay = next(task)
+            except StopIteration:
+                continue
+            except Exception as e:
+                logger.error(f"Task failed: {str(e)}")
+                continue
+
+            with self._cond:
+                heapq.heappush(self._tasks, (self.clock.monotonic() + max(0.0, delay),
+                                             next(self._seq), task))
+                self._cond.notify()
+
+
+class SimulationRunner:
+    """Runs tasks cooperatively in virtual time, in deterministic order"""
+
+    def __init__(self, clock: VirtualClock, settle: Optional[Callable[[], None]] = None):
+        """
+        Initialize the simulation runner
+
+        Args:
+            clock: Virtual clock advanced by the runner
+            settle: Called after every task step, e.g. to wait until queued
+                GPIO commands have been applied before time moves on
+        """
+        self.clock = clock
+        self.settle = settle
+        self._tasks: List[tuple] = []  # heap of (wake time, seq, task)
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self.steps = 0
+
+    def spawn(self, task: Task, name: Optional[str] = None) -> None:
+        """Schedule a task to start at the current virtual time"""
+        with self._lock:
+            heapq.heappush(self._tasks, (self.clock.monotonic(), next(self._seq), task))
+
+    def pending(self) -> int:
+        """Number of tasks still scheduled"""
+        with self._lock:
+            return len(self._tasks)
+
+    def run_until(self, end: Union[datetime, float]) -> None:
+        """
+        Run every task step due up to a point in virtual time
+
+        Args:
+            end: Local datetime, or a monotonic reading of the virtual clock
+        """
+        if isinstance(end, datetime):
+            end = self.clock.monotonic() + (end - self.clock.now()).total_seconds()
+
+        while True:
+            with self._lock:
+                if not self._tasks or self._tasks[0][0] > end:
+                    break
+                wake, _, task = heapq.heappop(self._tasks)
+
+            self.clock.advance_to(wake)
+            try:
+                delay = next(task)
+            except StopIteration:
+                delay = None
+            except Exception as e:
+                logger.error(f"Simulated task failed: {str(e)}")
+                delay = None
+
+            self.steps += 1
+            if self.settle:
+                self.settle()
+            if delay is not None:
+                with self._lock:
+                    heapq.heappush(self._tasks, (self.clock.monotonic() + max(0.0, delay),
+                                                 next(self._seq), task))
+
+        self.clock.advance_to(end)
+
+    def run_for(self, seconds: float) -> None:
+        """Run all task steps due within the next number of seconds"""
+        self.run_until(self.clock.monotonic() + seconds)
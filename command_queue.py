@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Command Queue Module
+Serializes all GPIO writes through a single worker thread with per-pin FIFO
+ordering, merging of superseded commands and bounded capacity for backpressure
+"""
+
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Command kinds
+SET_BRIGHTNESS = 'brightness'  # PWM duty cycle, value is 0-100
+SET_STATE = 'state'            # Digital output, value is True/False
+TOGGLE = 'toggle'              # Flip the current output (0/100% for PWM pins)
+
+# Commands that fully determine the final pin output, so anything still
+# pending for the same pin before them can be dropped
+ABSOLUTE_KINDS = (SET_BRIGHTNESS, SET_STATE)
+
+
+class QueueFullError(Exception):
+    """Raised when the command queue has no room for a new command"""
+
+
+class Command:
+    """A pending GPIO write for a single pin"""
+
+    __slots__ = ('kind', 'pin', 'value', 'futures')
+
+    def __init__(self, kind: str, pin: int, value=None):
+        self.kind = kind
+        self.pin = pin
+        self.value = value
+        self.futures: List[Future] = [Future()]
+
+
+class CommandQueue:
+    """Bounded, per-pin ordered queue in front of a GPIOController"""
+
+    def __init__(self, controller, capacity: int = 64,
+                 on_change: Optional[Callable[[int, object], None]] = None, tracer=None):
+        """
+        Initialize the command queue
+
+        Args:
+            controller: GPIOController that executes the commands
+            capacity: Maximum number of pending (unmerged) commands
+            on_change: Called from the worker thread as on_change(pin, value)
+                after each applied command, value being the new brightness
+                (PWM) or state (digital)
+            tracer: Optional profiler.SpanTracer; GPIO writes are traced as 'gpio.<kind>'
+        """
+        self.controller = controller
+        self.capacity = capacity
+        self.on_change = on_change
+        self.tracer = tracer
+
+        self._pending: Dict[int, Deque[Command]] = {}  # pin -> FIFO of commands
+        self._ready: Deque[int] = deque()  # pins with pending commands, round-robin
+        self._size = 0
+        self._busy = False  # Worker is executing a popped command
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+
+        self.stats = {'submitted': 0, 'executed': 0, 'merged': 0, 'rejected': 0, 'failed': 0}
+
+    def start(self) -> None:
+        """Start the worker thread"""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._worker, name='command-queue', daemon=True)
+        self._thread.start()
+        logger.info(f"Command queue started (capacity {self.capacity})")
+
+    def stop(self, timeout: float = 2.0) -> None:
+        """Stop the worker thread after draining pending commands"""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, kind: str, pin: int, value=None) -> Future:
+        """
+        Queue a command for a pin
+
+        Args:
+            kind: SET_BRIGHTNESS, SET_STATE or TOGGLE
+            pin: GPIO pin number
+            value: Brightness (0-100) or state, unused for TOGGLE
+
+        Returns:
+            Future resolved with the pin's value once the command (or the
+            command that superseded it) has been applied
+
+        Raises:
+            QueueFullError: If the queue is at capacity
+        """
+        command = Command(kind, pin, value)
+        with self._cond:
+            self._enqueue(command)
+            self._cond.notify()
+        return command.futures[0]
+
+    def submit_batch(self, commands: List[tuple]) -> List[Future]:
+        """
+        Queue several commands at once, e.g. everything a set of timers does at
+        the same instant, so the worker applies them back to back
+
+        Args:
+            commands: (kind, pin, value) tuples, at most one per pin
+
+        Returns:
+            One future per command, in order
+
+        Raises:
+            QueueFullError: If the queue lacks room for the whole batch (nothing is queued)
+        """
+        batch = [Command(kind, pin, value) for kind, pin, value in commands]
+        with self._cond:
+            if self._size + len(batch) > self.capacity:
+                self.stats['rejected'] += len(batch)
+                raise QueueFullError('Command queue is full')
+            for command in batch:
+                self._enqueue(command)
+            self._cond.notify()
+        return [command.futures[0] for command in batch]
+
+    def _enqueue(self, command: Command) -> None:
+        """Merge and append a command (lock held)"""
+        pin = command.pin
+        pending = self._pending.get(pin)
+        # A pin with pending commands is already scheduled on the ready ring
+        scheduled = bool(pending)
+
+        if command.kind in ABSOLUTE_KINDS and pending:
+            # Supersede everything still waiting for this pin
+            for old in pending:
+                command.futures.extend(old.futures)
+            self.stats['merged'] += len(pending)
+            self._size -= len(pending)
+            pending.clear()
+
+        # A merge always frees at least one slot, so only new work is rejected
+        if self._size >= self.capacity:
+            self.stats['rejected'] += 1
+            raise QueueFullError('Command queue is full')
+
+        self.stats['submitted'] += 1
+        if pending is None:
+            pending = self._pending[pin] = deque()
+        if not scheduled:
+            self._ready.append(pin)
+        pending.append(command)
+        self._size += 1
+
+    def wait_idle(self, timeout: Optional[float] = None) -> bool:
+        """
+        Block until every queued command has been applied
+
+        Returns:
+            False if the timeout expired first
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._size and not self._busy, timeout)
+
+    def pending_count(self) -> int:
+        """Get the number of commands waiting to be executed"""
+        with self._cond:
+            return self._size
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get queue counters and current depth"""
+        with self._cond:
+            return dict(self.stats, pending=self._size, capacity=self.capacity)
+
+    def _next_command(self) -> Optional[Command]:
+        """Pop the next command, waiting until one is available"""
+        with self._cond:
+            while not self._ready:
+                if not self._running:
+                    return None
+                self._cond.wait()
+
+            pin = self._ready.popleft()
+            pending = self._pending[pin]
+            command = pending.popleft()
+            self._size -= 1
+            self._busy = True
+            if pending:
+                self._ready.append(pin)
+            return command
+
+    def _execute(self, command: Command):
+        """Apply a command to the controller and return the new pin value"""
+        pin = command.pin
+
+        if command.kind == SET_BRIGHTNESS:
+            self.controller.set_brightness(pin, command.value)
+            return self.controller.get_brightness(pin)
+
+        if command.kind == SET_STATE:
+            self.controller.set_pin(pin, bool(command.value))
+            return self.controller.get_pin_state(pin)
+
+        if command.kind == TOGGLE:
+            if pin in self.controller.pwm_pins:
+                current = self.controller.get_brightness(pin)
+                self.controller.set_brightness(pin, 0.0 if current > 0 else 100.0)
+                return self.controller.get_brightness(pin)
+            return self.controller.toggle_pin(pin)
+
+        raise ValueError(f"Unknown command kind: {command.kind}")
+
+    def _worker(self) -> None:
+        """Execute queued commands one at a time"""
+        while True:
+            command = self._next_command()
+            if command is None:
+                break
+
+            try:
+                self._run(command)
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def _run(self, command: Command) -> None:
+        """Execute one command and resolve its futures"""
+        try:
+            if self.tracer and self.tracer.enabled:
+                with self.tracer.span(f"gpio.{command.kind}", pin=command.pin):
+                    value = self._execute(command)
+            else:
+                value = self._execute(command)
+        except Exception as e:
+            self.stats['failed'] += 1
+            logger.error(f"Error executing {command.kind} command for pin {command.pin}: {str(e)}")
+            for future in command.futures:
+                future.set_exception(e)
+            return
+
+        self.stats['executed'] += 1
+        if self.on_change:
+            try:
+                self.on_change(command.pin, value)
+            except Exception as e:
+                logger.error(f"Error in command queue change callback: {str(e)}")
+
+        for future in command.futures:
+            future.set_result(value)
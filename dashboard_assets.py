@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Dashboard Assets Module
+Precompiles the web interface at startup into content-hashed, compressed
+variants so a page load is a cached byte send instead of a template render
+"""
+
+import gzip
+import hashlib
+import logging
+import os
+from typing import Dict, Optional
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Hashed assets never change under the same URL, so clients may keep them forever
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# The HTML shell keeps a stable URL and is revalidated through its ETag
+SHELL_CACHE_CONTROL = 'no-cache'
+
+MIMETYPES = {
+    '.css': 'text/css; charset=utf-8',
+    '.js': 'application/javascript; charset=utf-8',
+    '.html': 'text/html; charset=utf-8',
+}
+
+
+class PrecompiledAsset:
+    """A response body held in memory with its pre-compressed variants"""
+
+    def __init__(self, name: str, body: bytes, mimetype: str):
+        """
+        Initialize a precompiled asset
+
+        Args:
+            name: Logical asset name (e.g. dashboard.css)
+            body: Uncompressed response body
+            mimetype: Content-Type header value
+        """
+        self.name = name
+        self.mimetype = mimetype
+        self.digest = hashlib.sha256(body).hexdigest()[:12]
+        self.etag = self.digest
+
+        root, ext = os.path.splitext(name)
+        self.hashed_name = f"{root}.{self.digest}{ext}"
+
+        self.variants: Dict[str, bytes] = {'identity': body}
+        compressed = {'gzip': gzip.compress(body, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            compressed['br'] = brotli.compress(body, quality=11)
+
+        # Only keep encodings that actually save bytes
+        for encoding, data in compressed.items():
+            if len(data) < len(body):
+                self.variants[encoding] = data
+
+    def select_encoding(self, accept_encodings) -> str:
+        """
+        Pick the smallest variant the client accepts
+
+        Args:
+            accept_encodings: Werkzeug Accept-Encoding header object
+
+        Returns:
+            Encoding name ('br', 'gzip' or 'identity')
+        """
+        for encoding in ('br', 'gzip'):
+            if encoding in self.variants and accept_encodings[encoding]:
+                return encoding
+        return 'identity'
+
+
+class DashboardAssets:
+    """Registry of precompiled dashboard files"""
+
+    def __init__(self, static_dir: str):
+        """
+        Initialize the asset registry
+
+        Args:
+            static_dir: Directory holding the dashboard CSS/JS sources
+        """
+        self.static_dir = static_dir
+        self.assets: Dict[str, PrecompiledAsset] = {}  # logical name -> asset
+        self.by_hashed_name: Dict[str, PrecompiledAsset] = {}  # hashed name -> asset
+        self.shell: Optional[PrecompiledAsset] = None
+
+    def add_file(self, name: str, relative_path: str) -> PrecompiledAsset:
+        """
+        Load and precompile a static file
+
+        Args:
+            name: Logical asset name referenced by the template
+            relative_path: Path of the source file inside static_dir
+
+        Returns:
+            The precompiled asset
+        """
+        with open(os.path.join(self.static_dir, relative_path), 'rb') as f:
+            body = f.read()
+
+        ext = os.path.splitext(name)[1]
+        asset = PrecompiledAsset(name, body, MIMETYPES.get(ext, 'application/octet-stream'))
+        self.assets[name] = asset
+        self.by_hashed_name[asset.hashed_name] = asset
+        logger.info(f"Precompiled asset {asset.hashed_name} "
+                    f"({', '.join(f'{k}={len(v)}B' for k, v in asset.variants.items())})")
+        return asset
+
+    def asset_url(self, name: str) -> str:
+        """Return the content-hashed URL for a logical asset name"""
+        return f"/assets/{self.assets[name].hashed_name}"
+
+    def build_shell(self, jinja_env, template_name: str) -> PrecompiledAsset:
+        """
+        Render the HTML shell once with hashed asset URLs
+
+        Args:
+            jinja_env: Jinja environment used to load the template
+            template_name: Template file name (e.g. index.html)
+
+        Returns:
+            The precompiled HTML shell
+        """
+        html = jinja_env.get_template(template_name).render(asset_url=self.asset_url)
+        self.shell = PrecompiledAsset(template_name, html.encode('utf-8'), MIMETYPES['.html'])
+        logger.info(f"Precompiled dashboard shell ({len(self.shell.variants['identity'])}B)")
+        return self.shell
+
+    def get(self, hashed_name: str) -> Optional[PrecompiledAsset]:
+        """Look up an asset by its content-hashed file name"""
+        return self.by_hashed_name.get(hashed_name)
+
+
+def make_response(response_class, request, asset: PrecompiledAsset, cache_control: str):
+    """
+    Build a response for a precompiled asset honouring ETag and Accept-Encoding
+
+    Args:
+        response_class: Flask/Werkzeug Response class
+        request: Current request
+        asset: Asset to send
+        cache_control: Cache-Control header value
+
+    Returns:
+        Response object (304 when the client copy is current)
+    """
+    headers = {
+        'ETag': f'"{asset.etag}"',
+        'Cache-Control': cache_control,
+        'Vary': 'Accept-Encoding',
+    }
+
+    if request.if_none_match.contains(asset.etag):
+        return response_class(status=304, headers=headers)
+
+    encoding = asset.select_encoding(request.accept_encodings)
+    if encoding != 'identity':
+        headers['Content-Encoding'] = encoding
+
+    return response_class(asset.variants[encoding], content_type=asset.mimetype, headers=headers)
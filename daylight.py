@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+Daylight Harvesting Module
+Closed-loop brightness control that holds a target illuminance as daylight
+changes. Ambient light sensors (BH1750 over I2C, MCP3008 ADC over SPI, or a
+simulated sensor) are sampled at a fixed rate, smoothed with streaming
+filters, and each zone's PWM lights are nudged toward the target lux.
+
+The control loop is a clock task (see clock.py), so it runs on its own thread
+in production and in virtual time in tests.
+"""
+
+import logging
+import math
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Iterable, List, Optional
+
+from clock import Clock
+
+logger = logging.getLogger(__name__)
+
+SENSOR_TYPES = ('bh1750', 'mcp3008', 'simulated')
+
+
+class SensorError(Exception):
+    """Raised when a sensor cannot be read"""
+
+
+class DaylightConfigError(ValueError):
+    """Raised when a daylight zone definition is invalid"""
+
+
+class BH1750Sensor:
+    """BH1750 digital lux sensor on the I2C bus (needs the optional smbus2 package)"""
+
+    CONTINUOUS_HIGH_RES = 0x10
+
+    def __init__(self, bus: int = 1, address: int = 0x23):
+        try:
+            from smbus2 import SMBus
+        except ImportError:
+            raise SensorError("smbus2 is not installed")
+        self.address = address
+        self.bus = SMBus(bus)
+        self.bus.write_byte(address, self.CONTINUOUS_HIGH_RES)
+
+    def read(self) -> float:
+        try:
+            high, low = self.bus.read_i2c_block_data(self.address, self.CONTINUOUS_HIGH_RES, 2)
+        except OSError as e:
+            raise SensorError(f"BH1750 read failed: {str(e)}")
+        return ((high << 8) | low) / 1.2
+
+
+class MCP3008Sensor:
+    """Photoresistor/photodiode on an MCP3008 ADC channel (needs the optional spidev package)"""
+
+    def __init__(self, channel: int = 0, bus: int = 0, device: int = 0, lux_per_count: float = 1.0):
+        """
+        Args:
+            channel: ADC channel (0-7)
+            bus: SPI bus
+            device: SPI chip select
+            lux_per_count: Calibration factor from ADC counts (0-1023) to lux
+        """
+        try:
+            import spidev
+        except ImportError:
+            raise SensorError("spidev is not installed")
+        if not 0 <= channel <= 7:
+            raise SensorError("MCP3008 channel must be 0-7")
+        self.channel = channel
+        self.lux_per_count = lux_per_count
+        self.spi = spidev.SpiDev()
+        self.spi.open(bus, device)
+        self.spi.max_speed_hz = 1000000
+
+    def read(self) -> float:
+        try:
+            reply = self.spi.xfer2([1, (8 + self.channel) << 4, 0])
+        except OSError as e:
+            raise SensorError(f"MCP3008 read failed: {str(e)}")
+        return (((reply[1] & 3) << 8) | reply[2]) * self.lux_per_count
+
+
+class SimulatedSensor:
+    """Lux from a daylight curve plus the contribution of the zone's own lights"""
+
+    def __init__(self, clock: Clock, brightness: Callable[[], float], lux_at_full: float = 500.0,
+                 daylight_peak: float = 400.0, ambient: Optional[Callable[[float], float]] = None):
+        """
+        Args:
+            clock: Time source for the daylight curve
+            brightness: Returns the mean brightness (0-100) of the zone's lights
+            lux_at_full: Lux the lights add at 100% brightness
+            daylight_peak: Daylight lux at noon for the default curve
+            ambient: Optional function of the local hour (0-24) giving daylight lux
+        """
+        self.clock = clock
+        self.brightness = brightness
+        self.lux_at_full = lux_at_full
+        self.ambient = ambient or (lambda hour: daylight_peak * max(0.0, math.sin((hour - 6) / 12 * math.pi)))
+
+    def read(self) -> float:
+        now = self.clock.now()
+        hour = now.hour + now.minute / 60 + now.second / 3600
+        return self.ambient(hour) + self.brightness() / 100.0 * self.lux_at_full
+
+
+class MedianFilter:
+    """Streaming median over the last samples, rejecting single-sample spikes"""
+
+    def __init__(self, window: int = 5):
+        self.samples: Deque[float] = deque(maxlen=max(1, window))
+
+    def update(self, value: float) -> float:
+        self.samples.append(value)
+        ordered = sorted(self.samples)
+        return ordered[len(ordered) // 2]
+
+
+class EMAFilter:
+    """Exponential moving average"""
+
+    def __init__(self, alpha: float = 0.3):
+        self.alpha = min(max(alpha, 0.0), 1.0)
+        self.value: Optional[float] = None
+
+    def update(self, value: float) -> float:
+        self.value = value if self.value is None else self.value + self.alpha * (value - self.value)
+        return self.value
+
+
+class DaylightZone:
+    """Lights driven together from one sensor toward a target illuminance"""
+
+    def __init__(self, config: dict, sensor, known_lights: Iterable[int]):
+        """
+        Validate a zone definition
+
+        Args:
+            config: Zone definition (see README for the format)
+            sensor: Object with a read() method returning lux
+            known_lights: IDs of configured PWM lights
+
+        Raises:
+            DaylightConfigError: If the definition is invalid
+        """
+        try:
+            self.id = int(config['id'])
+            self.light_ids = [int(light_id) for light_id in config['light_ids']]
+            self.target_lux = float(config['target_lux'])
+        except (KeyError, TypeError, ValueError):
+            raise DaylightConfigError('Zone requires numeric id, light_ids and target_lux')
+        if not self.light_ids:
+            raise DaylightConfigError('Zone requires at least one light')
+        known = set(known_lights)
+        for light_id in self.light_ids:
+            if light_id not in known:
+                raise DaylightConfigError(f"Light {light_id} not found or not dimmable")
+
+        self.name = config.get('name', f"Zone {self.id}")
+        self.sensor = sensor
+        try:
+            self.deadband = float(config.get('deadband_lux', 25.0))  # No adjustment within +/- this
+            self.gain = float(config.get('gain', 0.05))  # Brightness % per lux of error
+            self.max_step = float(config.get('max_step', 5.0))  # Largest change per loop, in %
+            self.min_brightness = float(config.get('min_brightness', 0.0))
+            self.max_brightness = float(config.get('max_brightness', 100.0))
+            median_window = int(config.get('median_window', 5))
+            ema_alpha = float(config.get('ema_alpha', 0.3))
+        except (TypeError, ValueError, OverflowError):
+            raise DaylightConfigError('Zone control parameters must be numbers')
+        numbers = (self.target_lux, self.deadband, self.gain, self.max_step, ema_alpha)
+        if not all(math.isfinite(value) for value in numbers):
+            raise DaylightConfigError('Zone control parameters must be finite')
+        if self.target_lux < 0 or self.deadband < 0 or self.gain <= 0 or self.max_step <= 0:
+            raise DaylightConfigError('Zone requires target_lux, deadband_lux >= 0 and gain, max_step > 0')
+        if not 0 <= self.min_brightness <= self.max_brightness <= 100:
+            raise DaylightConfigError('Brightness range must satisfy 0 <= min_brightness <= max_brightness <= 100')
+        if median_window < 1 or not 0 < ema_alpha <= 1:
+            raise DaylightConfigError('median_window must be at least 1 and ema_alpha in (0, 1]')
+        self.enabled = bool(config.get('enabled', True))
+        self.filters = [MedianFilter(median_window), EMAFilter(ema_alpha)]
+
+        self.lux: Optional[float] = None  # Filtered reading
+        self.brightness: Optional[float] = None  # Mean brightness of the zone's lights that are on
+        self.dimmed_out = set()  # Lights this zone dimmed to 0; still counted as on
+        self.errors = 0
+
+    def filtered_read(self) -> float:
+        value = self.sensor.read()
+        for stage in self.filters:
+            value = stage.update(value)
+        self.lux = value
+        return value
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'name': self.name,
+            'light_ids': self.light_ids,
+            'enabled': self.enabled,
+            'target_lux': self.target_lux,
+            'deadband_lux': self.deadband,
+            'lux': round(self.lux, 1) if self.lux is not None else None,
+            'brightness': round(self.brightness, 1) if self.brightness is not None else None,
+            'sensor_errors': self.errors,
+        }
+
+
+class DaylightController:
+    """Fixed-rate control loop over all daylight zones"""
+
+    def __init__(self, set_brightness: Callable[[int, float], None],
+                 get_brightness: Callable[[int], float], interval: float = 1.0,
+                 clock: Optional[Clock] = None):
+        """
+        Initialize the controller
+
+        Args:
+            set_brightness: Called as set_brightness(light_id, brightness) for
+                each adjustment; must not block (e.g. queue the write)
+            get_brightness: Returns a light's current brightness (0-100)
+            interval: Seconds between control loops
+            clock: Time source the loop is scheduled on
+        """
+        self.set_brightness = set_brightness
+        self.get_brightness = get_brightness
+        self.interval = interval
+        self.clock = clock or Clock()
+        self.zones: Dict[int, DaylightZone] = {}
+
+        self.stats = {'loops': 0, 'writes': 0, 'holds': 0, 'overruns': 0,
+                      'last_loop_ms': 0.0, 'max_loop_ms': 0.0, 'max_jitter_ms': 0.0}
+
+    def add_zone(self, zone: DaylightZone) -> None:
+        self.zones[zone.id] = zone
+
+    def list_zones(self) -> List[dict]:
+        return [zone.to_dict() for zone in self.zones.values()]
+
+    def get_stats(self) -> dict:
+        return dict(self.stats, zones=len(self.zones), interval=self.interval)
+
+    def step_zone(self, zone: DaylightZone) -> None:
+        """Read a zone's sensor and correct its lights once"""
+        try:
+            lux = zone.filtered_read()
+        except SensorError as e:
+            zone.errors += 1
+            if zone.errors == 1 or zone.errors % 100 == 0:
+                logger.warning(f"Daylight zone {zone.name}: {str(e)}")
+            return
+
+        # Start from the actual output so manual changes are respected. Only lights
+        # that are on are adjusted: a light at 0 the zone did not dim out was switched
+        # off and stays off until it is switched on again.
+        levels = {light_id: self.get_brightness(light_id) for light_id in zone.light_ids}
+        zone.dimmed_out.intersection_update(i for i, level in levels.items() if level <= 0)
+        lit = [i for i, level in levels.items() if level > 0 or i in zone.dimmed_out]
+        if not lit:
+            zone.brightness = 0.0
+            return
+        zone.brightness = sum(levels[i] for i in lit) / len(lit)
+
+        error = zone.target_lux - lux
+        if abs(error) <= zone.deadband:
+            self.stats['holds'] += 1
+            return  # Hysteresis: close enough, leave the lights alone
+
+        change = max(-zone.max_step, min(zone.max_step, error * zone.gain))
+        target = max(zone.min_brightness, min(zone.max_brightness, zone.brightness + change))
+        at_limit = target in (zone.min_brightness, zone.max_brightness)
+        if abs(target - zone.brightness) < (0.05 if at_limit else 0.5):
+            self.stats['holds'] += 1
+            return  # Already at a limit, or too small a change to write
+
+        zone.brightness = target
+        for light_id in lit:
+            self.set_brightness(light_id, round(target, 1))
+            self.stats['writes'] += 1
+        if round(target, 1) <= 0:
+            zone.dimmed_out.update(lit)
+
+    def control_task(self):
+        """Clock task running the loop at a fixed rate, yielding the seconds to sleep"""
+        logger.info(f"Daylight control started ({len(self.zones)} zones every {self.interval}s)")
+        deadline = self.clock.monotonic()
+        while True:
+            started = time.perf_counter()
+            jitter = (self.clock.monotonic() - deadline) * 1000.0
+            for zone in list(self.zones.values()):
+                if zone.enabled:
+                    try:
+                        self.step_zone(zone)
+                    except Exception as e:
+                        logger.error(f"Error in daylight zone {zone.name}: {str(e)}")
+
+            loop_ms = (time.perf_counter() - started) * 1000.0
+            self.stats['loops'] += 1
+            self.stats['last_loop_ms'] = round(loop_ms, 3)
+            self.stats['max_loop_ms'] = round(max(self.stats['max_loop_ms'], loop_ms), 3)
+            self.stats['max_jitter_ms'] = round(max(self.stats['max_jitter_ms'], jitter), 3)
+
+            # Fixed rate: missed loops are skipped rather than run back to back
+            deadline += self.interval
+            now = self.clock.monotonic()
+            if now > deadline:
+                self.stats['overruns'] += 1
+                deadline = now + self.interval - (now - deadline) % self.interval
+            yield deadline - now
+
+
+def make_sensor(config: dict, clock: Clock, brightness: Callable[[], float]):
+    """
+    Create a sensor reader from a zone's 'sensor' definition
+
+    Raises:
+        DaylightConfigError: If the sensor type is unknown
+        SensorError: If the sensor hardware or driver is unavailable
+    """
+    kind = config.get('type')
+    if kind == 'bh1750':
+        return BH1750Sensor(int(config.get('bus', 1)), int(config.get('address', 0x23)))
+    if kind == 'mcp3008':
+        return MCP3008Sensor(int(config.get('channel', 0)), int(config.get('bus', 0)),
+                             int(config.get('device', 0)), float(config.get('lux_per_count', 1.0)))
+    if kind == 'simulated':
+        return SimulatedSensor(clock, brightness, float(config.get('lux_at_full', 500.0)),
+                               float(config.get('daylight_peak', 400.0)))
+    raise DaylightConfigError(f"Invalid sensor type. Must be one of {', '.join(SENSOR_TYPES)}")
@@ -7,23 +7,34 @@ Supports both Raspberry Pi hardware and simulation mode for development
 
 import logging
 import time
-from typing import Dict, List, Optional
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from clock import Clock
 
 logger = logging.getLogger(__name__)
 
 class GPIOController:
     """GPIO Controller for managing light control pins"""
     
-    def __init__(self, simulation_mode: bool = None):
+    def __init__(self, simulation_mode: bool = None, clock: Optional[Clock] = None,
+                 timeline_size: int = 10000):
         """
         Initialize GPIO Controller
         
         Args:
             simulation_mode: If True, run in simulation mode. If None, auto-detect.
+            clock: Time source for input edges and the simulation timeline
+            timeline_size: Output changes kept in the simulation timeline
         """
+        self.clock = clock or Clock()
+        # Simulation mode only: recent (timestamp, pin, value) output changes
+        self.timeline: Deque[Tuple[float, int, float]] = deque(maxlen=timeline_size)
         self.pins: Dict[int, bool] = {}  # pin -> state mapping
         self.pwm_pins: Dict[int, any] = {}  # pin -> PWM object mapping
         self.pwm_values: Dict[int, float] = {}  # pin -> PWM duty cycle (0-100)
+        self.input_pins: Dict[int, bool] = {}  # pin -> last known input level
+        self.input_callbacks: Dict[int, Callable[[int, bool, float], None]] = {}  # pin -> edge callback
         self.simulation_mode = simulation_mode
         
         if simulation_mode is None:
@@ -94,6 +105,79 @@ class GPIOController:
             logger.error(f"Error setting up PWM pin {pin}: {str(e)}")
             raise
     
+    def setup_input_pin(self, pin: int, callback: Callable[[int, bool, float], None],
+                        pull_up: bool = True) -> None:
+        """
+        Setup a GPIO pin for input with an edge-triggered callback
+
+        The callback is called as callback(pin, level, timestamp) on every edge,
+        from the RPi.GPIO event thread on hardware or from inject_input_event()
+        in simulation mode. It should return quickly.
+
+        Args:
+            pin: GPIO pin number (BCM numbering)
+            callback: Edge callback
+            pull_up: Enable the internal pull-up (True) or pull-down (False) resistor
+        """
+        try:
+            idle_level = bool(pull_up)
+            if not self.simulation_mode:
+                pull = self.GPIO.PUD_UP if pull_up else self.GPIO.PUD_DOWN
+                self.GPIO.setup(pin, self.GPIO.IN, pull_up_down=pull)
+                idle_level = bool(self.GPIO.input(pin))
+                self.GPIO.add_event_detect(pin, self.GPIO.BOTH, callback=self._on_hardware_edge)
+                logger.info(f"Pin {pin} configured as input ({'pull-up' if pull_up else 'pull-down'})")
+            else:
+                logger.info(f"[SIMULATION] Pin {pin} configured as input ({'pull-up' if pull_up else 'pull-down'})")
+            
+            self.input_pins[pin] = idle_level
+            self.input_callbacks[pin] = callback
+            
+        except Exception as e:
+            logger.error(f"Error setting up input pin {pin}: {str(e)}")
+            raise
+    
+    def _on_hardware_edge(self, pin: int) -> None:
+        """RPi.GPIO event callback: read the new level and forward the edge"""
+        level = bool(self.GPIO.input(pin))
+        self.input_pins[pin] = level
+        callback = self.input_callbacks.get(pin)
+        if callback:
+            callback(pin, level, self.clock.monotonic())
+    
+    def inject_input_event(self, pin: int, level: bool) -> None:
+        """
+        Simulate an edge on an input pin (simulation mode only)
+        
+        Args:
+            pin: GPIO pin number
+            level: New input level (True = HIGH, False = LOW)
+        """
+        if not self.simulation_mode:
+            raise RuntimeError("Input events can only be injected in simulation mode")
+        if pin not in self.input_pins:
+            raise ValueError(f"Pin {pin} not configured for input. Call setup_input_pin() first.")
+        
+        level = bool(level)
+        self.input_pins[pin] = level
+        logger.debug(f"[SIMULATION] Input pin {pin} edge to {'HIGH' if level else 'LOW'}")
+        self.input_callbacks[pin](pin, level, self.clock.monotonic())
+    
+    def get_input_state(self, pin: int) -> bool:
+        """
+        Get the last known level of an input pin
+        
+        Args:
+            pin: GPIO pin number
+            
+        Returns:
+            Current level (True = HIGH, False = LOW)
+        """
+        if pin not in self.input_pins:
+            raise ValueError(f"Pin {pin} not configured for input. Call setup_input_pin() first.")
+        
+        return self.input_pins[pin]
+    
     def set_pin(self, pin: int, state: bool) -> None:
         """
         Set a GPIO pin to HIGH or LOW
@@ -111,6 +195,7 @@ class GPIOController:
                 logger.debug(f"Pin {pin} set to {'HIGH' if state else 'LOW'}")
             else:
                 logger.debug(f"[SIMULATION] Pin {pin} set to {'HIGH' if state else 'LOW'}")
+                self.timeline.append((self.clock.time(), pin, 1.0 if state else 0.0))
             
             self.pins[pin] = state
             
@@ -139,6 +224,7 @@ class GPIOController:
             else:
                 self.pwm_pins[pin]['duty_cycle'] = duty_cycle
                 logger.debug(f"[SIMULATION] PWM pin {pin} duty cycle set to {duty_cycle}%")
+                self.timeline.append((self.clock.time(), pin, duty_cycle))
             
             self.pwm_values[pin] = duty_cycle
             
@@ -236,6 +322,19 @@ class GPIOController:
             self.set_pin(pin, False)
         logger.info("All pins turned OFF")
     
+    def get_timeline(self, pin: Optional[int] = None) -> List[Tuple[float, int, float]]:
+        """
+        Get recorded output changes (simulation mode only)
+        
+        Args:
+            pin: Restrict to one pin (None = all pins)
+            
+        Returns:
+            List of (epoch timestamp, pin, value) tuples, oldest first; value is
+            the duty cycle for PWM pins and 1.0/0.0 for digital pins
+        """
+        return [entry for entry in self.timeline if pin is None or entry[1] == pin]
+    
     def get_configured_pins(self) -> List[int]:
         """Get list of all configured pin numbers"""
         return list(self.pins.keys())
@@ -248,6 +347,13 @@ class GPIOController:
         """Clean up GPIO resources"""
         try:
             if not self.simulation_mode and self.GPIO:
+                # Stop edge detection on input pins
+                for pin in self.input_pins.keys():
+                    try:
+                        self.GPIO.remove_event_detect(pin)
+                    except:
+                        pass  # Ignore errors during cleanup
+                
                 # Stop all PWM pins
                 for pin, pwm_obj in self.pwm_pins.items():
                     try:
@@ -0,0 +1,455 @@
+#!/usr/bin/env python3
+"""
+History Module
+Records light state changes into compact array-backed segments with hourly
+rollups for usage analytics and energy estimates, keeping memory and disk
+use bounded.
+
+Recording never touches the disk: sealed segments and changed rollup hours
+are written by checkpoint(), which the service runs on a background task.
+Rollups are kept as a snapshot plus a journal of changed hours, so a
+checkpoint appends a few bytes instead of rewriting every stored hour.
+"""
+
+import bisect
+import logging
+import os
+import struct
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_MAGIC = b'LHS1'
+SEGMENT_HEADER = struct.Struct('<4sI')  # magic, record count
+ROLLUP_MAGIC = b'LHR2'
+ROLLUP_HEADER = struct.Struct('<4sIIQ')  # magic, slot count, hour count, journal generation
+JOURNAL_MAGIC = b'LHJ1'
+JOURNAL_HEADER = struct.Struct('<4sIQ')  # magic, slot count, generation
+JOURNAL_HOUR = struct.Struct('<q')  # Each entry: hour number, then the hour's bucket
+MIN_JOURNAL_ENTRIES = 64  # Journal entries tolerated before the snapshot is rewritten
+
+SECONDS_PER_HOUR = 3600
+
+
+class Segment:
+    """Fixed-capacity columnar block of change records"""
+
+    __slots__ = ('timestamps', 'light_ids', 'values')
+
+    def __init__(self):
+        self.timestamps = array('d')  # epoch seconds
+        self.light_ids = array('H')
+        self.values = array('f')  # brightness 0-100 (digital lights: 0 or 100)
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def append(self, timestamp: float, light_id: int, value: float) -> None:
+        self.timestamps.append(timestamp)
+        self.light_ids.append(light_id)
+        self.values.append(value)
+
+    def to_bytes(self) -> bytes:
+        """Serialize the segment for storage"""
+        return (SEGMENT_HEADER.pack(SEGMENT_MAGIC, len(self)) +
+                self.timestamps.tobytes() + self.light_ids.tobytes() + self.values.tobytes())
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'Segment':
+        """Deserialize a segment written by to_bytes()"""
+        magic, count = SEGMENT_HEADER.unpack_from(data)
+        if magic != SEGMENT_MAGIC:
+            raise ValueError('Not a history segment')
+
+        segment = cls()
+        offset = SEGMENT_HEADER.size
+        for column in (segment.timestamps, segment.light_ids, segment.values):
+            size = count * column.itemsize
+            column.frombytes(data[offset:offset + size])
+            offset += size
+        return segment
+
+    def records(self, start: float, end: float, light_id: Optional[int] = None):
+        """Yield (timestamp, light_id, value) records with start <= timestamp < end"""
+        lo = bisect.bisect_left(self.timestamps, start)
+        hi = bisect.bisect_left(self.timestamps, end)
+        for i in range(lo, hi):
+            if light_id is None or self.light_ids[i] == light_id:
+                yield self.timestamps[i], self.light_ids[i], self.values[i]
+
+
+class HistoryRecorder:
+    """Ring buffer of light changes with hourly on-time and energy rollups"""
+
+    def __init__(self, light_ids: Iterable[int], data_dir: Optional[str] = None,
+                 segment_size: int = 4096, max_segments: int = 8,
+                 max_disk_segments: int = 64, rollup_hours: int = 24 * 90):
+        """
+        Initialize the history recorder
+
+        Args:
+            light_ids: IDs of the lights to track
+            data_dir: Directory for sealed segments and rollups (None = memory only)
+            segment_size: Records per segment
+            max_segments: Segments kept in memory (including the open one)
+            max_disk_segments: Sealed segment files kept in data_dir
+            rollup_hours: Hourly rollup buckets kept
+        """
+        self.slots: Dict[int, int] = {light_id: i for i, light_id in enumerate(light_ids)}
+        self.data_dir = data_dir
+        self.segment_size = segment_size
+        self.max_segments = max_segments
+        self.max_disk_segments = max_disk_segments
+        self.rollup_hours = rollup_hours
+
+        self._segments: List[Segment] = [Segment()]
+        # hour number -> array of [on_seconds, brightness_seconds] per slot
+        self._rollups: 'OrderedDict[int, array]' = OrderedDict()
+        self._last: Dict[int, tuple] = {}  # light_id -> (timestamp, value)
+        self._dirty: Set[int] = set()  # Hours changed since the last checkpoint
+        self._unwritten: List[Segment] = []  # Sealed segments not yet on disk
+        self._generation = 0  # Snapshot generation the journal belongs to
+        self._journal_entries = 0
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()  # Serializes checkpoints
+
+        if data_dir:
+            os.makedirs(data_dir, exist_ok=True)
+            self._load_rollups()
+
+    def record(self, light_id: int, value: float, timestamp: Optional[float] = None) -> None:
+        """
+        Record a light's brightness (0-100) at a point in time
+
+        Args:
+            light_id: Light ID
+            value: New brightness percentage (use 100/0 for digital lights)
+            timestamp: Epoch seconds (defaults to now)
+        """
+        if light_id not in self.slots:
+            return
+        if timestamp is None:
+            timestamp = time.time()
+        value = float(value)
+
+        with self._lock:
+            previous = self._last.get(light_id)
+            if previous is not None:
+                if previous[1] == value:
+                    return
+                self._accumulate(light_id, previous[0], timestamp, previous[1])
+            self._last[light_id] = (timestamp, value)
+
+            segment = self._segments[-1]
+            segment.append(timestamp, light_id, value)
+            if len(segment) >= self.segment_size:
+                self._seal(segment)
+
+    def _accumulate(self, light_id: int, start: float, end: float, value: float) -> None:
+        """Add an interval at a constant value to the hourly rollups"""
+        if value <= 0 or end <= start:
+            return
+
+        slot = self.slots[light_id] * 2
+        while start < end:
+            hour = int(start // SECONDS_PER_HOUR)
+            bucket_end = min(end, (hour + 1) * SECONDS_PER_HOUR)
+            seconds = bucket_end - start
+
+            bucket = self._rollups.get(hour)
+            if bucket is None:
+                bucket = self._rollups[hour] = array('d', bytes(16 * len(self.slots)))
+                while len(self._rollups) > self.rollup_hours:
+                    self._rollups.popitem(last=False)
+            bucket[slot] += seconds
+            bucket[slot + 1] += seconds * value
+            self._dirty.add(hour)
+
+            start = bucket_end
+
+    def _seal(self, segment: Segment) -> None:
+        """Close a full segment, queue it for the next checkpoint and enforce the memory bound"""
+        if self.data_dir:
+            self._unwritten.append(segment)
+            if len(self._unwritten) > self.max_disk_segments:
+                del self._unwritten[0]  # Would be pruned from disk as soon as it was written
+
+        self._segments.append(Segment())
+        if len(self._segments) > self.max_segments:
+            del self._segments[0]
+
+    def _segment_files(self) -> List[str]:
+        """Sealed segment files on disk, oldest first"""
+        names = [n for n in os.listdir(self.data_dir) if n.startswith('segment-') and n.endswith('.bin')]
+        return [os.path.join(self.data_dir, n) for n in sorted(names)]
+
+    @staticmethod
+    def _segment_start(path: str) -> float:
+        """First timestamp of a segment file, from its name"""
+        try:
+            return float(os.path.basename(path)[len('segment-'):-len('.bin')])
+        except ValueError:
+            return float('-inf')  # Unknown range: never pruned
+
+    def _write_segment(self, segment: Segment) -> None:
+        """Persist a sealed segment and drop the oldest files beyond the disk bound"""
+        try:
+            path = os.path.join(self.data_dir, f"segment-{segment.timestamps[0]:017.6f}.bin")
+            with open(path, 'wb') as f:
+                f.write(segment.to_bytes())
+
+            files = self._segment_files()
+            for old in files[:max(0, len(files) - self.max_disk_segments)]:
+                os.remove(old)
+        except OSError as e:
+            logger.error(f"Error writing history segment: {str(e)}")
+
+    def _save_rollups(self, snapshot: List[Tuple[int, array]]) -> None:
+        """Persist all hourly rollups and start a new, empty journal"""
+        try:
+            generation = self._generation + 1
+            path = os.path.join(self.data_dir, 'rollups.bin')
+            with open(path + '.tmp', 'wb') as f:
+                f.write(ROLLUP_HEADER.pack(ROLLUP_MAGIC, len(self.slots), len(snapshot), generation))
+                f.write(array('q', (hour for hour, _ in snapshot)).tobytes())
+                for _, bucket in snapshot:
+                    f.write(bucket.tobytes())
+            os.replace(path + '.tmp', path)
+        except OSError as e:
+            logger.error(f"Error saving history rollups: {str(e)}")
+            return
+        self._generation, self._journal_entries = generation, 0
+        try:
+            # Its generation no longer matches the snapshot, so it is ignored even if this fails
+            os.remove(os.path.join(self.data_dir, 'rollups.log'))
+        except OSError:
+            pass
+
+    def _append_journal(self, entries: List[Tuple[int, array]]) -> bool:
+        """Append changed hours to the rollup journal, returning False on failure"""
+        try:
+            with open(os.path.join(self.data_dir, 'rollups.log'), 'ab') as f:
+                if f.tell() == 0:
+                    f.write(JOURNAL_HEADER.pack(JOURNAL_MAGIC, len(self.slots), self._generation))
+                f.write(b''.join(JOURNAL_HOUR.pack(hour) + bucket.tobytes() for hour, bucket in entries))
+            self._journal_entries += len(entries)
+            return True
+        except OSError as e:
+            logger.error(f"Error writing history rollup journal: {str(e)}")
+            return False
+
+    def _load_rollups(self) -> None:
+        """Restore hourly rollups saved by a previous run: the snapshot, then its journal"""
+        path = os.path.join(self.data_dir, 'rollups.bin')
+        width = 16 * len(self.slots)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            magic, slots, count, generation = ROLLUP_HEADER.unpack_from(data)
+            if magic != ROLLUP_MAGIC or slots != len(self.slots):
+                logger.warning("Ignoring incompatible history rollups file")
+            else:
+                self._generation = generation
+                offset = ROLLUP_HEADER.size
+                hours = array('q')
+                hours.frombytes(data[offset:offset + 8 * count])
+                offset += 8 * count
+                for i, hour in enumerate(hours):
+                    bucket = array('d')
+                    bucket.frombytes(data[offset + i * width:offset + (i + 1) * width])
+                    self._rollups[hour] = bucket
+        except FileNotFoundError:
+            pass
+        except (OSError, struct.error, ValueError) as e:
+            logger.error(f"Error loading history rollups: {str(e)}")
+
+        path = os.path.join(self.data_dir, 'rollups.log')
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            magic, slots, generation = JOURNAL_HEADER.unpack_from(data)
+            if magic != JOURNAL_MAGIC or slots != len(self.slots) or generation != self._generation:
+                os.remove(path)  # Already contained in the snapshot, or unusable
+            else:
+                size = JOURNAL_HOUR.size + width
+                # A trailing partial entry (crash mid-write) is ignored
+                for offset in range(JOURNAL_HEADER.size, len(data) - size + 1, size):
+                    bucket = array('d')
+                    bucket.frombytes(data[offset + JOURNAL_HOUR.size:offset + size])
+                    self._rollups[JOURNAL_HOUR.unpack_from(data, offset)[0]] = bucket
+                    self._journal_entries += 1
+        except FileNotFoundError:
+            pass
+        except (OSError, struct.error, ValueError) as e:
+            logger.error(f"Error loading history rollup journal: {str(e)}")
+
+        self._rollups = OrderedDict(sorted(self._rollups.items()))
+        while len(self._rollups) > self.rollup_hours:
+            self._rollups.popitem(last=False)
+
+    def _accumulate_open(self, now: float) -> None:
+        """Add each light's still-open interval up to now to the rollups"""
+        for light_id, (timestamp, value) in list(self._last.items()):
+            if now > timestamp:
+                self._accumulate(light_id, timestamp, now, value)
+                self._last[light_id] = (now, value)
+
+    def checkpoint(self, now: Optional[float] = None, compact: bool = False) -> None:
+        """
+        Persist sealed segments and the rollup hours changed since the last checkpoint
+
+        Called periodically from a background task, so a crash loses at most
+        one checkpoint interval of usage and recording never waits for the
+        disk. Changed hours are appended to the journal; once the journal
+        outgrows the snapshot (or with compact=True) the snapshot is rewritten.
+        """
+        if not self.data_dir:
+            return
+        with self._io_lock:
+            with self._lock:
+                self._accumulate_open(time.time() if now is None else now)
+                segments = list(self._unwritten)
+                dirty = [(hour, array('d', self._rollups[hour])) for hour in sorted(self._dirty)
+                         if hour in self._rollups]
+                self._dirty.clear()
+                compact = compact or self._journal_entries + len(dirty) > max(len(self._rollups),
+                                                                              MIN_JOURNAL_ENTRIES)
+                snapshot = None
+                if compact:
+                    snapshot = [(hour, array('d', bucket)) for hour, bucket in self._rollups.items()]
+
+            for segment in segments:
+                self._write_segment(segment)
+            with self._lock:
+                # Written segments are found on disk from now on
+                self._unwritten = [s for s in self._unwritten if not any(s is w for w in segments)]
+
+            if snapshot is not None:
+                self._save_rollups(snapshot)
+            elif dirty and not self._append_journal(dirty):
+                with self._lock:
+                    self._dirty.update(hour for hour, _ in dirty)  # Retried next checkpoint
+
+    def flush(self) -> None:
+        """Persist the open segment and all rollups (called on shutdown)"""
+        if not self.data_dir:
+            return
+        with self._lock:
+            if len(self._segments[-1]):
+                self._seal(self._segments[-1])
+        self.checkpoint(compact=True)
+
+    def query_events(self, start: float, end: float, light_id: Optional[int] = None,
+                     limit: int = 1000) -> List[dict]:
+        """
+        Get raw change records in a time range
+
+        Args:
+            start: Range start (epoch seconds, inclusive)
+            end: Range end (epoch seconds, exclusive)
+            light_id: Restrict to one light (None = all lights)
+            limit: Maximum number of records returned
+
+        Returns:
+            List of {'timestamp', 'light_id', 'brightness'} dicts, oldest first
+        """
+        events = []
+        with self._lock:
+            # Sealed segments awaiting a checkpoint may already be gone from the memory ring
+            segments = [s for s in self._unwritten if not any(s is m for m in self._segments)]
+            segments += self._segments
+        oldest_in_memory = segments[0].timestamps[0] if len(segments[0]) else float('inf')
+
+        # Older data only lives on disk. Files are named after their first
+        # timestamp and hold consecutive ranges, so a file ends before the next
+        # one starts; files entirely outside [start, end) are never read.
+        if self.data_dir and start < oldest_in_memory:
+            files = self._segment_files()
+            starts = [self._segment_start(path) for path in files]
+            disk_segments = []
+            for i, path in enumerate(files):
+                next_start = starts[i + 1] if i + 1 < len(starts) else float('inf')
+                if starts[i] >= min(end, oldest_in_memory) or next_start < start:
+                    continue
+                try:
+                    with open(path, 'rb') as f:
+                        segment = Segment.from_bytes(f.read())
+                except (OSError, ValueError, struct.error) as e:
+                    logger.error(f"Error reading history segment {path}: {str(e)}")
+                    continue
+                # Sealed segments still held in memory are skipped here
+                if len(segment) and segment.timestamps[-1] >= start and segment.timestamps[0] < oldest_in_memory:
+                    disk_segments.append(segment)
+            segments = disk_segments + segments
+
+        for segment in segments:
+            if not len(segment) or segment.timestamps[-1] < start or segment.timestamps[0] >= end:
+                continue
+            for timestamp, lid, value in segment.records(start, end, light_id):
+                events.append({'timestamp': timestamp, 'light_id': lid, 'brightness': round(value, 2)})
+                if len(events) >= limit:
+                    return events
+        return events
+
+    def query_rollups(self, start: float, end: float, light_id: Optional[int] = None,
+                      watts: Optional[Dict[int, float]] = None) -> List[dict]:
+        """
+        Get hourly usage buckets in a time range
+
+        Args:
+            start: Range start (epoch seconds)
+            end: Range end (epoch seconds)
+            light_id: Restrict to one light (None = all lights)
+            watts: Rated power per light ID, used for energy estimates
+
+        Returns:
+            List of {'hour', 'light_id', 'on_seconds', 'avg_brightness', 'energy_wh'}
+            dicts ordered by hour
+        """
+        watts = watts or {}
+        first_hour = int(start // SECONDS_PER_HOUR)
+        last_hour = int((end - 1e-9) // SECONDS_PER_HOUR)
+        light_ids = [light_id] if light_id is not None else list(self.slots)
+
+        with self._lock:
+            # Include the still-open interval of each light up to now
+            self._accumulate_open(time.time())
+
+            buckets = [(hour, array('d', bucket)) for hour, bucket in self._rollups.items()
+                       if first_hour <= hour <= last_hour]
+
+        result = []
+        for hour, bucket in buckets:
+            for lid in light_ids:
+                slot = self.slots.get(lid)
+                if slot is None:
+                    continue
+                on_seconds = bucket[slot * 2]
+                brightness_seconds = bucket[slot * 2 + 1]
+                if not on_seconds:
+                    continue
+                result.append({
+                    'hour': hour * SECONDS_PER_HOUR,
+                    'light_id': lid,
+                    'on_seconds': round(on_seconds, 1),
+                    'avg_brightness': round(brightness_seconds / on_seconds, 2),
+                    'energy_wh': round(watts.get(lid, 0.0) * brightness_seconds / 100.0 / SECONDS_PER_HOUR, 4)
+                })
+        return result
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get memory/disk usage counters"""
+        with self._lock:
+            stats = {
+                'segments_in_memory': len(self._segments),
+                'records_in_memory': sum(len(s) for s in self._segments),
+                'rollup_hours': len(self._rollups),
+                'segments_unwritten': len(self._unwritten),
+            }
+        if self.data_dir:
+            stats['segments_on_disk'] = len(self._segment_files())
+        return stats
@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+Input Dispatcher Module
+Turns raw edges from physical switches and buttons into debounced gestures
+(press, release, single, double, long, change) in a single dispatcher thread
+and runs the light actions bound to them
+"""
+
+import heapq
+import itertools
+import logging
+import threading
+from collections import deque
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Set
+
+from clock import Clock
+
+logger = logging.getLogger(__name__)
+
+INPUT_TYPES = ('button', 'switch')
+GESTURES = ('press', 'release', 'single', 'double', 'long', 'change')
+ACTION_TYPES = ('toggle', 'set', 'brightness', 'group', 'all')
+
+# Deadline kinds
+_SETTLE = 'settle'  # Re-check the level once the debounce window has passed
+_LONG = 'long'      # Button still held long enough for a long press
+_SINGLE = 'single'  # No second click arrived within the double-click window
+
+
+class InputConfigError(ValueError):
+    """Raised when an input definition is invalid"""
+
+
+class InputState:
+    """Runtime state of one configured input"""
+
+    def __init__(self, config: dict, known_lights: Set[int]):
+        """
+        Validate an input definition
+
+        Args:
+            config: Input definition (see README for the format)
+            known_lights: IDs of configured lights, used for validation
+
+        Raises:
+            InputConfigError: If the definition is invalid
+        """
+        try:
+            self.id = int(config['id'])
+            self.pin = int(config['pin'])
+        except (KeyError, TypeError, ValueError):
+            raise InputConfigError('Input requires numeric id and pin')
+
+        self.name = config.get('name', f"Input {self.id}")
+        self.type = config.get('type', 'button')
+        if self.type not in INPUT_TYPES:
+            raise InputConfigError(f"Invalid input type. Must be one of {', '.join(INPUT_TYPES)}")
+        self.pull_up = bool(config.get('pull_up', True))
+        # With a pull-up the contact pulls the pin LOW, so LOW means pressed/closed
+        self.active_low = bool(config.get('active_low', self.pull_up))
+
+        self.bindings: Dict[str, dict] = {}
+        for gesture, action in config.get('bindings', {}).items():
+            if gesture not in GESTURES:
+                raise InputConfigError(f"Invalid gesture '{gesture}'. Must be one of {', '.join(GESTURES)}")
+            self.bindings[gesture] = _validate_action(action, known_lights)
+
+        # Single clicks fire on the press edge unless they must be told apart
+        # from a double click or long press
+        self.single_on_press = 'double' not in self.bindings and 'long' not in self.bindings
+
+        self.level: Optional[bool] = None  # Debounced level
+        self.raw_level: Optional[bool] = None  # Last level reported by the pin
+        self.accepted_at = float('-inf')  # Time of the last accepted edge
+        self.generation = 0  # Bumped on every accepted edge to invalidate deadlines
+        self.clicks = 0
+        self.long_fired = False
+        self.last_gesture: Optional[str] = None
+
+    def is_active(self, level: bool) -> bool:
+        """Is the contact closed (button pressed / switch on) at this level?"""
+        return level != self.active_low
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'name': self.name,
+            'pin': self.pin,
+            'type': self.type,
+            'active': self.is_active(self.level) if self.level is not None else None,
+            'bindings': self.bindings,
+            'last_gesture': self.last_gesture,
+        }
+
+
+def _validate_action(action: dict, known_lights: Set[int]) -> dict:
+    """Check an input binding action"""
+    if not isinstance(action, dict) or action.get('type') not in ACTION_TYPES:
+        raise InputConfigError(f"Invalid action type. Must be one of {', '.join(ACTION_TYPES)}")
+
+    action = dict(action)
+    light_ids = action.get('light_ids') if action['type'] == 'group' else (
+        [action.get('light_id')] if action['type'] != 'all' else [])
+    if action['type'] == 'group' and not light_ids:
+        raise InputConfigError('Group action requires light_ids')
+    for light_id in light_ids:
+        if light_id not in known_lights:
+            raise InputConfigError(f"Light {light_id} not found")
+
+    if action['type'] in ('set', 'all') and action.get('state') not in ('on', 'off'):
+        raise InputConfigError("State must be 'on' or 'off'")
+    if action['type'] == 'group' and action.get('action', 'toggle') not in ('toggle', 'on', 'off'):
+        raise InputConfigError("Group action must be toggle, on or off")
+    if action['type'] == 'brightness':
+        try:
+            brightness = float(action['brightness'])
+        except (KeyError, TypeError, ValueError):
+            raise InputConfigError('Brightness action requires a numeric brightness')
+        if not 0 <= brightness <= 100:
+            raise InputConfigError('Brightness must be between 0 and 100')
+        action['brightness'] = brightness
+    return action
+
+
+class InputDispatcher:
+    """Single-threaded debouncer and gesture detector for input pins"""
+
+    def __init__(self, run_action: Callable[[dict], None], light_ids: Iterable[int],
+                 debounce_ms: float = 30, long_press_ms: float = 800, double_click_ms: float = 350,
+                 clock: Optional[Clock] = None):
+        """
+        Initialize the dispatcher
+
+        Args:
+            run_action: Called from the dispatcher thread to perform a bound action
+            light_ids: IDs of configured lights, used to validate bindings
+            debounce_ms: Edges within this window after an accepted edge are ignored
+            long_press_ms: Hold time for a long press
+            double_click_ms: Maximum gap between the two clicks of a double click
+            clock: Time source; must match the one that timestamps the edges
+        """
+        self.clock = clock or Clock()
+        self.run_action = run_action
+        self.known_lights: Set[int] = set(light_ids)
+        self.debounce = debounce_ms / 1000.0
+        self.long_press = long_press_ms / 1000.0
+        self.double_click = double_click_ms / 1000.0
+
+        self.inputs: Dict[int, InputState] = {}  # pin -> input
+        self._edges: Deque[tuple] = deque()  # (pin, level, timestamp)
+        self._deadlines: List[tuple] = []  # heap of (deadline, seq, kind, pin, generation)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+
+        self.stats = {'edges': 0, 'bounces': 0, 'gestures': 0, 'last_latency_ms': 0.0, 'max_latency_ms': 0.0}
+
+    def add_input(self, config: dict) -> InputState:
+        """
+        Register an input (call before setting up its GPIO pin)
+
+        Raises:
+            InputConfigError: If the definition is invalid
+        """
+        state = InputState(config, self.known_lights)
+        with self._cond:
+            self.inputs[state.pin] = state
+        return state
+
+    def set_initial_level(self, pin: int, level: bool) -> None:
+        """Seed the debounced level of an input from the pin after setup"""
+        with self._cond:
+            state = self.inputs[pin]
+            state.level = state.raw_level = bool(level)
+
+    def list_inputs(self) -> List[dict]:
+        with self._cond:
+            return [state.to_dict() for state in self.inputs.values()]
+
+    def get_stats(self) -> dict:
+        with self._cond:
+            return dict(self.stats, inputs=len(self.inputs))
+
+    def start(self) -> None:
+        """Start the dispatcher thread"""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._worker, name='input-dispatcher', daemon=True)
+        self._thread.start()
+        logger.info("Input dispatcher started")
+
+    def stop(self, timeout: float = 2.0) -> None:
+        """Stop the dispatcher thread"""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def on_edge(self, pin: int, level: bool, timestamp: float) -> None:
+        """GPIO edge callback: queue the edge for the dispatcher thread"""
+        with self._cond:
+            self._edges.append((pin, bool(level), timestamp))
+            self._cond.notify()
+
+    def _schedule(self, at: float, kind: str, state: InputState) -> None:
+        heapq.heappush(self._deadlines, (at, next(self._seq), kind, state.pin, state.generation))
+
+    def _handle_edge(self, pin: int, level: bool, timestamp: float, fired: List[tuple]) -> None:
+        """Debounce one raw edge (lock held)"""
+        state = self.inputs.get(pin)
+        if state is None:
+            return
+        self.stats['edges'] += 1
+        state.raw_level = level
+
+        if level == state.level:
+            return
+        if timestamp - state.accepted_at < self.debounce:
+            self.stats['bounces'] += 1
+            # Make sure the final level is picked up once the contact settles
+            self._schedule(state.accepted_at + self.debounce, _SETTLE, state)
+            return
+
+        self._accept(state, level, timestamp, fired)
+
+    def _accept(self, state: InputState, level: bool, timestamp: float, fired: List[tuple]) -> None:
+        """Apply a debounced level change and detect gestures (lock held)"""
+        state.level = level
+        state.accepted_at = timestamp
+        state.generation += 1
+        active = state.is_active(level)
+
+        if state.type == 'switch':
+            fired.append((state, 'change', timestamp))
+            fired.append((state, 'press' if active else 'release', timestamp))
+            return
+
+        if active:
+            state.long_fired = False
+            fired.append((state, 'press', timestamp))
+            if state.single_on_press:
+                fired.append((state, 'single', timestamp))
+            if 'long' in state.bindings:
+                self._schedule(timestamp + self.long_press, _LONG, state)
+            return
+
+        fired.append((state, 'release', timestamp))
+        if state.long_fired or state.single_on_press:
+            return
+        if 'double' in state.bindings:
+            state.clicks += 1
+            if state.clicks >= 2:
+                state.clicks = 0
+                fired.append((state, 'double', timestamp))
+            else:
+                self._schedule(timestamp + self.double_click, _SINGLE, state)
+        else:
+            fired.append((state, 'single', timestamp))
+
+    def _handle_deadlines(self, now: float, fired: List[tuple]) -> None:
+        """Run expired deadlines (lock held)"""
+        while self._deadlines and self._deadlines[0][0] <= now:
+            at, _, kind, pin, generation = heapq.heappop(self._deadlines)
+            state = self.inputs.get(pin)
+            if state is None:
+                continue
+
+            if kind == _SETTLE:
+                if state.raw_level is not None and state.raw_level != state.level:
+                    self._accept(state, state.raw_level, at, fired)
+                continue
+
+            # Long/single deadlines are void once another edge was accepted
+            if generation != state.generation:
+                continue
+            if kind == _LONG and state.is_active(state.level):
+                state.long_fired = True
+                state.clicks = 0
+                fired.append((state, 'long', at))
+            elif kind == _SINGLE and state.clicks == 1:
+                state.clicks = 0
+                fired.append((state, 'single', at))
+
+    def _dispatch(self, state: InputState, gesture: str, timestamp: float) -> None:
+        """Run the action bound to a gesture"""
+        state.last_gesture = gesture
+        action = state.bindings.get(gesture)
+        if not action:
+            return
+
+        self.stats['gestures'] += 1
+        try:
+            self.run_action(action)
+        except Exception as e:
+            logger.error(f"Error running {gesture} action for input {state.name}: {str(e)}")
+            return
+
+        latency = (self.clock.monotonic() - timestamp) * 1000.0
+        self.stats['last_latency_ms'] = round(latency, 2)
+        self.stats['max_latency_ms'] = round(max(self.stats['max_latency_ms'], latency), 2)
+        logger.info(f"Input {state.name}: {gesture} -> {action['type']} ({latency:.1f} ms)")
+
+    def _collect(self, fired: List[tuple]) -> None:
+        """Handle queued edges and expired deadlines (lock held)"""
+        while self._edges:
+            self._handle_edge(*self._edges.popleft(), fired)
+        self._handle_deadlines(self.clock.monotonic(), fired)
+
+    def process_pending(self) -> None:
+        """
+        Handle queued edges and expired deadlines and run the bound actions
+
+        The dispatcher thread does this continuously; tests without the
+        thread call it after moving a VirtualClock forward.
+        """
+        fired: List[tuple] = []
+        with self._cond:
+            self._collect(fired)
+        for state, gesture, timestamp in fired:
+            self._dispatch(state, gesture, timestamp)
+
+    def _worker(self) -> None:
+        while True:
+            fired: List[tuple] = []
+            with self._cond:
+                while self._running and not self._edges and not (
+                        self._deadlines and self._deadlines[0][0] <= self.clock.monotonic()):
+                    timeout = self._deadlines[0][0] - self.clock.monotonic() if self._deadlines else None
+                    self._cond.wait(timeout)
+                if not self._running:
+                    break
+                self._collect(fired)
+
+            for state, gesture, timestamp in fired:
+                self._dispatch(state, gesture, timestamp)
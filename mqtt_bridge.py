@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+MQTT Bridge Module
+Mirrors light state to retained MQTT topics and accepts commands from MQTT,
+using one persistent connection driven by a single bridge thread. State
+changes are coalesced per frame, so a fade publishes at most one message per
+light per frame.
+
+Topics (with the default base topic 'web_contr'):
+    web_contr/status                  online/offline (retained, last will)
+    web_contr/lights/<id>/state       light state JSON (retained)
+    web_contr/lights/<id>/set         commands: {"state": "ON", "brightness": 50, "transition": 2}
+    web_contr/lights/all/set          commands for every light
+"""
+
+import json
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONFIG = {
+    'host': 'localhost',
+    'port': 1883,
+    'keepalive': 60,
+    'client_id': 'web_contr',
+    'username': None,
+    'password': None,
+    'base_topic': 'web_contr',
+    'frame_interval': 0.1,  # Seconds between coalesced state flushes
+    'offline_queue': 100,   # Non-state messages kept while disconnected
+    'max_backoff': 60.0,    # Longest wait between reconnect attempts
+    'connect_timeout': 10.0,  # Seconds to wait for the broker's CONNACK before retrying
+}
+
+
+def default_client_factory(client_id: str):
+    """Create a paho-mqtt client (paho 1.x and 2.x), importing paho only when the bridge is used"""
+    try:
+        import paho.mqtt.client as mqtt
+    except ImportError:
+        raise RuntimeError("paho-mqtt is not installed")
+    if hasattr(mqtt, 'CallbackAPIVersion'):
+        return mqtt.Client(mqtt.CallbackAPIVersion.VERSION1, client_id=client_id)
+    return mqtt.Client(client_id=client_id)
+
+
+class MQTTBridge:
+    """Single-connection, single-thread bridge between the lights and MQTT"""
+
+    def __init__(self, config: dict, get_state: Callable[[int], Optional[dict]],
+                 handle_command: Callable[[Optional[int], dict], None],
+                 client_factory: Callable[[str], object] = default_client_factory):
+        """
+        Initialize the MQTT bridge
+
+        Args:
+            config: Connection and topic settings (see DEFAULT_CONFIG)
+            get_state: Returns the state dict published for a light ID
+            handle_command: Called as handle_command(light_id, command) for
+                incoming commands; light_id is None for the 'all' topic
+            client_factory: Creates the MQTT client from a client ID; tests pass
+                an in-process stub with the same interface as paho's Client
+        """
+        self.config = dict(DEFAULT_CONFIG, **{k: v for k, v in config.items() if v is not None})
+        self.get_state = get_state
+        self.handle_command = handle_command
+        self.base = self.config['base_topic'].rstrip('/')
+
+        self.client = client_factory(self.config['client_id'])
+        self.client.on_connect = self._on_connect
+        self.client.on_disconnect = self._on_disconnect
+        self.client.on_message = self._on_message
+        if self.config['username']:
+            self.client.username_pw_set(self.config['username'], self.config['password'])
+        self.client.will_set(f"{self.base}/status", 'offline', qos=1, retain=True)
+
+        self._dirty: Set[int] = set()  # Lights whose state must be (re)published
+        self._outbox: Deque[tuple] = deque(maxlen=self.config['offline_queue'])  # (topic, payload, retain)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._connected = False
+        self._ever_connected = False
+        # Monotonic time after which an unanswered connect attempt is abandoned;
+        # None when no attempt is pending
+        self._connect_deadline: Optional[float] = None
+        self._known_lights: Set[int] = set()
+
+        self.stats = {'published': 0, 'coalesced': 0, 'commands': 0, 'reconnects': 0, 'dropped': 0,
+                      'connect_timeouts': 0}
+
+    def start(self, light_ids) -> None:
+        """Start the bridge thread and schedule an initial publish of every light"""
+        self._known_lights = set(light_ids)
+        with self._lock:
+            self._dirty.update(self._known_lights)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='mqtt-bridge', daemon=True)
+        self._thread.start()
+        logger.info(f"MQTT bridge started for {self.config['host']}:{self.config['port']}")
+
+    def stop(self, timeout: float = 2.0) -> None:
+        """Publish offline status, disconnect and stop the bridge thread"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        if self._connected:
+            try:
+                self.client.publish(f"{self.base}/status", 'offline', qos=1, retain=True)
+                self.client.disconnect()
+            except Exception as e:
+                logger.error(f"Error disconnecting MQTT bridge: {str(e)}")
+
+    def is_connected(self) -> bool:
+        return self._connected
+
+    def notify_light(self, light_id: int) -> None:
+        """Mark a light as changed; its state goes out with the next frame"""
+        with self._lock:
+            if light_id in self._dirty:
+                self.stats['coalesced'] += 1
+            self._dirty.add(light_id)
+
+    def publish(self, topic: str, payload: str, retain: bool = False) -> None:
+        """Queue a message below the base topic, kept while offline"""
+        with self._lock:
+            if len(self._outbox) == self._outbox.maxlen:
+                self.stats['dropped'] += 1
+            self._outbox.append((f"{self.base}/{topic}", payload, retain))
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.stats, connected=self._connected, pending=len(self._dirty) + len(self._outbox))
+
+    def _on_connect(self, client, userdata, flags, rc) -> None:
+        if rc != 0:
+            # Retried once the connect deadline passes, with backoff
+            logger.error(f"MQTT connection refused (rc={rc})")
+            return
+        self._connect_deadline = None
+        self._connected = True
+        logger.info("MQTT bridge connected")
+        client.subscribe(f"{self.base}/lights/+/set", qos=1)
+        client.publish(f"{self.base}/status", 'online', qos=1, retain=True)
+        # Republish everything so retained topics match the current state
+        with self._lock:
+            self._dirty.update(self._known_lights)
+
+    def _on_disconnect(self, client, userdata, rc) -> None:
+        self._connected = False
+        self._connect_deadline = None
+        if not self._stop.is_set():
+            logger.warning(f"MQTT bridge disconnected (rc={rc})")
+
+    def _on_message(self, client, userdata, message) -> None:
+        """Route a command message to the light control code"""
+        parts = message.topic[len(self.base) + 1:].split('/')
+        if len(parts) != 3 or parts[0] != 'lights' or parts[2] != 'set':
+            return
+
+        try:
+            light_id = None if parts[1] == 'all' else int(parts[1])
+            text = message.payload.decode('utf-8').strip()
+            if text.upper() in ('ON', 'OFF'):
+                command = {'state': text.upper()}
+            else:
+                command = json.loads(text)
+            if not isinstance(command, dict):
+                raise ValueError('Command must be a JSON object')
+        except (ValueError, UnicodeDecodeError) as e:
+            logger.warning(f"Ignoring invalid MQTT command on {message.topic}: {str(e)}")
+            return
+
+        self.stats['commands'] += 1
+        try:
+            self.handle_command(light_id, command)
+        except Exception as e:
+            logger.error(f"Error handling MQTT command on {message.topic}: {str(e)}")
+
+    def _flush(self) -> None:
+        """Publish pending state and queued messages while connected"""
+        if not self._connected:
+            return
+
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            outbox = list(self._outbox)
+            self._outbox.clear()
+
+        for light_id in sorted(dirty):
+            state = self.get_state(light_id)
+            if state is not None:
+                self.client.publish(f"{self.base}/lights/{light_id}/state",
+                                    json.dumps(state, separators=(',', ':')), qos=1, retain=True)
+                self.stats['published'] += 1
+        for topic, payload, retain in outbox:
+            self.client.publish(topic, payload, qos=1, retain=retain)
+            self.stats['published'] += 1
+
+    def _run(self) -> None:
+        """Bridge thread: connect, run network I/O and flush once per frame"""
+        initial_backoff = min(1.0, self.config['max_backoff'])
+        backoff = initial_backoff
+        while not self._stop.is_set():
+            if not self._connected and self._connect_deadline is not None \
+                    and time.monotonic() >= self._connect_deadline:
+                # The broker never answered the last attempt
+                logger.warning(f"MQTT broker did not acknowledge the connection, retrying in {backoff:.0f}s")
+                self.stats['connect_timeouts'] += 1
+                self._connect_deadline = None
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, self.config['max_backoff'])
+                continue
+
+            if not self._connected and self._connect_deadline is None:
+                try:
+                    if self._ever_connected:
+                        self.stats['reconnects'] += 1
+                        self.client.reconnect()
+                    else:
+                        self.client.connect(self.config['host'], self.config['port'], self.config['keepalive'])
+                        self._ever_connected = True
+                    # Wait for CONNACK instead of reconnecting on every pass
+                    self._connect_deadline = time.monotonic() + self.config['connect_timeout']
+                except (OSError, ValueError) as e:
+                    logger.warning(f"MQTT connect failed: {str(e)}, retrying in {backoff:.0f}s")
+                    self._stop.wait(backoff)
+                    backoff = min(backoff * 2, self.config['max_backoff'])
+                    continue
+
+            # Network I/O and callbacks run here, on this thread
+            rc = self.client.loop(timeout=self.config['frame_interval'])
+            if rc != 0:
+                self._connected = False
+                self._connect_deadline = None
+            if self._connected:
+                backoff = initial_backoff
+                self._flush()
+            elif rc != 0:
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, self.config['max_backoff'])
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Profiler Module
+Runtime diagnostics that can be switched on without restarting the service:
+a sampling profiler producing collapsed stacks (flamegraph.pl / speedscope
+input) for a bounded window, and span tracing into a fixed-size ring buffer.
+Both cost nothing beyond a flag check while they are off.
+"""
+
+import logging
+import math
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from typing import Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class SamplingProfiler:
+    """Periodically samples the stacks of all threads from a helper thread"""
+
+    def __init__(self, max_duration: float = 120.0, max_stacks: int = 20000):
+        """
+        Initialize the profiler
+
+        Args:
+            max_duration: Longest profiling window in seconds
+            max_stacks: Number of distinct stacks kept; further ones are counted as dropped
+        """
+        self.max_duration = max_duration
+        self.max_stacks = max_stacks
+
+        self._counts: Counter = Counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._started_at = 0.0
+        self._ends_at = 0.0
+        self._interval = 0.0
+        self.samples = 0
+        self.dropped = 0
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, duration: float = 30.0, interval: float = 0.01) -> bool:
+        """
+        Start sampling, discarding the previous profile
+
+        Args:
+            duration: Seconds until sampling stops by itself (capped at max_duration)
+            interval: Seconds between samples
+
+        Returns:
+            False if the profiler is already running
+
+        Raises:
+            ValueError: If duration or interval is not a finite number
+        """
+        if not (math.isfinite(duration) and math.isfinite(interval)):
+            raise ValueError('duration and interval must be finite numbers')
+        if self.is_running():
+            return False
+
+        duration = min(max(duration, 0.1), self.max_duration)
+        with self._lock:
+            self._counts = Counter()
+            self.samples = 0
+            self.dropped = 0
+        self._interval = max(interval, 0.001)
+        self._started_at = time.monotonic()
+        self._ends_at = self._started_at + duration
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample_loop, name='sampling-profiler', daemon=True)
+        self._thread.start()
+        logger.info(f"Sampling profiler started for {duration:.0f}s every {self._interval * 1000:.0f} ms")
+        return True
+
+    def stop(self) -> None:
+        """Stop sampling early; the collected profile is kept"""
+        self._stop.set()
+        thread = self._thread
+        if thread and thread is not threading.current_thread():
+            thread.join(2.0)
+
+    def collapsed(self) -> str:
+        """Profile in collapsed stack format: 'thread;outer;...;inner count' per line"""
+        with self._lock:
+            items = self._counts.most_common()
+        return ''.join(f"{stack} {count}\n" for stack, count in items)
+
+    def get_stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                'running': self.is_running(),
+                'samples': self.samples,
+                'stacks': len(self._counts),
+                'dropped': self.dropped,
+                'interval_ms': round(self._interval * 1000, 2),
+                'remaining_seconds': round(max(0.0, self._ends_at - time.monotonic()), 1)
+                if self.is_running() else 0.0,
+            }
+
+    def _sample_loop(self) -> None:
+        own_id = threading.get_ident()
+        while not self._stop.wait(self._interval):
+            if time.monotonic() >= self._ends_at:
+                break
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            stacks = []
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stacks.append(_collapse(names.get(thread_id, str(thread_id)), frame))
+
+            with self._lock:
+                self.samples += 1
+                for stack in stacks:
+                    if stack in self._counts or len(self._counts) < self.max_stacks:
+                        self._counts[stack] += 1
+                    else:
+                        self.dropped += 1
+        logger.info(f"Sampling profiler stopped after {self.samples} samples")
+
+
+def _collapse(thread_name: str, frame) -> str:
+    """Render a frame chain root-first as 'thread;file:function;...'"""
+    parts: List[str] = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    parts.append(thread_name.replace(' ', '_'))
+    parts.reverse()
+    return ';'.join(parts)
+
+
+class _NullSpan:
+    """Span used while tracing is off"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('tracer', 'name', 'attrs', 'start')
+
+    def __init__(self, tracer: 'SpanTracer', name: str, attrs: dict):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        if exc_type is not None:
+            self.attrs['error'] = exc_type.__name__
+        self.tracer.record(self.name, self.start, end, self.attrs)
+        return False
+
+
+class SpanTracer:
+    """Records timed spans into a bounded ring buffer while enabled"""
+
+    def __init__(self, capacity: int = 4096):
+        """
+        Initialize the tracer (disabled)
+
+        Args:
+            capacity: Number of most recent spans kept
+        """
+        self.enabled = False
+        self._spans: Deque[tuple] = deque(maxlen=capacity)
+        self._origin = time.perf_counter() - time.time()  # perf_counter -> epoch offset
+        self.recorded = 0
+
+    def set_enabled(self, enabled: bool) -> None:
+        self.enabled = bool(enabled)
+        logger.info(f"Span tracing {'enabled' if self.enabled else 'disabled'}")
+
+    def span(self, name: str, **attrs):
+        """
+        Context manager timing a block, e.g. ``with tracer.span('gpio.write', pin=18):``
+
+        Returns a shared no-op object while tracing is off.
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, attrs)
+
+    def record(self, name: str, start: float, end: float, attrs: Optional[dict] = None) -> None:
+        """Store a finished span (perf_counter start and end)"""
+        # deque.append is atomic, so no lock is needed on the hot path
+        self._spans.append((name, start, end, threading.current_thread().name, attrs))
+        self.recorded += 1
+
+    def clear(self) -> None:
+        self._spans.clear()
+
+    def get_spans(self, name_prefix: Optional[str] = None, limit: Optional[int] = None) -> List[dict]:
+        """Most recent spans first, optionally filtered by name prefix"""
+        spans = []
+        for name, start, end, thread, attrs in reversed(list(self._spans)):
+            if name_prefix and not name.startswith(name_prefix):
+                continue
+            spans.append({
+                'name': name,
+                'start': round(start - self._origin, 6),
+                'duration_ms': round((end - start) * 1000.0, 3),
+                'thread': thread,
+                'attrs': attrs or {},
+            })
+            if limit and len(spans) >= limit:
+                break
+        return spans
+
+    def get_summary(self) -> Dict[str, dict]:
+        """Count, mean and max duration per span name over the buffer"""
+        summary: Dict[str, dict] = {}
+        for name, start, end, _, _ in list(self._spans):
+            duration = (end - start) * 1000.0
+            entry = summary.setdefault(name, {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+            entry['count'] += 1
+            entry['total_ms'] += duration
+            entry['max_ms'] = max(entry['max_ms'], duration)
+        for entry in summary.values():
+            entry['mean_ms'] = round(entry.pop('total_ms') / entry['count'], 3)
+            entry['max_ms'] = round(entry['max_ms'], 3)
+        return summary
+
+    def get_stats(self) -> Dict[str, object]:
+        return {'enabled': self.enabled, 'buffered': len(self._spans),
+                'capacity': self._spans.maxlen, 'recorded': self.recorded}
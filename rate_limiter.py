@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Rate Limiter Module
+Token-bucket rate limiting keyed by client and endpoint, with per-request
+cost weights. Buckets are two floats each and live behind striped locks, so
+a check is a dictionary lookup and a few arithmetic operations.
+"""
+
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from clock import Clock
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucketLimiter:
+    """Per-(client, endpoint) token buckets refilled at a constant rate"""
+
+    def __init__(self, rate: float = 10.0, burst: float = 20.0,
+                 max_buckets: int = 4096, stripes: int = 16, clock: Optional[Clock] = None):
+        """
+        Initialize the rate limiter
+
+        Args:
+            rate: Tokens added per second to each bucket
+            burst: Bucket capacity (largest cost burst allowed at once)
+            max_buckets: Number of buckets kept before idle ones are pruned
+            stripes: Number of locks the buckets are spread over
+            clock: Time source the buckets refill on
+        """
+        self.rate = rate
+        self.burst = burst
+        self.max_buckets = max_buckets
+        self.clock = clock or Clock()
+
+        self._stripes = [threading.Lock() for _ in range(stripes)]
+        self._buckets: List[Dict[Tuple[str, str], List[float]]] = [{} for _ in range(stripes)]
+        # [allowed, limited] per stripe, updated under that stripe's lock
+        self._counts: List[List[int]] = [[0, 0] for _ in range(stripes)]
+
+    def consume(self, client: str, endpoint: str, cost: float = 1.0) -> Tuple[bool, float]:
+        """
+        Take tokens for a request
+
+        Args:
+            client: Client identifier (e.g. remote address)
+            endpoint: Endpoint identifier
+            cost: Tokens this request costs
+
+        Returns:
+            (allowed, retry_after) where retry_after is the number of seconds
+            until enough tokens are available (0 when allowed)
+        """
+        key = (client, endpoint)
+        index = hash(key) % len(self._stripes)
+        buckets = self._buckets[index]
+        now = self.clock.monotonic()
+        # A request costing more than the burst could never pass, so charge it a full bucket
+        cost = min(cost, self.burst)
+
+        with self._stripes[index]:
+            bucket = buckets.get(key)
+            if bucket is None:
+                if len(buckets) * len(self._stripes) >= self.max_buckets:
+                    self._prune(buckets, now)
+                bucket = buckets[key] = [self.burst, now]
+
+            tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+
+            if tokens >= cost:
+                bucket[0] = tokens - cost
+                self._counts[index][0] += 1
+                return True, 0.0
+
+            bucket[0] = tokens
+            self._counts[index][1] += 1
+            return False, (cost - tokens) / self.rate
+
+    def _prune(self, buckets: Dict[Tuple[str, str], List[float]], now: float) -> None:
+        """Drop buckets that have refilled completely (stripe lock held)"""
+        full_after = self.burst / self.rate
+        for key in [k for k, b in buckets.items() if now - b[1] >= full_after]:
+            del buckets[key]
+
+    def get_stats(self) -> Dict[str, float]:
+        """Get limiter counters"""
+        return {
+            'allowed': sum(counts[0] for counts in self._counts),
+            'limited': sum(counts[1] for counts in self._counts),
+            'buckets': sum(len(b) for b in self._buckets),
+            'rate': self.rate,
+            'burst': self.burst,
+        }
+
+
+class ConcurrencyLimit:
+    """Counter capping how many operations may run at the same time"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> bool:
+        """Reserve a slot, returning False if the limit is reached"""
+        with self._lock:
+            if self.active >= self.limit:
+                return False
+            self.active += 1
+            return True
+
+    def release(self) -> None:
+        """Free a slot reserved with acquire()"""
+        with self._lock:
+            self.active = max(0, self.active - 1)
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Schedule Module
+Timer records, repeat rules and the schedule preview: each timer lazily
+generates its fire times, and the per-timer streams are k-way merged into one
+time-ordered stream, so a preview only computes the occurrences it returns.
+Previews are cached per timer-set version.
+"""
+
+import heapq
+import itertools
+import logging
+import sys
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Callable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ONE_DAY = timedelta(days=1)
+
+TIMER_FIELDS = ('id', 'seq', 'light_id', 'light_name', 'action', 'brightness', 'time',
+                'repeat', 'priority', 'active', 'created_at')
+# String fields that repeat across many timers and are stored once
+_SHARED_FIELDS = frozenset(('light_name', 'action', 'repeat', 'time'))
+
+
+class TimerRecord:
+    """
+    Compact timer storage with dict-style access
+
+    A slotted object takes a fraction of the memory of a per-timer dict, and
+    strings shared by many timers (names, actions, fire times) are interned.
+    Code reads and writes fields as timer['time'] / timer.get('active');
+    dict(timer) gives a plain copy for JSON encoding.
+    """
+
+    __slots__ = TIMER_FIELDS
+
+    def __init__(self, **fields):
+        for name in TIMER_FIELDS:
+            self[name] = fields.get(name)
+
+    def __getitem__(self, name):
+        try:
+            return getattr(self, name)
+        except AttributeError:
+            raise KeyError(name)
+
+    def __setitem__(self, name, value):
+        if name in _SHARED_FIELDS and isinstance(value, str):
+            value = sys.intern(value)
+        try:
+            setattr(self, name, value)
+        except AttributeError:
+            raise KeyError(name)
+
+    def __contains__(self, name):
+        return name in TIMER_FIELDS
+
+    def get(self, name, default=None):
+        value = getattr(self, name, None)
+        return default if value is None else value
+
+    def keys(self):
+        return TIMER_FIELDS
+
+    def __repr__(self):
+        return f"TimerRecord({dict(self)!r})"
+
+
+def allowed_day(when: datetime, repeat: str) -> bool:
+    """Does a repeat mode fire on this date?"""
+    if repeat == 'weekdays':
+        return when.weekday() < 5  # Monday-Friday = 0-4
+    if repeat == 'weekends':
+        return when.weekday() >= 5  # Saturday = 5, Sunday = 6
+    return True
+
+
+def next_occurrence(when: datetime, repeat: str) -> Optional[datetime]:
+    """
+    Fire time following a timer run
+
+    Args:
+        when: Time the timer fired (or was due)
+        repeat: 'once', 'daily', 'weekdays' or 'weekends'
+
+    Returns:
+        The next fire time, or None for one-time timers
+    """
+    if repeat == 'once':
+        return None
+    next_time = when + ONE_DAY
+    while not allowed_day(next_time, repeat):
+        next_time += ONE_DAY
+    return next_time
+
+
+def occurrences(first: datetime, repeat: str, start: datetime, end: datetime) -> Iterator[datetime]:
+    """
+    Lazily generate a timer's fire times in [start, end)
+
+    Args:
+        first: The timer's next scheduled time
+        repeat: Repeat mode
+        start: Range start
+        end: Range end (exclusive)
+    """
+    when = first
+    if when < start and repeat != 'once':
+        # Jump close to the range without stepping day by day; whole weeks
+        # keep the weekday pattern of weekday/weekend timers
+        days = (start - when).days
+        if repeat != 'daily':
+            days -= days % 7
+        when += timedelta(days=days)
+        while when is not None and when < start:
+            when = next_occurrence(when, repeat)
+
+    while when is not None and when < end:
+        if when >= start:
+            yield when
+        when = next_occurrence(when, repeat)
+
+
+def merge_schedule(timers: List[dict], start: datetime, end: datetime, limit: int) -> Tuple[List[dict], bool]:
+    """
+    Time-ordered occurrences of many timers
+
+    Args:
+        timers: Timer dicts ('id', 'time', 'repeat', ...)
+        start: Range start
+        end: Range end (exclusive)
+        limit: Maximum number of occurrences returned
+
+    Returns:
+        (occurrences, truncated) where truncated is True if more occurrences
+        exist in the range than were returned
+    """
+    def stream(timer):
+        first = datetime.fromisoformat(timer['time'])
+        for when in occurrences(first, timer['repeat'], start, end):
+            yield when, timer
+
+    merged = heapq.merge(*(stream(timer) for timer in timers), key=lambda item: item[0])
+    result = []
+    for when, timer in itertools.islice(merged, limit + 1):
+        if len(result) == limit:
+            return result, True
+        result.append({
+            'time': when.isoformat(),
+            'timer_id': timer['id'],
+            'light_id': timer['light_id'],
+            'light_name': timer['light_name'],
+            'action': timer['action'],
+            'brightness': timer.get('brightness'),
+        })
+    return result, False
+
+
+class ScheduleCache:
+    """Schedule previews cached for the current timer-set version"""
+
+    def __init__(self, max_entries: int = 32):
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def get(self, version: int, key: tuple, compute: Callable[[], object]):
+        """
+        Cached result for a key, computing it on a miss
+
+        Entries from older versions are dropped as soon as a newer version is seen.
+        """
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return self._entries[key]
+            self.stats['misses'] += 1
+
+        result = compute()
+
+        with self._lock:
+            if version == self._version:
+                self._entries[key] = result
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return result
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return dict(self.stats, entries=len(self._entries), version=self._version)
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Light State Table Module
+Publishes light state to a fixed-layout memory-mapped file so other processes
+(e.g. extra HTTP workers) can serve state queries without IPC. The owning
+process is the only writer; every record carries a seqlock counter, so readers
+never take a lock and retry the rare read that overlaps a write.
+
+Layout (little endian):
+    header  (32 bytes): magic 'WCLT', layout version, record size, capacity,
+                        record count, table sequence (bumped on every write)
+    records (64 bytes each): sequence, id, pin, state, is_pwm, brightness,
+                        updated (epoch seconds), name (UTF-8, 32 bytes)
+"""
+
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Not on Unix: tables are not locked
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'WCLT'
+LAYOUT_VERSION = 1
+
+HEADER = struct.Struct('<4sHHIIQ8x')
+RECORD = struct.Struct('<IHHBBxxfd32s8x')
+SEQ = struct.Struct('<I')
+BODY = struct.Struct('<HHBBxxfd32s8x')  # RECORD without its sequence
+TABLE_SEQ_OFFSET = 16  # Offset of the table sequence inside the header
+NAME_SIZE = 32
+
+
+class StateTableInUse(RuntimeError):
+    """Raised when another live process owns the table at a path"""
+
+
+def default_path(instance: Optional[str] = None) -> str:
+    """
+    Shared-memory file location (tmpfs on Linux)
+
+    Args:
+        instance: Name distinguishing services on one host (defaults to the
+            LIGHT_STATE_TABLE_NAME environment variable, then 'web_contr')
+    """
+    instance = instance or os.environ.get('LIGHT_STATE_TABLE_NAME') or 'web_contr'
+    directory = '/dev/shm' if os.path.isdir('/dev/shm') else os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'data')
+    return os.path.join(directory, f"{instance}-lights.tbl")
+
+
+class StateTableWriter:
+    """Owner side: creates the table and updates records in place"""
+
+    def __init__(self, path: str, lights: List[dict], capacity: Optional[int] = None):
+        """
+        Create (or recreate) the table for the configured lights
+
+        Args:
+            path: File to map, preferably on tmpfs
+            lights: Light dicts as in CONFIG['lights']
+            capacity: Number of record slots (defaults to the number of lights)
+
+        Raises:
+            StateTableInUse: If another process is publishing at this path
+        """
+        self.path = path
+        self.capacity = max(capacity or len(lights), len(lights))
+        self._index: Dict[int, int] = {}  # light id -> record slot
+        self._lock = threading.Lock()
+
+        size = HEADER.size + RECORD.size * self.capacity
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # A lock next to the table marks its owner, so a second process never
+        # replaces a table that is still being written
+        self._owner = open(f"{path}.lock", 'a+b')
+        if fcntl is not None:
+            try:
+                fcntl.flock(self._owner.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                self._owner.close()
+                raise StateTableInUse(f"Light state table {path} is owned by another process")
+        # Write to a new file and rename it, so readers never map a half-built table
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.truncate(size)
+        self._file = open(tmp_path, 'r+b')
+        self._map = mmap.mmap(self._file.fileno(), size)
+
+        HEADER.pack_into(self._map, 0, MAGIC, LAYOUT_VERSION, RECORD.size, self.capacity, len(lights), 0)
+        for slot, light in enumerate(lights):
+            self._index[light['id']] = slot
+            self._write(slot, light)
+        os.replace(tmp_path, path)
+        logger.info(f"Light state table published at {path} ({len(lights)} lights)")
+
+    def update(self, light: dict) -> None:
+        """Publish the current state of a light"""
+        slot = self._index.get(light['id'])
+        if slot is None:
+            return
+        with self._lock:
+            self._write(slot, light)
+
+    def _write(self, slot: int, light: dict) -> None:
+        offset = HEADER.size + slot * RECORD.size
+        # Encode first so the record is marked busy for as short as possible
+        body = BODY.pack(light['id'], light['pin'], 1 if light['state'] else 0,
+                         1 if light.get('type') == 'pwm' else 0, float(light.get('brightness', 0)),
+                         time.time(), light['name'].encode('utf-8')[:NAME_SIZE])
+        seq = SEQ.unpack_from(self._map, offset)[0]
+        # Odd sequence marks the record as being written
+        SEQ.pack_into(self._map, offset, (seq + 1) & 0xFFFFFFFF)
+        self._map[offset + SEQ.size:offset + RECORD.size] = body
+        SEQ.pack_into(self._map, offset, (seq + 2) & 0xFFFFFFFF)
+        table_seq = struct.unpack_from('<Q', self._map, TABLE_SEQ_OFFSET)[0]
+        struct.pack_into('<Q', self._map, TABLE_SEQ_OFFSET, table_seq + 1)
+
+    def close(self, remove: bool = False) -> None:
+        """Unmap the table, optionally deleting the file, and give up ownership"""
+        self._map.close()
+        self._file.close()
+        if remove:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+        self._owner.close()  # Releases the lock
+
+
+class StateTableReader:
+    """Reader side: lock-free, consistent reads of the records"""
+
+    def __init__(self, path: str, max_retries: int = 1000):
+        """
+        Map an existing table read-only
+
+        Raises:
+            ValueError: If the file is not a compatible state table
+        """
+        self.max_retries = max_retries
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, record_size, self.capacity, self.count, _ = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != LAYOUT_VERSION or record_size != RECORD.size:
+            self._map.close()
+            raise ValueError(f"{path} is not a version {LAYOUT_VERSION} light state table")
+
+    def table_seq(self) -> int:
+        """Counter bumped on every write; unchanged means no record changed"""
+        return struct.unpack_from('<Q', self._map, TABLE_SEQ_OFFSET)[0]
+
+    def read(self, slot: int) -> dict:
+        """
+        Read one record consistently
+
+        Raises:
+            RuntimeError: If the record kept changing for max_retries attempts
+        """
+        offset = HEADER.size + slot * RECORD.size
+        for _ in range(self.max_retries):
+            seq = SEQ.unpack_from(self._map, offset)[0]
+            if not seq & 1:
+                fields = BODY.unpack_from(self._map, offset + SEQ.size)
+                if SEQ.unpack_from(self._map, offset)[0] == seq:
+                    break
+            # A write overlapped this read; give the writer a chance to finish
+            time.sleep(0)
+        else:
+            raise RuntimeError(f"Light state record {slot} is being written continuously")
+
+        light_id, pin, state, is_pwm, brightness, updated, name = fields
+        return {
+            'id': light_id,
+            'name': name.rstrip(b'\0').decode('utf-8', 'replace'),
+            'pin': pin,
+            'state': bool(state),
+            'type': 'pwm' if is_pwm else 'digital',
+            'brightness': brightness,
+            'updated': updated,
+        }
+
+    def lights(self) -> List[dict]:
+        """All records, in configuration order"""
+        return [self.read(slot) for slot in range(self.count)]
+
+    def close(self) -> None:
+        self._map.close()
+
+
+if __name__ == '__main__':
+    import sys
+
+    reader = StateTableReader(sys.argv[1] if len(sys.argv) > 1 else default_path())
+    print(f"Table sequence: {reader.table_seq()}")
+    for light in reader.lights():
+        print(f"{light['id']:>3} {light['name']:<20} pin {light['pin']:>2} "
+              f"{'ON ' if light['state'] else 'OFF'} {light['brightness']:5.1f}%")
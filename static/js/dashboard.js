@@ -0,0 +1,543 @@
+// Global variables
+let lights = [];
+let systemStatus = {};
+let timers = [];
+
+// API endpoints
+const API_BASE = '/api';
+const ENDPOINTS = {
+    lights: `${API_BASE}/lights`,
+    allOn: `${API_BASE}/lights/all/on`,
+    allOff: `${API_BASE}/lights/all/off`,
+    status: `${API_BASE}/status`,
+    toggle: (id) => `${API_BASE}/lights/${id}/toggle`,
+    set: (id) => `${API_BASE}/lights/${id}/set`,
+    brightness: (id) => `${API_BASE}/lights/${id}/brightness`,
+    fade: (id) => `${API_BASE}/lights/${id}/fade`,
+    timers: `${API_BASE}/timers`,
+    timerDelete: (id) => `${API_BASE}/timers/${id}`,
+    timerToggle: (id) => `${API_BASE}/timers/${id}/toggle`
+};
+
+// Utility functions
+function showMessage(text, type = 'success') {
+    const messageEl = document.getElementById('message');
+    messageEl.textContent = text;
+    messageEl.className = `message ${type}`;
+    messageEl.classList.add('show');
+    
+    setTimeout(() => {
+        messageEl.classList.remove('show');
+    }, 3000);
+}
+
+function setLoading(element, isLoading) {
+    if (isLoading) {
+        element.classList.add('loading');
+    } else {
+        element.classList.remove('loading');
+    }
+}
+
+// API functions
+async function apiCall(url, options = {}) {
+    try {
+        const response = await fetch(url, {
+            headers: {
+                'Content-Type': 'application/json',
+                ...options.headers
+            },
+            ...options
+        });
+        
+        const data = await response.json();
+        
+        if (!response.ok) {
+            throw new Error(data.error || `HTTP ${response.status}`);
+        }
+        
+        return data;
+    } catch (error) {
+        console.error('API call failed:', error);
+        showMessage(`Error: ${error.message}`, 'error');
+        throw error;
+    }
+}
+
+async function loadLights() {
+    try {
+        const response = await apiCall(ENDPOINTS.lights);
+        lights = response.lights || [];
+        renderLights();
+    } catch (error) {
+        console.error('Failed to load lights:', error);
+    }
+}
+
+async function loadSystemStatus() {
+    try {
+        const response = await apiCall(ENDPOINTS.status);
+        systemStatus = response;
+        renderSystemStatus();
+    } catch (error) {
+        console.error('Failed to load system status:', error);
+    }
+}
+
+async function loadTimers() {
+    try {
+        const response = await apiCall(ENDPOINTS.timers);
+        timers = response.timers || [];
+        renderTimers();
+    } catch (error) {
+        console.error('Failed to load timers:', error);
+    }
+}
+
+async function toggleLight(lightId) {
+    const lightCard = document.querySelector(`[data-light-id="${lightId}"]`);
+    if (!lightCard) return;
+    
+    setLoading(lightCard, true);
+    
+    try {
+        const response = await apiCall(ENDPOINTS.toggle(lightId), {
+            method: 'POST'
+        });
+        
+        // Update local light state
+        const light = lights.find(l => l.id === lightId);
+        if (light) {
+            light.state = response.light.state;
+            renderLights();
+        }
+        
+        showMessage(response.message);
+    } catch (error) {
+        console.error('Failed to toggle light:', error);
+    } finally {
+        setLoading(lightCard, false);
+    }
+}
+
+async function setLight(lightId, state) {
+    const lightCard = document.querySelector(`[data-light-id="${lightId}"]`);
+    if (!lightCard) return;
+    
+    setLoading(lightCard, true);
+    
+    try {
+        const response = await apiCall(ENDPOINTS.set(lightId), {
+            method: 'POST',
+            body: JSON.stringify({ state })
+        });
+        
+        // Update local light state
+        const light = lights.find(l => l.id === lightId);
+        if (light) {
+            light.state = response.light.state;
+            renderLights();
+        }
+        
+        showMessage(response.message);
+    } catch (error) {
+        console.error('Failed to set light:', error);
+    } finally {
+        setLoading(lightCard, false);
+    }
+}
+
+async function turnAllLightsOn() {
+    const container = document.querySelector('.container');
+    setLoading(container, true);
+    
+    try {
+        const response = await apiCall(ENDPOINTS.allOn, {
+            method: 'POST'
+        });
+        
+        lights = response.lights || lights;
+        renderLights();
+        showMessage(response.message);
+    } catch (error) {
+        console.error('Failed to turn all lights on:', error);
+    } finally {
+        setLoading(container, false);
+    }
+}
+
+async function turnAllLightsOff() {
+    const container = document.querySelector('.container');
+    setLoading(container, true);
+    
+    try {
+        const response = await apiCall(ENDPOINTS.allOff, {
+            method: 'POST'
+        });
+        
+        lights = response.lights || lights;
+        renderLights();
+        showMessage(response.message);
+    } catch (error) {
+        console.error('Failed to turn all lights off:', error);
+    } finally {
+        setLoading(container, false);
+    }
+}
+
+async function refreshStatus() {
+    const container = document.querySelector('.container');
+    setLoading(container, true);
+    
+    try {
+        await Promise.all([loadLights(), loadSystemStatus(), loadTimers()]);
+        showMessage('Status refreshed successfully');
+    } catch (error) {
+        console.error('Failed to refresh status:', error);
+    } finally {
+        setLoading(container, false);
+    }
+}
+
+async function setBrightness(lightId, brightness) {
+    const lightCard = document.querySelector(`[data-light-id="${lightId}"]`);
+    if (!lightCard) return;
+    
+    try {
+        const response = await apiCall(ENDPOINTS.brightness(lightId), {
+            method: 'POST',
+            body: JSON.stringify({ brightness: parseFloat(brightness) })
+        });
+        
+        // Update local light state
+        const light = lights.find(l => l.id === lightId);
+        if (light) {
+            light.brightness = response.light.brightness;
+            light.state = response.light.state;
+            // Update slider display
+            const slider = lightCard.querySelector('.brightness-slider');
+            const valueDisplay = lightCard.querySelector('.brightness-value');
+            if (slider && valueDisplay) {
+                slider.value = light.brightness;
+                valueDisplay.textContent = `${Math.round(light.brightness)}%`;
+            }
+            // Update card state
+            lightCard.classList.toggle('on', light.state);
+            const indicator = lightCard.querySelector('.status-indicator');
+            const statusText = lightCard.querySelector('.status-text');
+            if (indicator && statusText) {
+                indicator.classList.toggle('on', light.state);
+                statusText.classList.toggle('on', light.state);
+                statusText.textContent = light.state ? 'ON' : 'OFF';
+            }
+        }
+        
+        showMessage(response.message);
+    } catch (error) {
+        console.error('Failed to set brightness:', error);
+    }
+}
+
+async function fadeLight(lightId, targetBrightness, fadeTime = 1.0) {
+    const lightCard = document.querySelector(`[data-light-id="${lightId}"]`);
+    if (!lightCard) return;
+    
+    setLoading(lightCard, true);
+    
+    try {
+        const response = await apiCall(ENDPOINTS.fade(lightId), {
+            method: 'POST',
+            body: JSON.stringify({ 
+                brightness: parseFloat(targetBrightness),
+                fade_time: parseFloat(fadeTime)
+            })
+        });
+        
+        showMessage(`Fading ${response.light ? lights.find(l => l.id === lightId)?.name : 'light'} to ${targetBrightness}%`);
+        
+        // Refresh after fade completes
+        setTimeout(async () => {
+            await loadLights();
+            renderLights();
+        }, fadeTime * 1000 + 100);
+        
+    } catch (error) {
+        console.error('Failed to fade light:', error);
+    } finally {
+        setLoading(lightCard, false);
+    }
+}
+
+// Rendering functions
+function renderLights() {
+    const grid = document.getElementById('lightsGrid');
+    
+    if (!lights || lights.length === 0) {
+        grid.innerHTML = '<div style="text-align: center; color: #666; grid-column: 1/-1;">No lights configured</div>';
+        return;
+    }
+    
+    grid.innerHTML = lights.map(light => {
+        const isPwm = light.type === 'pwm';
+        const brightness = light.brightness || 0;
+        
+        return `
+        <div class="light-card ${light.state ? 'on' : ''}" data-light-id="${light.id}">
+            <div class="light-header">
+                <div class="light-name">${light.name}</div>
+                <div class="light-status">
+                    <div class="status-indicator ${light.state ? 'on' : ''}"></div>
+                    <span class="status-text ${light.state ? 'on' : ''}">${light.state ? 'ON' : 'OFF'}</span>
+                </div>
+            </div>
+            <div class="pin-info">GPIO Pin: ${light.pin}${isPwm ? ' (PWM)' : ''}</div>
+            <div class="light-controls">
+                <button class="toggle-btn ${light.state ? 'on' : 'off'}" 
+                        onclick="toggleLight(${light.id})">
+                    ${light.state ? '🌙 Turn OFF' : '💡 Turn ON'}
+                </button>
+            </div>
+            ${isPwm ? `
+                <div class="brightness-control">
+                    <div class="brightness-label">
+                        <span>🔆 Brightness</span>
+                        <span class="brightness-value">${Math.round(brightness)}%</span>
+                    </div>
+                    <input type="range" class="brightness-slider" 
+                           min="0" max="100" value="${brightness}"
+                           oninput="setBrightness(${light.id}, this.value)"
+                           onchange="setBrightness(${light.id}, this.value)">
+                    <div class="fade-controls">
+                        <button class="fade-btn" onclick="fadeLight(${light.id}, 25, 1)">🌅 25%</button>
+                        <button class="fade-btn" onclick="fadeLight(${light.id}, 50, 1)">☀️ 50%</button>
+                        <button class="fade-btn" onclick="fadeLight(${light.id}, 75, 1)">🔥 75%</button>
+                        <button class="fade-btn" onclick="fadeLight(${light.id}, 100, 1)">⚡ 100%</button>
+                    </div>
+                    <div class="pwm-info">PWM Frequency: 1kHz | Smooth dimming</div>
+                </div>
+            ` : ''}
+        </div>
+        `;
+    }).join('');
+}
+
+function renderSystemStatus() {
+    const statusEl = document.getElementById('statusInfo');
+    
+    if (!systemStatus || !systemStatus.success) {
+        statusEl.innerHTML = '<div style="color: #f44336;">System status unavailable</div>';
+        return;
+    }
+    
+    const onLights = lights.filter(l => l.state).length;
+    const totalLights = lights.length;
+    const activeTimers = systemStatus.active_timers || 0;
+    
+    statusEl.innerHTML = `
+        <div class="status-item">
+            <span class="status-label">Status:</span>
+            <span class="status-value">${systemStatus.status || 'Unknown'}</span>
+        </div>
+        <div class="status-item">
+            <span class="status-label">GPIO Mode:</span>
+            <span class="status-value">${systemStatus.gpio_mode || 'Unknown'}</span>
+        </div>
+        <div class="status-item">
+            <span class="status-label">Lights ON:</span>
+            <span class="status-value">${onLights} / ${totalLights}</span>
+        </div>
+        <div class="status-item">
+            <span class="status-label">Active Timers:</span>
+            <span class="status-value">${activeTimers}</span>
+        </div>
+        <div class="status-item">
+            <span class="status-label">Last Update:</span>
+            <span class="status-value">${new Date().toLocaleTimeString()}</span>
+        </div>
+    `;
+}
+
+function renderTimers() {
+    const timerList = document.getElementById('timerList');
+    
+    if (!timers || timers.length === 0) {
+        timerList.innerHTML = '<div class="no-timers">No timers scheduled</div>';
+        return;
+    }
+    
+    timerList.innerHTML = timers.map(timer => {
+        const timerTime = new Date(timer.time);
+        const timeStr = timerTime.toLocaleTimeString('en-US', { hour: '2-digit', minute: '2-digit' });
+        const dateStr = timerTime.toLocaleDateString('en-US', { month: 'short', day: 'numeric' });
+        
+        let actionText = timer.action.toUpperCase();
+        if (timer.action === 'brightness') {
+            actionText = `${timer.brightness}%`;
+        }
+        
+        let repeatText = timer.repeat;
+        if (repeatText === 'once') {
+            repeatText = `${dateStr} ${timeStr}`;
+        } else {
+            repeatText = `${repeatText.charAt(0).toUpperCase() + repeatText.slice(1)} at ${timeStr}`;
+        }
+        
+        return `
+        <div class="timer-item ${timer.active ? '' : 'inactive'}">
+            <div class="timer-info">
+                <div class="timer-light-name">${timer.light_name}</div>
+                <div class="timer-details">
+                    ${actionText} • ${repeatText}
+                    ${timer.active ? '' : ' • <strong>Inactive</strong>'}
+                </div>
+            </div>
+            <div class="timer-actions">
+                <button class="timer-action-btn timer-toggle-btn ${timer.active ? '' : 'inactive'}" 
+                        onclick="toggleTimer('${timer.id}')">
+                    ${timer.active ? '⏸' : '▶️'}
+                </button>
+                <button class="timer-action-btn timer-delete-btn" 
+                        onclick="deleteTimer('${timer.id}')">
+                    🗑️
+                </button>
+            </div>
+        </div>
+        `;
+    }).join('');
+}
+
+// Timer Modal Functions
+function openTimerModal() {
+    const modal = document.getElementById('timerModal');
+    const lightSelect = document.getElementById('timerLight');
+    
+    // Populate light options
+    lightSelect.innerHTML = '<option value="">Select a light</option>' + 
+        lights.map(light => `<option value="${light.id}">${light.name}</option>`).join('');
+    
+    // Set default time to current time + 1 hour
+    const now = new Date();
+    now.setHours(now.getHours() + 1);
+    const timeStr = now.toTimeString().slice(0, 5);
+    document.getElementById('timerTime').value = timeStr;
+    
+    modal.classList.add('show');
+}
+
+function closeTimerModal() {
+    const modal = document.getElementById('timerModal');
+    modal.classList.remove('show');
+    document.getElementById('timerForm').reset();
+}
+
+function toggleBrightnessInput() {
+    const action = document.getElementById('timerAction').value;
+    const brightnessGroup = document.getElementById('brightnessGroup');
+    brightnessGroup.style.display = action === 'brightness' ? 'block' : 'none';
+}
+
+async function createTimer(event) {
+    event.preventDefault();
+    
+    const lightId = parseInt(document.getElementById('timerLight').value);
+    const action = document.getElementById('timerAction').value;
+    const time = document.getElementById('timerTime').value;
+    const repeat = document.getElementById('timerRepeat').value;
+    const brightness = parseInt(document.getElementById('timerBrightness').value);
+    
+    if (!lightId) {
+        showMessage('Please select a light', 'error');
+        return;
+    }
+    
+    try {
+        const payload = {
+            light_id: lightId,
+            action: action,
+            time: time,
+            repeat: repeat
+        };
+        
+        if (action === 'brightness') {
+            payload.brightness = brightness;
+        }
+        
+        const response = await apiCall(ENDPOINTS.timers, {
+            method: 'POST',
+            body: JSON.stringify(payload)
+        });
+        
+        showMessage(response.message);
+        closeTimerModal();
+        await loadTimers();
+        
+    } catch (error) {
+        console.error('Failed to create timer:', error);
+    }
+}
+
+async function deleteTimer(timerId) {
+    if (!confirm('Are you sure you want to delete this timer?')) {
+        return;
+    }
+    
+    try {
+        const response = await apiCall(ENDPOINTS.timerDelete(timerId), {
+            method: 'DELETE'
+        });
+        
+        showMessage(response.message);
+        await loadTimers();
+        
+    } catch (error) {
+        console.error('Failed to delete timer:', error);
+    }
+}
+
+async function toggleTimer(timerId) {
+    try {
+        const response = await apiCall(ENDPOINTS.timerToggle(timerId), {
+            method: 'POST'
+        });
+        
+        showMessage(response.message);
+        await loadTimers();
+        
+    } catch (error) {
+        console.error('Failed to toggle timer:', error);
+    }
+}
+
+// Initialize the application
+async function init() {
+    try {
+        await Promise.all([loadLights(), loadSystemStatus(), loadTimers()]);
+        console.log('GPIO Light Control initialized');
+        
+        // Setup timer form submission
+        document.getElementById('timerForm').addEventListener('submit', createTimer);
+        
+        // Close modal on outside click
+        document.getElementById('timerModal').addEventListener('click', (e) => {
+            if (e.target.id === 'timerModal') {
+                closeTimerModal();
+            }
+        });
+        
+    } catch (error) {
+        console.error('Failed to initialize:', error);
+        showMessage('Failed to initialize application', 'error');
+    }
+}
+
+// Auto-refresh every 30 seconds
+setInterval(async () => {
+    try {
+        await Promise.all([loadLights(), loadTimers()]);
+    } catch (error) {
+        console.error('Auto-refresh failed:', error);
+    }
+}, 30000);
+
+// Start the application when page loads
+document.addEventListener('DOMContentLoaded', init);
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Automation engine tests: rule validation, the per-light dependency index,
+state_for deadlines and time conditions on the injected clock
+
+Run with: python -m pytest test_automation.py
+"""
+
+import os
+import tempfile
+import time
+from datetime import datetime
+
+os.environ.setdefault('LIGHT_HISTORY_DIR', tempfile.mkdtemp(prefix='light-history-'))
+os.environ.setdefault('LIGHT_STATE_TABLE', '')
+
+import pytest
+
+from automation import AutomationEngine, RuleError
+from clock import VirtualClock
+
+
+def wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, 'timed out waiting for the automation engine'
+        time.sleep(0.005)
+
+
+@pytest.fixture
+def engine():
+    actions = []
+    engine = AutomationEngine(actions.append, [1, 2, 3], clock=VirtualClock(datetime(2026, 1, 5, 12, 0)))
+    engine.actions = actions
+    engine.start()
+    yield engine
+    engine.stop()
+
+
+def change_rule(light_id, target, **extra):
+    return dict({'trigger': {'type': 'change', 'light_id': light_id, 'to': 'on'},
+                 'actions': [{'type': 'set', 'light_id': target, 'state': 'on'}]}, **extra)
+
+
+def test_invalid_conditions_are_rule_errors(engine):
+    for condition in ({'type': 'light', 'light_id': 1, 'min_brightness': 'x'},
+                      {'type': 'light', 'light_id': 1, 'min_brightness': 80, 'max_brightness': 20},
+                      {'type': 'time', 'after': '07:00', 'days': 'weekdays'}):
+        with pytest.raises(RuleError):
+            engine.add_rule(change_rule(1, 2, conditions=[condition]))
+
+
+def test_changes_only_evaluate_rules_indexed_on_the_light(engine):
+    engine.add_rule(change_rule(1, 2))
+    engine.add_rule(change_rule(1, 3))
+    engine.add_rule(change_rule(2, 3))
+
+    engine.notify(3, 100)  # No rule depends on light 3
+    engine.notify(1, 100)
+    wait_for(lambda: engine.get_stats()['events'] == 2 and len(engine.actions) == 2)
+    assert engine.get_stats()['evaluations'] == 2
+    assert sorted(a['light_id'] for a in engine.actions) == [2, 3]
+
+    # Removing a rule takes it out of the index
+    rule_id = engine.list_rules()[0]['id']
+    engine.remove_rule(rule_id)
+    engine.notify(1, 0)
+    engine.notify(1, 100)
+    wait_for(lambda: engine.get_stats()['events'] == 4)
+    assert engine.get_stats()['evaluations'] == 4
+
+
+@pytest.fixture
+def manual():
+    """Engine without its thread, driven by process_pending() on a VirtualClock"""
+    actions = []
+    engine = AutomationEngine(actions.append, [1, 2, 3], clock=VirtualClock(datetime(2026, 1, 5, 12, 0)))
+    engine.actions = actions
+
+    def at(seconds, *changes):
+        engine.clock.advance_to(seconds)
+        for light_id, value in changes:
+            engine.notify(light_id, value)
+        engine.process_pending()
+    engine.at = at
+    return engine
+
+
+def test_state_for_fires_once_after_the_deadline_and_rearms(manual):
+    manual.at(0, (1, 100))
+    manual.add_rule({'trigger': {'type': 'state_for', 'light_ids': [1, 2], 'state': 'off', 'for_seconds': 10},
+                     'actions': [{'type': 'all', 'state': 'off'}]})
+
+    manual.at(1, (1, 0))
+    manual.at(10.9)
+    assert manual.actions == []
+    manual.at(11)
+    assert len(manual.actions) == 1
+
+    # Breaking the state restarts the countdown from the moment it re-forms
+    manual.at(20, (2, 100))
+    manual.at(21, (2, 0))
+    manual.at(30.9)
+    assert len(manual.actions) == 1
+    manual.at(31)
+    assert len(manual.actions) == 2
+
+
+def test_a_broken_countdown_does_not_fire_at_its_old_deadline(manual):
+    manual.add_rule({'trigger': {'type': 'state_for', 'light_ids': [1], 'state': 'off', 'for_seconds': 1},
+                     'actions': [{'type': 'all', 'state': 'off'}]})  # Armed at 0: lights start off
+
+    manual.at(0.2, (1, 100))
+    manual.at(0.4, (1, 0))
+    manual.at(1.0)
+    assert manual.actions == []
+    manual.at(1.39)
+    assert manual.actions == []
+    manual.at(1.4)
+    assert len(manual.actions) == 1
+
+
+def test_writes_that_keep_the_state_do_not_refire(manual):
+    manual.add_rule({'trigger': {'type': 'state_for', 'light_ids': 'all', 'state': 'off', 'for_seconds': 600},
+                     'actions': [{'type': 'all', 'state': 'off'}]})
+
+    manual.at(600)
+    assert len(manual.actions) == 1
+    # The rule's own "all off" and other redundant writes of 0 leave the state unbroken
+    for minute in range(11, 60):
+        manual.at(minute * 60, (1, 0), (2, 0), (3, 0))
+    assert len(manual.actions) == 1
+    assert manual.list_rules()[0]['armed'] is False
+
+
+def test_time_conditions_use_the_injected_clock(engine):
+    engine.add_rule(change_rule(1, 2, conditions=[{'type': 'time', 'after': '22:00', 'before': '06:00'}]))
+
+    engine.notify(1, 100)  # 12:00 on the virtual clock
+    wait_for(lambda: engine.get_stats()['events'] == 1)
+    time.sleep(0.05)
+    assert engine.actions == []
+
+    engine.clock.advance(11 * 3600)  # 23:00
+    engine.notify(1, 0)
+    engine.notify(1, 100)
+    wait_for(lambda: len(engine.actions) == 1)
+
+
+def test_rule_api_rejects_non_object_bodies():
+    import app
+
+    client = app.app.test_client()
+    for body in ('[1, 2]', '"rule"', '7'):
+        response = client.post('/api/automations', data=body, content_type='application/json')
+        assert response.status_code == 400, body
+
+    fade = {'type': 'fade', 'light_id': 1, 'brightness': 50, 'fade_time': 1}
+    for extra in ({'steps': 10 ** 7}, {'steps': 0}, {'fade_time': 10 ** 6}):
+        rule = change_rule(1, 2)
+        rule['actions'] = [dict(fade, **extra)]
+        response = client.post('/api/automations', json=rule)
+        assert response.status_code == 400, extra
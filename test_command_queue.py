@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+GPIO command queue tests against a simulation-mode GPIOController: per-pin
+ordering, merging, batch backpressure and the 503 response
+
+Run with: python -m pytest test_command_queue.py
+"""
+
+import os
+import tempfile
+
+os.environ.setdefault('LIGHT_HISTORY_DIR', tempfile.mkdtemp(prefix='light-history-'))
+os.environ.setdefault('LIGHT_STATE_TABLE', '')
+
+import pytest
+
+from command_queue import CommandQueue, QueueFullError, SET_BRIGHTNESS, SET_STATE, TOGGLE
+from gpio_controller import GPIOController
+
+PWM_PIN, DIGITAL_PIN = 18, 23
+
+
+@pytest.fixture
+def controller():
+    controller = GPIOController(simulation_mode=True)
+    controller.setup_pwm_pin(PWM_PIN)
+    controller.setup_pin(DIGITAL_PIN)
+    yield controller
+    controller.cleanup()
+
+
+def make_queue(controller, capacity=8):
+    """Queue whose worker is started by the test, so commands pile up first"""
+    changes = []
+    queue = CommandQueue(controller, capacity=capacity,
+                         on_change=lambda pin, value: changes.append((pin, value)))
+    queue.changes = changes
+    return queue
+
+
+def drain(queue):
+    queue.start()
+    assert queue.wait_idle(5)
+    queue.stop()
+
+
+def test_commands_for_a_pin_run_in_order(controller):
+    queue = make_queue(controller)
+    futures = [queue.submit(SET_STATE, DIGITAL_PIN, True), queue.submit(TOGGLE, DIGITAL_PIN),
+               queue.submit(TOGGLE, DIGITAL_PIN)]
+    drain(queue)
+
+    # A toggle queued after a set flips the state the set produced
+    assert [f.result(1) for f in futures] == [True, False, True]
+    assert queue.changes == [(DIGITAL_PIN, True), (DIGITAL_PIN, False), (DIGITAL_PIN, True)]
+
+
+def test_toggle_after_set_on_a_pwm_pin(controller):
+    queue = make_queue(controller)
+    queue.submit(SET_BRIGHTNESS, PWM_PIN, 40.0)
+    toggled = queue.submit(TOGGLE, PWM_PIN)
+    drain(queue)
+    assert toggled.result(1) == 0.0
+    assert controller.get_brightness(PWM_PIN) == 0.0
+
+
+def test_superseded_commands_share_the_result(controller):
+    queue = make_queue(controller)
+    futures = [queue.submit(SET_BRIGHTNESS, PWM_PIN, level) for level in (10.0, 20.0, 30.0)]
+    other = queue.submit(SET_STATE, DIGITAL_PIN, True)
+    assert queue.pending_count() == 2
+    drain(queue)
+
+    assert [f.result(1) for f in futures] == [30.0, 30.0, 30.0]
+    assert other.result(1) is True
+    stats = queue.get_stats()
+    assert stats['merged'] == 2 and stats['executed'] == 2 and stats['submitted'] == 4
+    assert (PWM_PIN, 10.0) not in queue.changes
+
+
+def test_a_full_queue_rejects_new_work_but_accepts_merges(controller):
+    queue = make_queue(controller, capacity=2)
+    queue.submit(TOGGLE, PWM_PIN)
+    queue.submit(TOGGLE, DIGITAL_PIN)
+    with pytest.raises(QueueFullError):
+        queue.submit(TOGGLE, PWM_PIN)
+    # An absolute command replaces what is pending for its pin, freeing the slot
+    queue.submit(SET_BRIGHTNESS, PWM_PIN, 50.0)
+
+    stats = queue.get_stats()
+    assert stats['rejected'] == 1 and stats['submitted'] == 3 and stats['pending'] == 2
+    drain(queue)
+    assert controller.get_brightness(PWM_PIN) == 50.0
+
+
+def test_batches_are_all_or_nothing(controller):
+    queue = make_queue(controller, capacity=3)
+    queue.submit(TOGGLE, 5)
+    queue.submit(TOGGLE, 6)
+    with pytest.raises(QueueFullError):
+        queue.submit_batch([(SET_BRIGHTNESS, PWM_PIN, 70.0), (SET_STATE, DIGITAL_PIN, True)])
+    assert queue.pending_count() == 2
+    assert queue.get_stats()['rejected'] == 2 and queue.get_stats()['submitted'] == 2
+
+    queue = make_queue(controller, capacity=3)
+    futures = queue.submit_batch([(SET_BRIGHTNESS, PWM_PIN, 70.0), (SET_STATE, DIGITAL_PIN, True)])
+    drain(queue)
+    assert [f.result(1) for f in futures] == [70.0, True]
+
+
+def test_full_queue_answers_503_with_retry_after(monkeypatch):
+    import app
+    from rate_limiter import TokenBucketLimiter
+
+    app.rate_limiter = TokenBucketLimiter(rate=1e9, burst=1e9)
+
+    def full(*args, **kwargs):
+        raise QueueFullError('Command queue is full')
+    monkeypatch.setattr(app.command_queue, 'submit', full)
+
+    light_id = app.CONFIG['lights'][0]['id']
+    response = app.app.test_client().post(f'/api/lights/{light_id}/toggle')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+    assert response.get_json()['success'] is False
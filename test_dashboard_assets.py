@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Precompiled dashboard asset tests: ETag revalidation, encoding selection and
+the hashed asset route
+
+Run with: python -m pytest test_dashboard_assets.py
+"""
+
+import gzip
+import os
+import tempfile
+
+os.environ.setdefault('LIGHT_HISTORY_DIR', tempfile.mkdtemp(prefix='light-history-'))
+os.environ.setdefault('LIGHT_STATE_TABLE', '')
+
+import pytest
+from flask import Flask, Response, request
+
+from dashboard_assets import IMMUTABLE_CACHE_CONTROL, DashboardAssets, make_response
+
+CSS = b'body { color: #333; }\n' * 50
+
+
+@pytest.fixture
+def client(tmp_path):
+    (tmp_path / 'dashboard.css').write_bytes(CSS)
+    (tmp_path / 'tiny.js').write_bytes(b'x')
+    assets = DashboardAssets(str(tmp_path))
+    css = assets.add_file('dashboard.css', 'dashboard.css')
+    css.variants['br'] = b'brotli bytes'  # Stands in for the optional brotli package
+    assets.add_file('tiny.js', 'tiny.js')
+
+    app = Flask(__name__)
+
+    @app.route('/assets/<path:filename>')
+    def asset(filename):
+        found = assets.get(filename)
+        if not found:
+            return 'not found', 404
+        return make_response(Response, request, found, IMMUTABLE_CACHE_CONTROL)
+
+    client = app.test_client()
+    client.assets = assets
+    return client
+
+
+def test_encoding_follows_accept_encoding(client):
+    url = client.assets.asset_url('dashboard.css')
+
+    response = client.get(url, headers={'Accept-Encoding': 'gzip, deflate, br'})
+    assert response.headers['Content-Encoding'] == 'br' and response.data == b'brotli bytes'
+
+    response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(response.data) == CSS
+
+    response = client.get(url, headers={'Accept-Encoding': 'br;q=0, gzip;q=0'})
+    assert 'Content-Encoding' not in response.headers and response.data == CSS
+
+    response = client.get(url)
+    assert response.data == CSS
+    assert response.headers['Vary'] == 'Accept-Encoding'
+    assert response.headers['Cache-Control'] == IMMUTABLE_CACHE_CONTROL
+    assert response.content_type == 'text/css; charset=utf-8'
+
+
+def test_compression_that_does_not_help_is_skipped(client):
+    tiny = client.assets.assets['tiny.js']
+    assert set(tiny.variants) == {'identity'}
+    response = client.get(client.assets.asset_url('tiny.js'), headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers and response.data == b'x'
+
+
+def test_matching_etag_gets_304(client):
+    url = client.assets.asset_url('dashboard.css')
+    etag = client.get(url).headers['ETag']
+    assert etag == f'"{client.assets.assets["dashboard.css"].digest}"'
+
+    response = client.get(url, headers={'If-None-Match': etag, 'Accept-Encoding': 'gzip'})
+    assert response.status_code == 304 and response.data == b''
+    assert response.headers['ETag'] == etag
+
+    assert client.get(url, headers={'If-None-Match': '"stale"'}).status_code == 200
+
+
+def test_service_serves_shell_and_hashed_assets():
+    import app
+
+    if not app.ENABLE_DASHBOARD:
+        pytest.skip('dashboard disabled')
+    client = app.app.test_client()
+
+    shell = client.get('/')
+    assert shell.status_code == 200 and shell.headers['Cache-Control'] == 'no-cache'
+    url = app.dashboard_assets.asset_url('dashboard.js')
+    assert url.encode('utf-8') in shell.data
+    assert client.get('/', headers={'If-None-Match': shell.headers['ETag']}).status_code == 304
+
+    assert client.get(url).status_code == 200
+    response = client.get('/assets/dashboard.000000000000.js')
+    assert response.status_code == 404 and response.get_json()['success'] is False
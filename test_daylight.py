@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Daylight harvesting tests
+Runs the control loop in virtual time against a simulated sensor whose
+reading includes the light the controlled lamps add.
+
+Run with: python -m pytest test_daylight.py
+"""
+
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+os.environ.setdefault('LIGHT_HISTORY_DIR', tempfile.mkdtemp(prefix='light-history-'))
+os.environ.setdefault('LIGHT_STATE_TABLE', '')
+
+import pytest
+
+from clock import VirtualClock, SimulationRunner
+from daylight import DaylightConfigError, DaylightController, DaylightZone, SimulatedSensor
+
+START = datetime(2026, 3, 20, 5, 0, 0)
+
+
+def run_day(hours=14, switch=None, **zone_options):
+    """Run a zone over lamps that start switched on; switch=(minute, light_id, level) sets a lamp by hand"""
+    clock = VirtualClock(START)
+    runner = SimulationRunner(clock)
+    brightness = {1: 50.0, 2: 50.0}
+    writes = []
+
+    def set_brightness(light_id, value):
+        brightness[light_id] = value
+        writes.append((clock.now(), light_id, value))
+
+    sensor = SimulatedSensor(clock, lambda: (brightness[1] + brightness[2]) / 2,
+                             lux_at_full=600.0, daylight_peak=700.0)
+    controller = DaylightController(set_brightness, brightness.get, interval=1.0, clock=clock)
+    zone = DaylightZone(dict({'id': 1, 'light_ids': [1, 2], 'target_lux': 500}, **zone_options),
+                        sensor, [1, 2])
+    controller.add_zone(zone)
+
+    samples = []
+    runner.spawn(controller.control_task())
+    for minute in range(hours * 60):
+        if switch and switch[0] == minute:
+            brightness[switch[1]] = switch[2]
+        runner.run_for(60)
+        samples.append((clock.now(), sensor.read(), brightness[1]))
+    return controller, samples, writes
+
+
+def test_holds_target_lux_through_the_day():
+    """Lamps fill in for missing daylight, dim around noon and hold the target"""
+    controller, samples, writes = run_day()
+
+    settled = [(t, lux, level) for t, lux, level in samples if t >= START + timedelta(minutes=10)]
+    for t, lux, level in settled:
+        if level > 0:  # Not yet saturated by daylight alone
+            assert abs(lux - 500) <= 60, (t, lux)
+
+    by_hour = {t.hour: level for t, _, level in settled if t.minute == 0}
+    assert by_hour[6] > 70  # Dawn: mostly lamp
+    assert by_hour[12] == 0.0  # Noon: daylight alone exceeds the target
+    assert controller.stats['overruns'] == 0
+
+
+def test_hysteresis_limits_writes():
+    """Inside the deadband the loop leaves the lights alone"""
+    controller, samples, writes = run_day(hours=2)
+
+    loops = controller.stats['loops']
+    assert loops >= 2 * 3600
+    assert len(writes) < loops / 10
+    assert controller.stats['holds'] > loops / 2
+
+
+def test_lights_switched_off_stay_off():
+    """The zone keeps controlling the lamps that are on and never re-lights one switched off"""
+    controller, samples, writes = run_day(hours=3, switch=(30, 2, 0.0))
+
+    assert [w for w in writes if w[1] == 2 and w[0] > START + timedelta(minutes=30)] == []
+    assert any(w[1] == 1 for w in writes if w[0] > START + timedelta(minutes=31))
+    assert controller.zones[1].to_dict()['lux'] == pytest.approx(500, abs=60)
+
+
+def test_invalid_zones_are_config_errors():
+    """Bad zone parameters disable the zone instead of failing the service at import"""
+    base = {'id': 1, 'light_ids': [1, 2], 'target_lux': 500}
+    for options in ({'light_ids': []}, {'gain': 'fast'}, {'median_window': 'x'}, {'ema_alpha': None},
+                    {'target_lux': float('nan')}, {'deadband_lux': float('inf')}, {'max_step': 0},
+                    {'min_brightness': 60, 'max_brightness': 40}, {'ema_alpha': 0}):
+        with pytest.raises(DaylightConfigError):
+            DaylightZone(dict(base, **options), None, [1, 2])
+
+
+def test_api_rejects_non_finite_target_lux():
+    import app
+    from rate_limiter import TokenBucketLimiter
+
+    app.rate_limiter = TokenBucketLimiter(rate=1e9, burst=1e9)
+    light_ids = [l['id'] for l in app.CONFIG['lights'] if l.get('type') == 'pwm'][:1]
+    zone = DaylightZone({'id': 99, 'light_ids': light_ids, 'target_lux': 500}, None, light_ids)
+    app.daylight_controller.add_zone(zone)
+    try:
+        client = app.app.test_client()
+        for body in ('{"target_lux": NaN}', '{"target_lux": Infinity}', '{"target_lux": -1}', '[1]'):
+            response = client.post('/api/daylight/99', data=body, content_type='application/json')
+            assert response.status_code == 400, body
+        assert zone.target_lux == 500
+        assert client.post('/api/daylight/99', json={'target_lux': 300}).status_code == 200
+        assert zone.target_lux == 300
+    finally:
+        del app.daylight_controller.zones[99]
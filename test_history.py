@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Light history tests: segment sealing, checkpoints, hourly rollups and range queries
+
+Run with: python -m pytest test_history.py
+"""
+
+import time
+
+import history
+from history import HistoryRecorder, SECONDS_PER_HOUR
+
+# An hour boundary a few hours ago (rollup queries include open intervals up to now)
+T0 = time.time() // SECONDS_PER_HOUR * SECONDS_PER_HOUR - 4 * SECONDS_PER_HOUR
+
+
+def test_sealing_keeps_memory_and_disk_bounded(tmp_path):
+    recorder = HistoryRecorder([1], data_dir=str(tmp_path), segment_size=4, max_segments=2,
+                               max_disk_segments=3)
+    for i in range(40):
+        recorder.record(1, i % 2 * 100, T0 + i)
+    # Recording never writes; sealed segments wait for the checkpoint
+    assert recorder.get_stats()['segments_on_disk'] == 0
+    assert len(recorder.query_events(T0, T0 + 40)) == 12
+    recorder.checkpoint(now=T0 + 40)
+
+    stats = recorder.get_stats()
+    assert stats['segments_in_memory'] == 2
+    assert stats['segments_unwritten'] == 0
+    assert stats['segments_on_disk'] == 3
+    # The oldest records were dropped with their files; recent ones are still queryable
+    events = recorder.query_events(T0, T0 + 40)
+    assert [e['timestamp'] for e in events] == [T0 + i for i in range(28, 40)]
+
+
+def test_rollups_split_intervals_by_hour_and_survive_restart(tmp_path):
+    recorder = HistoryRecorder([1, 2], data_dir=str(tmp_path))
+    recorder.record(1, 50, T0 + SECONDS_PER_HOUR - 600)
+    recorder.record(1, 0, T0 + SECONDS_PER_HOUR + 1200)
+    recorder.record(2, 100, T0)
+    recorder.checkpoint(now=T0 + 2 * SECONDS_PER_HOUR)
+
+    rollups = recorder.query_rollups(T0, T0 + 2 * SECONDS_PER_HOUR, light_id=1, watts={1: 20.0})
+    assert [(r['hour'], r['on_seconds'], r['avg_brightness']) for r in rollups] == [
+        (T0, 600.0, 50.0), (T0 + SECONDS_PER_HOUR, 1200.0, 50.0)]
+    assert rollups[0]['energy_wh'] == round(20.0 * 600 * 0.5 / SECONDS_PER_HOUR, 4)
+
+    # The checkpoint persisted the still-open interval of light 2
+    restored = HistoryRecorder([1, 2], data_dir=str(tmp_path))
+    light2 = restored.query_rollups(T0, T0 + 2 * SECONDS_PER_HOUR, light_id=2)
+    assert [r['on_seconds'] for r in light2] == [3600.0, 3600.0]
+
+
+def test_range_query_reads_only_overlapping_segment_files(tmp_path, monkeypatch):
+    recorder = HistoryRecorder([1], data_dir=str(tmp_path), segment_size=10, max_segments=1)
+    for i in range(100):
+        recorder.record(1, i % 2 * 100, T0 + i * 60)
+    recorder.checkpoint(now=T0 + 6000)
+
+    reads = []
+    from_bytes = history.Segment.from_bytes
+    monkeypatch.setattr(history.Segment, 'from_bytes',
+                        classmethod(lambda cls, data: reads.append(1) or from_bytes(data)))
+
+    events = recorder.query_events(T0 + 1230, T0 + 1500)
+    assert [e['timestamp'] for e in events] == [T0 + i * 60 for i in range(21, 25)]
+    assert len(reads) == 1
+
+    # Limits stop early and light filters apply across segments
+    assert len(recorder.query_events(T0, T0 + 6000, limit=15)) == 15
+    assert all(e['brightness'] == 100 for e in recorder.query_events(T0, T0 + 6000, light_id=1)[1::2])
+
+
+def test_checkpoints_append_only_changed_hours(tmp_path):
+    recorder = HistoryRecorder([1, 2, 3, 4], data_dir=str(tmp_path))
+    for hour in range(3):
+        recorder.record(1, 100, T0 + hour * SECONDS_PER_HOUR)
+        recorder.record(1, 0, T0 + hour * SECONDS_PER_HOUR + 60)
+    recorder.checkpoint(now=T0 + 3 * SECONDS_PER_HOUR)
+    journal = tmp_path / 'rollups.log'
+    entry = history.JOURNAL_HOUR.size + 16 * 4
+    size = journal.stat().st_size
+    assert size == history.JOURNAL_HEADER.size + 3 * entry
+    assert not (tmp_path / 'rollups.bin').exists()
+
+    # Only the hour that changed is appended; nothing changed means nothing is written
+    recorder.record(2, 100, T0 + 3 * SECONDS_PER_HOUR + 10)
+    recorder.checkpoint(now=T0 + 3 * SECONDS_PER_HOUR + 20)
+    recorder.checkpoint(now=T0 + 3 * SECONDS_PER_HOUR + 20)
+    assert journal.stat().st_size == size + entry
+
+    # A torn final entry (crash mid-append) is ignored on restart
+    with open(journal, 'ab') as f:
+        f.write(b'\x00' * (entry // 2))
+    restored = HistoryRecorder([1, 2, 3, 4], data_dir=str(tmp_path))
+    light1 = restored.query_rollups(T0, T0 + 3 * SECONDS_PER_HOUR, light_id=1)
+    assert [r['on_seconds'] for r in light1] == [60.0] * 3
+
+    # Compaction folds the journal into the snapshot
+    restored.flush()
+    assert not journal.exists() and (tmp_path / 'rollups.bin').exists()
+    again = HistoryRecorder([1, 2, 3, 4], data_dir=str(tmp_path))
+    light1 = again.query_rollups(T0, T0 + 3 * SECONDS_PER_HOUR, light_id=1)
+    assert [r['on_seconds'] for r in light1] == [60.0] * 3
+    assert again.query_rollups(T0 + 3 * SECONDS_PER_HOUR, T0 + 4 * SECONDS_PER_HOUR, light_id=2)
+
+
+def test_recording_does_no_disk_io(tmp_path, monkeypatch):
+    recorder = HistoryRecorder([1], data_dir=str(tmp_path), segment_size=4)
+    writes = []
+    monkeypatch.setattr(recorder, '_write_segment', writes.append)
+    monkeypatch.setattr(recorder, '_append_journal', writes.append)
+    for i in range(20):
+        recorder.record(1, i % 2 * 100, T0 + i)
+    assert writes == [] and recorder.get_stats()['segments_unwritten'] == 5
+    recorder.checkpoint(now=T0 + 20)
+    assert len(writes) == 6  # Five segments and one journal append
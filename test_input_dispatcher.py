@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Input dispatcher tests: debouncing and gesture detection in virtual time
+
+Edges are fed with VirtualClock timestamps and processed without the
+dispatcher thread, so every window (debounce, double click, long press) is
+exact.
+
+Run with: python -m pytest test_input_dispatcher.py
+"""
+
+from clock import VirtualClock
+from input_dispatcher import InputDispatcher
+
+PIN = 5
+PRESSED, RELEASED = False, True  # Pull-up: the contact pulls the pin low
+
+
+class Harness:
+    """Dispatcher with one input whose gestures are recorded by name"""
+
+    def __init__(self, bindings, input_type='button'):
+        self.clock = VirtualClock()
+        self.gestures = []
+        self.dispatcher = InputDispatcher(lambda action: self.gestures.append(action['gesture']), [1],
+                                          debounce_ms=30, long_press_ms=800, double_click_ms=350,
+                                          clock=self.clock)
+        self.dispatcher.add_input({'id': 1, 'pin': PIN, 'type': input_type, 'pull_up': True, 'bindings': {
+            gesture: {'type': 'toggle', 'light_id': 1, 'gesture': gesture} for gesture in bindings}})
+        self.dispatcher.set_initial_level(PIN, RELEASED)
+
+    def edge(self, level, after_ms=0):
+        self.wait(after_ms)
+        self.dispatcher.on_edge(PIN, level, self.clock.monotonic())
+        self.dispatcher.process_pending()
+
+    def wait(self, ms):
+        self.clock.advance(ms / 1000.0)
+        self.dispatcher.process_pending()
+
+
+def test_contact_bounce_is_ignored():
+    h = Harness(['press', 'release', 'single'])
+    # Press with chatter inside the debounce window
+    h.edge(PRESSED)
+    h.edge(RELEASED, 2)
+    h.edge(PRESSED, 3)
+    h.wait(100)
+    h.edge(RELEASED)
+    h.wait(100)
+
+    assert h.gestures == ['press', 'single', 'release']
+    assert h.dispatcher.get_stats()['bounces'] == 1
+
+
+def test_bounce_on_release_settles_to_the_final_level():
+    h = Harness(['press', 'release'])
+    h.edge(PRESSED)
+    h.wait(200)
+    # Release chatter ending released: first edge accepted, the rest absorbed
+    h.edge(RELEASED)
+    h.edge(PRESSED, 5)
+    h.edge(RELEASED, 5)
+    h.wait(100)
+    assert h.gestures == ['press', 'release']
+
+    # Chatter that ends in the opposite level is picked up once the window has passed
+    h.edge(PRESSED)
+    h.edge(RELEASED, 10)
+    h.wait(25)
+    assert h.gestures == ['press', 'release', 'press', 'release']
+
+
+def test_single_waits_for_the_double_click_window():
+    h = Harness(['single', 'double'])
+    h.edge(PRESSED)
+    h.edge(RELEASED, 80)
+    h.wait(300)
+    assert h.gestures == []
+    h.wait(60)
+    assert h.gestures == ['single']
+
+
+def test_double_click():
+    h = Harness(['single', 'double'])
+    h.edge(PRESSED)
+    h.edge(RELEASED, 80)
+    h.edge(PRESSED, 120)
+    h.edge(RELEASED, 80)
+    h.wait(1000)
+    assert h.gestures == ['double']
+
+
+def test_long_press_suppresses_the_single_click():
+    h = Harness(['single', 'long', 'release'])
+    h.edge(PRESSED)
+    h.wait(799)
+    assert h.gestures == []
+    h.wait(1)
+    assert h.gestures == ['long']
+    h.edge(RELEASED, 500)
+    h.wait(1000)
+    assert h.gestures == ['long', 'release']
+
+    # A short press on the same input is still a single click
+    h.edge(PRESSED)
+    h.edge(RELEASED, 100)
+    assert h.gestures == ['long', 'release', 'release', 'single']
+
+
+def test_switch_reports_changes():
+    h = Harness(['change', 'press', 'release'], input_type='switch')
+    h.edge(PRESSED)
+    h.edge(RELEASED, 1000)
+    assert h.gestures == ['change', 'press', 'change', 'release']
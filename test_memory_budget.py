@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Memory budget regression test for the low-memory profile
+Runs a standard workload (a full timer table, fades on every light, toggles,
+listings and schedule previews from several client threads) in a fresh
+process with LOW_MEMORY=1 and fails if the steady-state RSS exceeds the budget.
+
+Run with: python -m pytest test_memory_budget.py
+Measure without asserting: python test_memory_budget.py  (set LOW_MEMORY=0 to compare)
+"""
+
+import gc
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+# Steady-state RSS budget in MiB for the low-memory profile. Measured at about
+# 37.5 MiB with Python 3.11 / Flask 3.0 in simulation mode (51 MiB with the
+# default profile); raise it only together with a note on what the memory buys.
+RSS_BUDGET_MB = 42
+
+
+def read_rss_kb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return None
+
+
+def run_workload():
+    """Drive the app through the standard workload and return memory figures"""
+    os.environ.setdefault('LIGHT_HISTORY_DIR', tempfile.mkdtemp(prefix='light-history-'))
+    os.environ.setdefault('LIGHT_STATE_TABLE', '')
+    import app
+    from rate_limiter import TokenBucketLimiter
+
+    app.rate_limiter = TokenBucketLimiter(rate=1e9, burst=1e9)
+    client = app.app.test_client()
+    start = datetime.now() + timedelta(days=1)
+    timers = [{'light_id': i % 4 + 1, 'action': ('on', 'off', 'brightness')[i % 3], 'brightness': i % 100,
+               'time': (start + timedelta(minutes=i)).isoformat(),
+               'repeat': app.TIMER_REPEAT_MODES[i % 4]} for i in range(app.MAX_TIMERS)]
+    assert client.post('/api/timers/bulk', json={'timers': timers}).status_code == 200
+
+    previews = []  # Whether each schedule preview succeeded (assertions on worker threads would be lost)
+
+    def requests(rounds):
+        for n in range(rounds):
+            light_id = n % 4 + 1
+            client.post(f'/api/lights/{light_id}/toggle')
+            client.post(f'/api/lights/{light_id}/fade', json={'brightness': n * 7 % 100, 'fade_time': 0.2,
+                                                              'steps': 20})
+            client.get('/api/lights')
+            client.get('/api/timers?limit=200')
+            end = start + timedelta(days=n % 7 + 1)
+            preview = client.get(f'/api/schedule?from={start.timestamp():.0f}&to={end.timestamp():.0f}')
+            previews.append(preview.status_code == 200 and bool(preview.get_json()['occurrences']))
+            client.get('/api/status')
+
+    # Requests on threads, as the threaded server would run them (with the profile's stack size)
+    for _ in range(3):
+        workers = [threading.Thread(target=requests, args=(20,)) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+    deadline = time.monotonic() + 10
+    while app.fade_limit.active and time.monotonic() < deadline:
+        time.sleep(0.05)
+    app.command_queue.wait_idle(5)
+    gc.collect()
+    status = client.get('/api/status').get_json()
+    return {'rss_kb': read_rss_kb(), 'threads': threading.active_count(),
+            'timers': status['active_timers'], 'memory': status['memory'],
+            'previews': len(previews), 'previews_ok': all(previews)}
+
+
+def test_low_memory_profile_stays_within_budget():
+    if not os.path.exists('/proc/self/status'):
+        # pytest is imported only here so the measured process never loads it
+        import pytest
+        pytest.skip('needs /proc to read RSS')
+    env = dict(os.environ, LOW_MEMORY='1', LIGHT_STATE_TABLE='')
+    env.pop('MQTT_HOST', None)
+    result = subprocess.run([sys.executable, os.path.abspath(__file__)], env=env, capture_output=True,
+                            text=True, timeout=120, cwd=os.path.dirname(os.path.abspath(__file__)))
+    assert result.returncode == 0, result.stderr[-2000:]
+    figures = json.loads(result.stdout.strip().splitlines()[-1])
+
+    assert figures['memory']['low_memory']
+    assert figures['timers'] > 0
+    assert figures['previews'] == 3 * 4 * 20 and figures['previews_ok']
+    assert figures['threads'] <= 8
+    assert figures['rss_kb'] / 1024 <= RSS_BUDGET_MB, figures
+
+
+if __name__ == '__main__':
+    print(json.dumps(run_workload()))
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+MQTT bridge tests
+Runs the bridge against an in-process broker stub that mimics the parts of
+paho's Client the bridge uses (retained messages, '+' wildcards, loop()).
+
+Run with: python -m pytest test_mqtt_bridge.py
+"""
+
+import json
+import threading
+import time
+
+from mqtt_bridge import MQTTBridge
+
+
+class StubMessage:
+    def __init__(self, topic, payload):
+        self.topic = topic
+        self.payload = payload.encode('utf-8') if isinstance(payload, str) else payload
+
+
+class StubBroker:
+    """Broker holding retained messages and delivering to subscribed clients"""
+
+    def __init__(self):
+        self.retained = {}
+        self.log = []  # (topic, payload) of every publish
+        self.up = True
+        self.connack_delay = 0.0  # Seconds before a connect is acknowledged (None: never)
+        self.clients = []
+        self.lock = threading.Lock()
+
+    def publish(self, topic, payload):
+        with self.lock:
+            self.log.append((topic, payload))
+            for client in self.clients:
+                if client.connected and any(topic_matches(f, topic) for f in client.subscriptions):
+                    client.inbox.append(StubMessage(topic, payload))
+
+    def drop_connections(self):
+        self.up = False
+        for client in self.clients:
+            client.connected = False
+            client.dropped = True
+
+
+def topic_matches(pattern, topic):
+    pattern_parts, topic_parts = pattern.split('/'), topic.split('/')
+    return len(pattern_parts) == len(topic_parts) and all(
+        p in ('+', t) for p, t in zip(pattern_parts, topic_parts))
+
+
+class StubClient:
+    """Implements the subset of paho.mqtt.client.Client used by the bridge"""
+
+    def __init__(self, broker, client_id):
+        self.broker = broker
+        self.client_id = client_id
+        self.connected = False
+        self.dropped = False
+        self.connack_at = None  # Monotonic time the pending CONNACK arrives
+        self.connects = 0
+        self.subscriptions = set()
+        self.inbox = []
+        self.will = None
+        broker.clients.append(self)
+
+    def will_set(self, topic, payload, qos=0, retain=False):
+        self.will = (topic, payload)
+
+    def username_pw_set(self, username, password):
+        pass
+
+    def connect(self, host, port, keepalive):
+        if not self.broker.up:
+            raise ConnectionRefusedError('broker down')
+        self.connects += 1
+        delay = self.broker.connack_delay
+        self.connack_at = None if delay is None else time.monotonic() + delay
+
+    def reconnect(self):
+        self.subscriptions.clear()
+        self.connect(None, None, None)
+
+    def disconnect(self):
+        self.connected = False
+
+    def subscribe(self, topic, qos=0):
+        self.subscriptions.add(topic)
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        assert self.connected
+        if retain:
+            self.broker.retained[topic] = payload
+        self.broker.publish(topic, payload)
+
+    def loop(self, timeout=1.0):
+        if self.dropped:
+            self.dropped = False
+            self.on_disconnect(self, None, 1)
+            return 7
+        if self.connack_at is not None and time.monotonic() >= self.connack_at:
+            self.connack_at = None
+            self.connected = True
+            self.on_connect(self, None, {}, 0)
+        while self.inbox:
+            self.on_message(self, None, self.inbox.pop(0))
+        time.sleep(timeout)
+        return 0
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def make_bridge(broker, lights, commands, connect_timeout=1.0):
+    bridge = MQTTBridge(
+        {'frame_interval': 0.05, 'max_backoff': 0.1, 'connect_timeout': connect_timeout},
+        lambda light_id: {'state': 'ON' if lights[light_id] else 'OFF', 'brightness': lights[light_id]},
+        lambda light_id, command: commands.append((light_id, command)),
+        client_factory=lambda client_id: StubClient(broker, client_id))
+    bridge.start(lights.keys())
+    if broker.connack_delay is not None:
+        assert wait_for(bridge.is_connected)
+    return bridge
+
+
+def test_state_changes_are_coalesced_per_frame():
+    """A burst of changes publishes the latest state once, not once per change"""
+    broker, lights, commands = StubBroker(), {1: 0, 2: 0}, []
+    bridge = make_bridge(broker, lights, commands)
+    try:
+        assert wait_for(lambda: 'web_contr/lights/2/state' in broker.retained)
+        assert broker.retained['web_contr/status'] == 'online'
+        before = len(broker.log)
+
+        for level in range(1, 101):
+            lights[1] = level
+            bridge.notify_light(1)
+
+        assert wait_for(lambda: json.loads(broker.retained['web_contr/lights/1/state'])['brightness'] == 100)
+        state_publishes = [t for t, _ in broker.log[before:] if t == 'web_contr/lights/1/state']
+        assert len(state_publishes) < 10
+        assert bridge.get_stats()['coalesced'] > 90
+    finally:
+        bridge.stop()
+    assert broker.retained['web_contr/status'] == 'offline'
+
+
+def test_commands_are_routed_to_lights():
+    """JSON and plain ON/OFF payloads reach the command handler; bad ones are ignored"""
+    broker, lights, commands = StubBroker(), {1: 0, 2: 0}, []
+    bridge = make_bridge(broker, lights, commands)
+    client = StubClient(broker, 'tester')
+    client.connected = True
+    try:
+        client.publish('web_contr/lights/1/set', '{"state": "ON", "brightness": 40, "transition": 2}')
+        client.publish('web_contr/lights/2/set', 'off')
+        client.publish('web_contr/lights/all/set', 'ON')
+        client.publish('web_contr/lights/x/set', 'ON')
+        client.publish('web_contr/lights/1/set', '[1, 2]')
+
+        assert wait_for(lambda: len(commands) == 3)
+        assert commands == [
+            (1, {'state': 'ON', 'brightness': 40, 'transition': 2}),
+            (2, {'state': 'OFF'}),
+            (None, {'state': 'ON'}),
+        ]
+    finally:
+        bridge.stop()
+
+
+def test_latest_state_is_republished_after_reconnect():
+    """Changes made while the broker is down are sent once the bridge reconnects"""
+    broker, lights, commands = StubBroker(), {1: 0}, []
+    bridge = make_bridge(broker, lights, commands)
+    try:
+        assert wait_for(lambda: 'web_contr/lights/1/state' in broker.retained)
+        broker.drop_connections()
+        assert wait_for(lambda: not bridge.is_connected())
+
+        for level in (10, 20, 30):
+            lights[1] = level
+            bridge.notify_light(1)
+        bridge.publish('events', 'hello')
+        time.sleep(0.2)
+        assert json.loads(broker.retained['web_contr/lights/1/state'])['brightness'] == 0
+
+        broker.up = True
+        assert wait_for(bridge.is_connected)
+        assert wait_for(lambda: json.loads(broker.retained['web_contr/lights/1/state'])['brightness'] == 30)
+        assert wait_for(lambda: ('web_contr/events', 'hello') in broker.log)
+        assert bridge.get_stats()['reconnects'] >= 1
+    finally:
+        bridge.stop()
+
+
+def test_slow_connack_is_awaited_not_retried():
+    """A broker slower than the frame interval gets one connect, not one per loop pass"""
+    broker, lights, commands = StubBroker(), {1: 0}, []
+    broker.connack_delay = 0.4
+    bridge = make_bridge(broker, lights, commands)
+    try:
+        assert broker.clients[0].connects == 1
+        assert wait_for(lambda: 'web_contr/lights/1/state' in broker.retained)
+    finally:
+        bridge.stop()
+
+
+def test_unanswered_connect_is_retried_after_the_timeout():
+    """Without a CONNACK the bridge retries once per connect timeout and connects when the broker answers"""
+    broker, lights, commands = StubBroker(), {1: 0}, []
+    broker.connack_delay = None
+    bridge = make_bridge(broker, lights, commands, connect_timeout=0.2)
+    try:
+        time.sleep(0.7)
+        client = broker.clients[0]
+        assert 2 <= client.connects <= 4
+        assert bridge.get_stats()['connect_timeouts'] >= 1
+        assert not bridge.is_connected()
+
+        broker.connack_delay = 0.0
+        assert wait_for(bridge.is_connected)
+    finally:
+        bridge.stop()
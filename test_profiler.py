@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Sampling profiler and span tracer tests
+
+Run with: python -m pytest test_profiler.py
+"""
+
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+
+os.environ.setdefault('LIGHT_HISTORY_DIR', tempfile.mkdtemp(prefix='light-history-'))
+os.environ.setdefault('LIGHT_STATE_TABLE', '')
+
+import pytest
+
+from profiler import SamplingProfiler, SpanTracer
+
+
+def busy_work(stop):
+    while not stop.is_set():
+        sum(i * i for i in range(1000))
+
+
+def test_profiler_samples_running_threads_and_stops_by_itself():
+    stop = threading.Event()
+    worker = threading.Thread(target=busy_work, args=(stop,), name='busy worker', daemon=True)
+    worker.start()
+    profiler = SamplingProfiler(max_duration=0.3)
+    try:
+        assert profiler.start(duration=60, interval=0.005)  # Capped at max_duration
+        assert not profiler.start()  # Already running
+        deadline = time.monotonic() + 5
+        while profiler.is_running():
+            assert time.monotonic() < deadline, 'profiler did not stop at max_duration'
+            time.sleep(0.02)
+    finally:
+        stop.set()
+
+    stats = profiler.get_stats()
+    assert stats['samples'] > 5 and not stats['running']
+    lines = profiler.collapsed().splitlines()
+    busy = [line for line in lines if line.startswith('busy_worker;')]
+    assert busy and all('test_profiler.py:busy_work' in line for line in busy)
+    assert all(int(line.rsplit(' ', 1)[1]) > 0 for line in lines)
+
+
+def test_profiler_rejects_non_finite_parameters():
+    profiler = SamplingProfiler()
+    for duration, interval in ((math.nan, 0.01), (math.inf, 0.01), (1.0, math.nan)):
+        with pytest.raises(ValueError):
+            profiler.start(duration, interval)
+    assert not profiler.is_running()
+
+
+def test_profiler_bounds_distinct_stacks():
+    profiler = SamplingProfiler(max_duration=0.2, max_stacks=1)
+    profiler.start(duration=0.2, interval=0.005)
+    profiler.stop()
+    assert profiler.get_stats()['stacks'] <= 1
+
+
+def test_tracer_records_only_while_enabled():
+    tracer = SpanTracer(capacity=3)
+    with tracer.span('gpio.write', pin=18):
+        pass
+    assert tracer.get_stats()['recorded'] == 0
+
+    tracer.set_enabled(True)
+    for pin in (18, 19, 20, 21):
+        with tracer.span('gpio.write', pin=pin):
+            pass
+    with pytest.raises(RuntimeError):
+        with tracer.span('timer.batch'):
+            raise RuntimeError('boom')
+
+    # Ring buffer: newest first, oldest evicted
+    spans = tracer.get_spans()
+    assert [s['name'] for s in spans] == ['timer.batch', 'gpio.write', 'gpio.write']
+    assert spans[0]['attrs'] == {'error': 'RuntimeError'}
+    assert [s['attrs']['pin'] for s in tracer.get_spans('gpio')] == [21, 20]
+    assert len(tracer.get_spans(limit=1)) == 1
+    assert tracer.get_stats() == {'enabled': True, 'buffered': 3, 'capacity': 3, 'recorded': 5}
+
+    summary = tracer.get_summary()
+    assert summary['gpio.write']['count'] == 2 and summary['timer.batch']['count'] == 1
+    assert summary['gpio.write']['max_ms'] >= summary['gpio.write']['mean_ms'] >= 0
+
+    tracer.clear()
+    assert tracer.get_spans() == []
+
+
+def test_admin_profile_endpoint_validates_parameters():
+    import app
+
+    client = app.app.test_client()
+    headers = {'X-Admin-Token': app.ADMIN_TOKEN} if app.ADMIN_TOKEN else {}
+    for body in ('{"duration": NaN}', '{"interval_ms": Infinity}', '{"duration": "x"}', '[1]'):
+        response = client.post('/api/admin/profile', data=body, content_type='application/json', headers=headers)
+        assert response.status_code == 400, body
+    assert not app.profiler.is_running()
+
+    response = client.post('/api/admin/profile', data=json.dumps({'duration': 0.1}),
+                           content_type='application/json', headers=headers)
+    assert response.status_code == 200
+    app.profiler.stop()
+
+
+def test_admin_endpoints_need_a_token_or_loopback(monkeypatch):
+    import app
+
+    client = app.app.test_client()
+    remote = {'REMOTE_ADDR': '192.168.1.20'}
+    monkeypatch.setattr(app, 'ADMIN_TOKEN', None)
+    assert client.get('/api/admin/trace').status_code == 200
+    assert client.get('/api/admin/trace', environ_base=remote).status_code == 403
+
+    monkeypatch.setattr(app, 'ADMIN_TOKEN', 's3cret')
+    for headers in ({}, {'X-Admin-Token': 's3cre'}, {'X-Admin-Token': 's3cret!'}):
+        assert client.get('/api/admin/trace', headers=headers).status_code == 403
+    response = client.get('/api/admin/trace', headers={'X-Admin-Token': 's3cret'}, environ_base=remote)
+    assert response.status_code == 200
+
+    headers = {'X-Admin-Token': 's3cret'}
+    for body in ('[1]', '"on"'):
+        response = client.post('/api/admin/trace', data=body, content_type='application/json', headers=headers)
+        assert response.status_code == 400, body
+    assert not app.tracer.enabled
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Token bucket and concurrency limit tests, on a virtual clock
+
+Run with: python -m pytest test_rate_limiter.py
+"""
+
+import threading
+from datetime import datetime
+
+import pytest
+
+from clock import VirtualClock
+from rate_limiter import ConcurrencyLimit, TokenBucketLimiter
+
+
+@pytest.fixture
+def clock():
+    return VirtualClock(datetime(2026, 1, 5, 12, 0))
+
+
+def test_burst_then_refill_at_the_rate(clock):
+    limiter = TokenBucketLimiter(rate=2.0, burst=5.0, clock=clock)
+    assert [limiter.consume('a', 'x')[0] for _ in range(6)] == [True] * 5 + [False]
+
+    # Empty bucket: one token arrives every 0.5 s
+    allowed, retry_after = limiter.consume('a', 'x')
+    assert not allowed and retry_after == pytest.approx(0.5)
+    clock.advance(0.5)
+    assert limiter.consume('a', 'x') == (True, 0.0)
+
+    # Refill stops at the burst size
+    clock.advance(60)
+    assert [limiter.consume('a', 'x')[0] for _ in range(6)] == [True] * 5 + [False]
+
+
+def test_buckets_are_per_client_and_endpoint(clock):
+    limiter = TokenBucketLimiter(rate=1.0, burst=1.0, clock=clock)
+    assert limiter.consume('a', 'x')[0]
+    assert not limiter.consume('a', 'x')[0]
+    assert limiter.consume('a', 'y')[0]
+    assert limiter.consume('b', 'x')[0]
+
+
+def test_costs_are_weighted_and_capped_at_the_burst(clock):
+    limiter = TokenBucketLimiter(rate=1.0, burst=10.0, clock=clock)
+    assert limiter.consume('a', 'x', cost=4.0)[0]
+    assert limiter.consume('a', 'x', cost=6.0)[0]
+    allowed, retry_after = limiter.consume('a', 'x', cost=3.0)
+    assert not allowed and retry_after == pytest.approx(3.0)
+
+    # Costs above the burst are charged a full bucket instead of never passing
+    clock.advance(10)
+    assert limiter.consume('a', 'x', cost=1000.0)[0]
+    assert not limiter.consume('a', 'x', cost=0.5)[0]
+
+
+def test_full_buckets_are_pruned_at_the_limit(clock):
+    limiter = TokenBucketLimiter(rate=1.0, burst=2.0, max_buckets=4, stripes=1, clock=clock)
+    for client in 'abcd':
+        limiter.consume(client, 'x')
+    assert limiter.get_stats()['buckets'] == 4
+
+    clock.advance(2)  # All refilled: state equals a fresh bucket
+    limiter.consume('e', 'x')
+    assert limiter.get_stats()['buckets'] == 1
+
+    # Buckets still refilling are kept
+    for client in 'fgh':
+        limiter.consume(client, 'x')
+    limiter.consume('i', 'x')
+    assert limiter.get_stats()['buckets'] == 5
+
+
+def test_counters_are_exact_under_concurrency():
+    limiter = TokenBucketLimiter(rate=1e-9, burst=100.0)
+
+    def worker(n):
+        for i in range(500):
+            limiter.consume(f'client {n}', f'endpoint {i % 5}')
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stats = limiter.get_stats()
+    assert stats['allowed'] + stats['limited'] == 8 * 500
+    assert stats['allowed'] == 8 * 500  # 100 tokens per bucket, 100 requests each
+
+
+def test_concurrency_limit():
+    limit = ConcurrencyLimit(2)
+    assert limit.acquire() and limit.acquire()
+    assert not limit.acquire()
+    limit.release()
+    assert limit.acquire()
+    limit.release()
+    limit.release()
+    limit.release()  # Extra releases never go negative
+    assert limit.active == 0
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Simulated-time tests for timers and fades
+Replays days of schedules and thousands of fades against the simulation-mode
+GPIO controller in virtual time and checks the resulting pin timelines.
+
+Run with: python -m pytest test_simulation.py
+"""
+
+import json
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+os.environ.setdefault('LIGHT_HISTORY_DIR', tempfile.mkdtemp(prefix='light-history-'))
+os.environ.setdefault('LIGHT_STATE_TABLE', os.path.join(os.environ['LIGHT_HISTORY_DIR'], 'lights.tbl'))
+
+import app
+from clock import VirtualClock, SimulationRunner
+from rate_limiter import TokenBucketLimiter
+
+# Monday
+START = datetime(2026, 1, 5, 0, 0, 0)
+
+
+def start_simulation(start=START):
+    """Reset the service state and switch it to a fresh virtual clock"""
+    clock = VirtualClock(start)
+    runner = SimulationRunner(clock, settle=lambda: app.command_queue.wait_idle(5))
+    app.use_clock(clock, runner)
+    app.rate_limiter = TokenBucketLimiter(rate=1e9, burst=1e9)
+
+    with app.timer_lock:
+        app.TIMERS.clear()
+    for light in app.CONFIG['lights']:
+        app.set_light_on(light, False)
+    app.command_queue.wait_idle(5)
+    app.gpio_controller.timeline.clear()
+    return clock, runner
+
+
+def create_timer(client, **timer):
+    response = client.post('/api/timers', json=timer)
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()['timer']
+
+
+def timeline(pin):
+    """(local datetime, value) pairs recorded for a pin"""
+    return [(datetime.fromtimestamp(t), value) for t, p, value in app.gpio_controller.get_timeline(pin)]
+
+
+def test_week_of_repeating_timers():
+    """Daily, weekday and weekend timers fire on the right days at the right time"""
+    clock, runner = start_simulation()
+    client = app.app.test_client()
+
+    create_timer(client, light_id=1, action='on', time='07:00', repeat='daily')
+    create_timer(client, light_id=1, action='off', time='22:00', repeat='daily')
+    create_timer(client, light_id=2, action='brightness', brightness=40, time='06:30', repeat='weekdays')
+    create_timer(client, light_id=3, action='on', time='09:00', repeat='weekends')
+    create_timer(client, light_id=4, action='on', time='12:00', repeat='once')
+
+    runner.spawn(app.timer_worker())
+    runner.run_until(START + timedelta(days=7))
+
+    living_room = timeline(18)
+    assert len(living_room) == 14
+    for day in range(7):
+        date = START + timedelta(days=day)
+        assert living_room[day * 2] == (date.replace(hour=7), 100.0)
+        assert living_room[day * 2 + 1] == (date.replace(hour=22), 0.0)
+
+    kitchen = timeline(19)
+    assert [t for t, _ in kitchen] == [START + timedelta(days=d, hours=6, minutes=30) for d in range(5)]
+    assert all(value == 40.0 for _, value in kitchen)
+
+    bedroom = timeline(20)
+    assert [t for t, _ in bedroom] == [START + timedelta(days=d, hours=9) for d in (5, 6)]
+
+    assert timeline(21) == [(START.replace(hour=12), 100.0)]
+    with app.timer_lock:
+        assert len(app.TIMERS) == 4  # The one-time timer removed itself
+
+
+def test_timer_created_after_time_passed_runs_next_day():
+    """A repeating HH:MM timer created after its time first fires the next day"""
+    clock, runner = start_simulation(START.replace(hour=8))
+    client = app.app.test_client()
+
+    create_timer(client, light_id=1, action='on', time='07:00', repeat='daily')
+    runner.spawn(app.timer_worker())
+    runner.run_for(24 * 3600)
+
+    assert timeline(18) == [(START + timedelta(days=1, hours=7), 100.0)]
+
+
+def test_thousands_of_fades():
+    """Every fade ramps monotonically and ends exactly on its target"""
+    clock, runner = start_simulation()
+    light = app.CONFIG['lights'][0]
+    steps = 10
+    fades = 2000
+
+    previous = 0.0
+    for i in range(fades):
+        target = float((i * 37) % 101)
+        assert app.start_fade(light, target, fade_time=1.0, steps=steps)
+        runner.run_for(1.5)
+
+        points = [value for _, value in timeline(light['pin'])[-(steps + 2):]]
+        assert points[-1] == target
+        ramp = points[:-1]
+        if target >= previous:
+            assert ramp == sorted(ramp)
+        else:
+            assert ramp == sorted(ramp, reverse=True)
+        previous = target
+
+    assert app.gpio_controller.get_brightness(light['pin']) == previous
+    assert light['brightness'] == previous
+    # Each fade took one virtual second plus the idle gap between fades
+    assert clock.now() == START + timedelta(seconds=1.5 * fades)
+
+
+def test_newer_fade_supersedes_running_fade():
+    """Starting a fade on a light stops the fade already running on it"""
+    clock, runner = start_simulation()
+    light = app.CONFIG['lights'][1]
+
+    app.start_fade(light, 100.0, fade_time=10.0, steps=10)
+    runner.run_for(3.5)
+    app.start_fade(light, 0.0, fade_time=1.0, steps=10)
+    # The new fade took over the light's slot
+    assert app.fade_limit.active == 1
+    runner.run_for(20)
+
+    values = [value for _, value in timeline(light['pin'])]
+    assert values[-1] == 0.0
+    assert max(values) < 50.0
+    assert runner.pending() == 0
+    assert app.fade_limit.active == 0
+
+
+def test_invalid_fade_requests_are_rejected():
+    """Malformed fade bodies get 400, not a server error, and cannot hold slots for long"""
+    start_simulation()
+    client = app.app.test_client()
+    for body in ([1], {'brightness': 50, 'steps': float('inf')}, {'brightness': 'x'},
+                 {'brightness': 50, 'fade_time': app.MAX_FADE_TIME + 1}, {'brightness': 50, 'fade_time': float('nan')}):
+        response = client.post('/api/lights/1/fade', data=json.dumps(body), content_type='application/json')
+        assert response.status_code == 400, body
+    assert app.fade_limit.active == 0
+
+
+def test_simultaneous_timers_apply_as_one_batch():
+    """Timers sharing a fire time run as one batch; conflicts go to priority, then the newest timer"""
+    clock, runner = start_simulation()
+    client = app.app.test_client()
+    batches = app.timer_stats['batches']
+
+    create_timer(client, light_id=1, action='off', time='07:00', repeat='daily', priority=5)
+    create_timer(client, light_id=1, action='on', time='07:00', repeat='daily')
+    create_timer(client, light_id=2, action='on', time='07:00', repeat='daily')
+    create_timer(client, light_id=2, action='brightness', brightness=30, time='07:00', repeat='daily')
+    create_timer(client, light_id=3, action='on', time='07:00', repeat='daily')
+
+    runner.spawn(app.timer_worker())
+    runner.run_until(START.replace(hour=8))
+
+    assert timeline(18) == [(START.replace(hour=7), 0.0)]  # 'off' has the higher priority
+    assert timeline(19) == [(START.replace(hour=7), 30.0)]
+    assert timeline(20) == [(START.replace(hour=7), 100.0)]
+    assert app.timer_stats['batches'] == batches + 1
+    assert app.timer_stats['last_batch_size'] == 5
+
+
+def test_failing_timer_does_not_block_its_batch():
+    """A timer that cannot be applied is skipped; the others in its batch still fire every day"""
+    clock, runner = start_simulation()
+    client = app.app.test_client()
+
+    create_timer(client, light_id=2, action='on', time='07:00', repeat='daily')
+    poison = app.build_timer({'light_id': 1, 'action': 'brightness', 'brightness': 50,
+                              'time': '07:00', 'repeat': 'daily'}, clock.now())
+    poison['brightness'] = 'high'  # Stored before brightness was validated
+    app.add_timers([poison])
+
+    runner.spawn(app.timer_worker())
+    runner.run_until(START + timedelta(days=2))
+
+    assert timeline(19) == [(START + timedelta(days=d, hours=7), 100.0) for d in range(2)]
+    assert timeline(18) == []
+
+
+def test_schedule_preview_matches_execution():
+    """/api/schedule predicts exactly the runs the timer worker then performs"""
+    clock, runner = start_simulation()
+    client = app.app.test_client()
+
+    create_timer(client, light_id=1, action='on', time='07:00', repeat='daily')
+    create_timer(client, light_id=2, action='brightness', brightness=40, time='06:30', repeat='weekdays')
+    create_timer(client, light_id=3, action='on', time='09:00', repeat='weekends')
+    create_timer(client, light_id=4, action='on', time='12:00', repeat='once')
+
+    end = START + timedelta(days=7)
+    url = f"/api/schedule?from={START.isoformat()}&to={end.isoformat()}"
+    preview = client.get(url).get_json()
+    assert not preview['truncated']
+    predicted = [(datetime.fromisoformat(o['time']), o['light_id']) for o in preview['occurrences']]
+    assert predicted == sorted(predicted)
+    assert client.get(url).get_json() == preview
+    assert app.schedule_cache.stats['hits'] >= 1
+    limited = client.get(url + '&limit=3').get_json()
+    assert limited['truncated'] and limited['occurrences'] == preview['occurrences'][:3]
+
+    runner.spawn(app.timer_worker())
+    runner.run_until(end)
+
+    pins = {18: 1, 19: 2, 20: 3, 21: 4}
+    executed = sorted((t, pins[pin]) for t, pin, _ in
+                      ((datetime.fromtimestamp(t), p, v) for t, p, v in app.gpio_controller.get_timeline()))
+    assert predicted == executed
+
+    # Timers fired and were rescheduled, so the cached preview was invalidated
+    assert client.get(url).get_json()['version'] > preview['version']
+
+
+def test_default_schedule_range_is_cached_within_the_minute():
+    """Previews without 'from' start on the minute, so requests in the same minute hit the cache"""
+    clock, runner = start_simulation()
+    client = app.app.test_client()
+    create_timer(client, light_id=1, action='on', time='07:00', repeat='daily')
+
+    clock.advance(15)
+    first = client.get('/api/schedule').get_json()
+    hits = app.schedule_cache.stats['hits']
+    clock.advance(30)
+    assert client.get('/api/schedule').get_json() == first
+    assert app.schedule_cache.stats['hits'] == hits + 1
+    assert datetime.fromisoformat(first['from']) == START.replace(second=0)
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Shared-memory light state table tests
+
+Run with: python -m pytest test_state_table.py
+"""
+
+import multiprocessing
+import os
+import tempfile
+
+import pytest
+
+from state_table import StateTableInUse, StateTableReader, StateTableWriter, default_path
+
+LIGHTS = [
+    {'id': 1, 'name': 'Living Room', 'pin': 18, 'state': False, 'type': 'pwm', 'brightness': 0},
+    {'id': 2, 'name': 'Porch', 'pin': 23, 'state': True, 'type': 'digital', 'brightness': 0},
+]
+
+
+def read_while_writing(path, reads, result):
+    """Child process: every record read must be internally consistent"""
+    reader = StateTableReader(path)
+    torn = 0
+    for _ in range(reads):
+        light = reader.read(0)
+        # The writer keeps name, state and brightness in step
+        if light['name'] != f"Light {int(light['brightness'])}" or light['state'] != (light['brightness'] > 0):
+            torn += 1
+    reader.close()
+    result.value = torn
+
+
+def test_reader_sees_published_state():
+    path = os.path.join(tempfile.mkdtemp(), 'lights.tbl')
+    writer = StateTableWriter(path, LIGHTS)
+    reader = StateTableReader(path)
+
+    assert [(l['id'], l['name'], l['pin'], l['state'], l['type']) for l in reader.lights()] == [
+        (1, 'Living Room', 18, False, 'pwm'), (2, 'Porch', 23, True, 'digital')]
+
+    seq = reader.table_seq()
+    writer.update(dict(LIGHTS[0], state=True, brightness=42.5))
+    assert reader.table_seq() == seq + 1
+    assert reader.read(0)['brightness'] == 42.5
+    assert reader.read(0)['state'] is True
+
+    reader.close()
+    writer.close(remove=True)
+    assert not os.path.exists(path)
+
+
+def test_concurrent_reads_are_never_torn():
+    path = os.path.join(tempfile.mkdtemp(), 'lights.tbl')
+    writer = StateTableWriter(path, LIGHTS)
+    writer.update(dict(LIGHTS[0], name='Light 0'))
+    result = multiprocessing.Value('i', -1)
+    child = multiprocessing.Process(target=read_while_writing, args=(path, 50000, result))
+    child.start()
+
+    level = 0
+    while child.is_alive():
+        level = (level + 1) % 100
+        writer.update(dict(LIGHTS[0], name=f"Light {level}", state=level > 0, brightness=level))
+    child.join()
+    writer.close(remove=True)
+
+    assert result.value == 0
+
+
+def test_a_table_has_one_writer_at_a_time(monkeypatch):
+    path = os.path.join(tempfile.mkdtemp(), 'lights.tbl')
+    writer = StateTableWriter(path, LIGHTS)
+    with pytest.raises(StateTableInUse):
+        StateTableWriter(path, LIGHTS)
+    assert StateTableReader(path).lights()[0]['name'] == 'Living Room'  # Left untouched
+
+    writer.close(remove=True)
+    StateTableWriter(path, LIGHTS).close(remove=True)
+
+    monkeypatch.setenv('LIGHT_STATE_TABLE_NAME', 'upstairs')
+    assert os.path.basename(default_path()) == 'upstairs-lights.tbl'
+    assert os.path.basename(default_path('porch')) == 'porch-lights.tbl'
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Timer API tests: validation, bulk import, cursor pagination and NDJSON
+streaming, through the Flask test client in simulation mode
+
+Run with: python -m pytest test_timer_api.py
+"""
+
+import json
+import os
+import tempfile
+
+os.environ.setdefault('LIGHT_HISTORY_DIR', tempfile.mkdtemp(prefix='light-history-'))
+os.environ.setdefault('LIGHT_STATE_TABLE', '')
+
+import pytest
+
+import app
+from rate_limiter import TokenBucketLimiter
+
+
+@pytest.fixture
+def client():
+    app.rate_limiter = TokenBucketLimiter(rate=1e9, burst=1e9)
+    with app.timer_lock:
+        app.TIMERS.clear()
+    return app.app.test_client()
+
+
+def timer(light_id=1, action='on', time='07:00', repeat='daily', **extra):
+    return dict({'light_id': light_id, 'action': action, 'time': time, 'repeat': repeat}, **extra)
+
+
+def test_brightness_must_be_a_number_from_0_to_100(client):
+    for brightness in ('high', None, True, -1, 100.5):
+        response = client.post('/api/timers', json=timer(action='brightness', brightness=brightness))
+        assert response.status_code == 400, brightness
+    response = client.post('/api/timers', json=timer(action='brightness', brightness=40))
+    assert response.status_code == 200
+    assert response.get_json()['timer']['brightness'] == 40.0
+
+
+def test_bulk_import_is_atomic_unless_asked_otherwise(client):
+    definitions = [timer(), timer(action='brightness', brightness='high'), timer(light_id=99), timer(light_id=2)]
+
+    response = client.post('/api/timers/bulk', json={'timers': definitions})
+    assert response.status_code == 400
+    assert [e['index'] for e in response.get_json()['errors']] == [1, 2]
+    assert 'Brightness' in response.get_json()['errors'][0]['error']
+    assert app.TIMERS == []
+
+    response = client.post('/api/timers/bulk', json={'timers': definitions, 'atomic': False})
+    body = response.get_json()
+    assert response.status_code == 200
+    assert body['created'] == 2 and len(body['ids']) == 2
+    assert [e['index'] for e in body['errors']] == [1, 2]
+    assert [t['id'] for t in app.TIMERS] == body['ids']
+
+    # Over the limit nothing is stored
+    response = client.post('/api/timers/bulk', json=[timer()] * (app.MAX_TIMERS - 1))
+    assert response.status_code == 429
+    assert len(app.TIMERS) == 2
+
+
+def test_cursor_pagination_visits_every_timer_once(client):
+    client.post('/api/timers/bulk', json=[timer(light_id=i % 4 + 1) for i in range(25)])
+    client.delete(f"/api/timers/{app.TIMERS[3]['id']}")
+
+    seen, cursor, pages = [], '', 0
+    while True:
+        response = client.get(f'/api/timers?limit=10&cursor={cursor}')
+        body = response.get_json()
+        seen += [t['seq'] for t in body['timers']]
+        pages += 1
+        cursor = body['next_cursor']
+        assert response.headers.get('X-Next-Cursor') == cursor
+        if cursor is None:
+            break
+    assert pages == 3
+    assert seen == [t['seq'] for t in app.TIMERS] and len(seen) == 24
+
+    # Filters apply before the page is cut
+    body = client.get('/api/timers?light_id=2&limit=3').get_json()
+    assert [t['light_id'] for t in body['timers']] == [2, 2, 2]
+    rest = client.get(f"/api/timers?light_id=2&cursor={body['next_cursor']}").get_json()
+    assert len(body['timers']) + len(rest['timers']) == 6 and rest['next_cursor'] is None
+
+    assert client.get('/api/timers?cursor=x').status_code == 400
+
+
+def test_ndjson_streams_one_timer_per_line(client):
+    client.post('/api/timers/bulk', json=[timer(light_id=i % 4 + 1) for i in range(5)])
+
+    response = client.get('/api/timers?format=ndjson&limit=3')
+    assert response.mimetype == 'application/x-ndjson'
+    lines = response.data.decode('utf-8').splitlines()
+    assert [json.loads(line)['seq'] for line in lines] == [t['seq'] for t in app.TIMERS[:3]]
+    assert response.headers['X-Next-Cursor'] == str(app.TIMERS[2]['seq'])
+
+    # The streamed JSON document matches the NDJSON content
+    document = json.loads(client.get('/api/timers').data)
+    assert [t['id'] for t in document['timers']] == [t['id'] for t in app.TIMERS]
+    assert client.get('/api/timers?format=xml').status_code == 400
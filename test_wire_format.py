@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+API content negotiation tests
+
+Run with: python -m pytest test_wire_format.py
+"""
+
+import json
+import os
+import tempfile
+
+os.environ.setdefault('LIGHT_HISTORY_DIR', tempfile.mkdtemp(prefix='light-history-'))
+os.environ.setdefault('LIGHT_STATE_TABLE', '')
+
+import pytest
+from flask import Flask, jsonify, request
+
+from wire_format import FIELD_INDEX, FIELDS, enable_negotiation, from_terse
+
+
+def make_app():
+    app = Flask(__name__)
+    enable_negotiation(app)
+
+    @app.route('/api/lights', methods=['GET', 'POST'])
+    def lights():
+        if request.method == 'POST':
+            return jsonify({'success': True, 'lights': request.get_json()['lights']})
+        return jsonify({'success': True, 'lights': [{'id': 1, 'name': 'Porch', 'state': True}]})
+
+    return app
+
+
+def test_json_stays_the_default():
+    client = make_app().test_client()
+    for accept in (None, '*/*', 'text/html,*/*;q=0.8', 'application/json'):
+        response = client.get('/api/lights', headers={'Accept': accept} if accept else {})
+        assert response.mimetype == 'application/json'
+        assert response.get_json()['lights'][0]['name'] == 'Porch'
+
+
+def test_msgpack_round_trip_with_terse_schema():
+    msgpack = pytest.importorskip('msgpack')
+    client = make_app().test_client()
+
+    response = client.get('/api/lights?schema=terse', headers={'Accept': 'application/msgpack'})
+    assert response.mimetype == 'application/msgpack'
+    document = msgpack.unpackb(response.data, strict_map_key=False)
+    assert document[FIELD_INDEX['lights']][0][FIELD_INDEX['name']] == 'Porch'
+
+    # Terse binary request bodies are mapped back to field names
+    body = msgpack.packb({FIELD_INDEX['lights']: [{FIELD_INDEX['id']: 2, FIELD_INDEX['state']: False}]})
+    response = client.post('/api/lights', data=body, content_type='application/msgpack')
+    assert response.get_json() == {'success': True, 'lights': [{'id': 2, 'state': False}]}
+
+
+def test_every_api_document_has_a_terse_json_form():
+    import app
+    from rate_limiter import TokenBucketLimiter
+
+    app.rate_limiter = TokenBucketLimiter(rate=1e9, burst=1e9)
+    client = app.app.test_client()
+    headers = {'X-Admin-Token': app.ADMIN_TOKEN} if app.ADMIN_TOKEN else {}
+    client.post('/api/timers', json={'light_id': 1, 'action': 'on', 'time': '07:00', 'repeat': 'daily'})
+    client.post('/api/automations', json={'trigger': {'type': 'change', 'light_id': 1, 'to': 'on'},
+                                          'actions': [{'type': 'set', 'light_id': 2, 'state': 'on'}]})
+
+    assert len(set(FIELDS)) == len(FIELDS)
+    for path in ('/api/lights', '/api/lights/1', '/api/schema', '/api/status', '/api/history', '/api/timers',
+                 '/api/schedule', '/api/inputs', '/api/daylight', '/api/automations',
+                 '/api/admin/profile?format=json', '/api/admin/trace'):
+        full = client.get(path, headers=headers)
+        terse = client.get(f"{path}{'&' if '?' in path else '?'}schema=terse", headers=headers)
+        assert terse.status_code == full.status_code == 200, path
+        assert 'Accept' in terse.headers['Vary'] and 'Accept' in full.headers['Vary'], path
+        document = json.loads(terse.data)
+        assert str(FIELD_INDEX['success']) in document, path
+        # Keys come back as strings of their index; mapping them back restores the document
+        restored = from_terse({int(k) if k.isdigit() else k: v for k, v in document.items()})
+        assert restored.keys() == full.get_json().keys(), path
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Wire Format Module
+Content negotiation for the REST API. JSON stays the default; clients that
+send ``Accept: application/msgpack`` or ``Accept: application/cbor`` get the
+same documents in a compact binary encoding, and request bodies sent with
+those content types are decoded transparently.
+
+With ``?schema=terse`` object keys are replaced by their index in FIELDS, so
+small clients neither transmit nor compare field names. Terse keys are also
+accepted in binary request bodies.
+"""
+
+import importlib.util
+import logging
+from typing import Dict, Optional
+
+from flask import Request, has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+
+logger = logging.getLogger(__name__)
+
+JSON = 'application/json'
+MSGPACK = 'application/msgpack'
+CBOR = 'application/cbor'
+
+# Field table for the terse schema. Append only: a field's index is its wire key.
+FIELDS = (
+    'success', 'error', 'message', 'id', 'name', 'pin', 'state', 'type', 'brightness',
+    'lights', 'light', 'light_id', 'light_ids', 'light_name', 'action', 'time', 'repeat',
+    'priority', 'active', 'created_at', 'seq', 'timers', 'timer', 'next_cursor', 'created',
+    'ids', 'errors', 'index', 'status', 'timestamp', 'fade_time', 'steps', 'target_brightness',
+    'history', 'from', 'to', 'resolution', 'atomic', 'rules', 'rule', 'inputs', 'input',
+    'zones', 'zone', 'enabled', 'target_lux', 'deadband_lux', 'lux', 'sensor_errors', 'stats',
+    'occurrences', 'truncated', 'version', 'timer_id', 'trigger', 'conditions', 'actions',
+    'last_fired', 'fired_count', 'formats', 'fields', 'memory', 'profiler', 'collapsed',
+    'tracing', 'spans', 'summary',
+)
+FIELD_INDEX: Dict[str, int] = {name: index for index, name in enumerate(FIELDS)}
+
+# Media type -> module providing it. Codecs are offered if installed but only
+# imported when a client first uses them, which keeps them out of memory otherwise.
+CODEC_MODULES = {MSGPACK: 'msgpack', 'application/x-msgpack': 'msgpack', CBOR: 'cbor2'}
+_codecs: Dict[str, tuple] = {}
+
+
+def _installed(module: str) -> bool:
+    try:
+        return importlib.util.find_spec(module) is not None
+    except ValueError:
+        return False
+
+
+OFFERED = [JSON] + [media_type for media_type, module in CODEC_MODULES.items() if _installed(module)]
+
+
+def get_codec(media_type: str) -> Optional[tuple]:
+    """
+    (encode, decode) functions for a binary media type
+
+    Returns:
+        The codec, or None if the type is not offered
+    """
+    if media_type not in OFFERED or media_type == JSON:
+        return None
+    codec = _codecs.get(media_type)
+    if codec is None:
+        if CODEC_MODULES[media_type] == 'msgpack':
+            import msgpack
+            codec = (lambda obj: msgpack.packb(obj, use_bin_type=True, default=str),
+                     lambda data: msgpack.unpackb(data, raw=False, strict_map_key=False))
+        else:
+            import cbor2
+            codec = (lambda obj: cbor2.dumps(obj, default=lambda encoder, value: encoder.encode(str(value))),
+                     cbor2.loads)
+        _codecs[media_type] = codec
+    return codec
+
+
+def to_terse(obj):
+    """Replace known object keys with their FIELDS index, recursively"""
+    if isinstance(obj, dict):
+        return {FIELD_INDEX.get(key, key): to_terse(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [to_terse(value) for value in obj]
+    return obj
+
+
+def from_terse(obj):
+    """Map integer keys back to field names, recursively"""
+    if isinstance(obj, dict):
+        return {(FIELDS[key] if isinstance(key, int) and 0 <= key < len(FIELDS) else key): from_terse(value)
+                for key, value in obj.items()}
+    if isinstance(obj, list):
+        return [from_terse(value) for value in obj]
+    return obj
+
+
+def negotiated_type() -> str:
+    """Media type to answer the current /api request with (JSON if nothing better is accepted)"""
+    if not has_request_context() or len(OFFERED) == 1 or not request.path.startswith('/api/'):
+        return JSON
+    return request.accept_mimetypes.best_match(OFFERED, default=JSON)
+
+
+def wants_terse() -> bool:
+    return has_request_context() and request.args.get('schema') == 'terse'
+
+
+class NegotiatingJSONProvider(DefaultJSONProvider):
+    """jsonify() replacement that encodes /api responses in the negotiated format"""
+
+    def response(self, *args, **kwargs):
+        media_type = negotiated_type()
+        if media_type == JSON and not wants_terse():
+            return super().response(*args, **kwargs)
+
+        obj = self._prepare_response_obj(args, kwargs)
+        if wants_terse():
+            obj = to_terse(obj)
+        if media_type == JSON:
+            # Terse JSON: keys become strings of their index. Unknown keys stay
+            # strings, so a document can mix both and must not be sorted.
+            body = self.dumps(obj, separators=(',', ':'), sort_keys=False)
+            return self._app.response_class(f"{body}\n", mimetype=JSON)
+
+        encode = get_codec(media_type)[0]
+        return self._app.response_class(encode(obj), mimetype=media_type)
+
+
+class NegotiatingRequest(Request):
+    """Request whose get_json() also decodes MessagePack and CBOR bodies"""
+
+    def get_json(self, force: bool = False, silent: bool = False, cache: bool = True):
+        codec = get_codec(self.mimetype)
+        if codec is None:
+            return super().get_json(force=force, silent=silent, cache=cache)
+
+        if cache and getattr(self, '_binary_json', None) is not None:
+            return self._binary_json
+        try:
+            data = from_terse(codec[1](self.get_data(cache=True)))
+        except Exception as e:
+            if silent:
+                return None
+            return self.on_json_loading_failed(e)
+        if cache:
+            self._binary_json = data
+        return data
+
+
+def add_vary_header(response):
+    """Mark /api responses as depending on Accept, whichever format was chosen"""
+    if request.path.startswith('/api/'):
+        response.vary.add('Accept')
+    return response
+
+
+def enable_negotiation(app) -> None:
+    """Enable content negotiation on a Flask app"""
+    app.json_provider_class = NegotiatingJSONProvider
+    app.json = NegotiatingJSONProvider(app)
+    app.request_class = NegotiatingRequest
+    app.after_request(add_vary_header)
+    logger.info(f"API wire formats: {', '.join(OFFERED)}")
+